@@ -0,0 +1,272 @@
+"""
+Benchmark suite of the hot paths with JSON baselines to detect regressions
+
+    python benchmarks/bench_hot_paths.py                       # run and print
+    python benchmarks/bench_hot_paths.py --compare             # fail on regressions
+    python benchmarks/bench_hot_paths.py --save-baseline       # record a new baseline
+
+Each benchmark reports the best throughput (items/s) of several repetitions, since
+the best run is the least disturbed by other load on the machine. Baselines depend
+on the machine, so they should be recorded on the machine that compares against them.
+"""
+
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+from unittest.mock import MagicMock, patch
+
+from bwac.core.historic_consumer import HistoricConsumer
+from bwac.core.livestream_consumer import LivestreamConsumer
+from bwac.testing.fake_server import FIRST_MMSI, fake_message
+from bwac.utils import DayIterator, read_timestamp, read_timestamps
+
+BENCHMARKS_DIR = Path(__file__).parent
+DEFAULT_BASELINE = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 5
+
+START = dt.datetime(2026, 4, 20, tzinfo=dt.timezone.utc)
+
+MSG_TIMES = [
+    "2025-07-24T10:14:50+00:00",
+    "2025-07-24T10:14:50.123456+00:00",
+    "2025-07-24T10:14:50.1234567+00:00",
+    "2025-07-24T10:14:50.12+00:00",
+] * 2500
+
+
+def synthetic_messages(count: int, vessels: int = 100, step_in_s: float = 1.0) -> list[dict]:
+    """
+    Messages of vessels round-robin, which span count * step_in_s
+    """
+    return [
+        fake_message(FIRST_MMSI + i % vessels, START + dt.timedelta(seconds=i * step_in_s))
+        for i in range(count)
+    ]
+
+
+def synthetic_track(count: int) -> list[dict]:
+    """
+    Track of a single vessel, which crosses a day boundary, in reverse time order as the api
+    """
+    step_in_s = 2 * 86400 / count
+    return [
+        fake_message(FIRST_MMSI, START + dt.timedelta(seconds=i * step_in_s))
+        for i in reversed(range(count))
+    ]
+
+
+class Benchmark:
+    """
+    A benchmark, whose setup is called before each repetition and returns the
+    function to measure
+    """
+
+    name: str
+    items: int
+    setup: Callable[[Path], Callable[[], None]]
+
+    def __init__(self, name: str, items: int, setup: Callable[[Path], Callable[[], None]]):
+        self.name = name
+        self.items = items
+        self.setup = setup
+
+    def run(self, repeat: int = DEFAULT_REPEAT) -> float:
+        """
+        :return: best throughput in items per second
+        """
+        best = None
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                fn = self.setup(Path(tmp_dir))
+
+                start_time = time.perf_counter()
+                fn()
+                duration = time.perf_counter() - start_time
+
+            best = duration if best is None else min(best, duration)
+        return self.items / best
+
+
+def setup_read_timestamp(tmp_dir: Path):
+    return lambda: [read_timestamp(x) for x in MSG_TIMES]
+
+
+def setup_read_timestamps(tmp_dir: Path):
+    return lambda: read_timestamps(MSG_TIMES)
+
+
+def setup_day_intervals(tmp_dir: Path):
+    from_date = START
+    to_date = START + dt.timedelta(days=365)
+
+    def run():
+        for _ in range(100):
+            DayIterator.get_intervals(from_date, to_date)
+
+    return run
+
+
+def setup_live_get_data(output_format: str, count: int = 20000):
+    lines = [json.dumps(m).encode("UTF-8") for m in synthetic_messages(count)]
+
+    def setup(tmp_dir: Path):
+        response = MagicMock()
+        response.iter_lines.return_value = lines
+        response.__enter__ = lambda s: s
+        response.__exit__ = lambda *args: None
+
+        consumer = LivestreamConsumer(output_format=output_format)
+
+        def run():
+            with patch("bwac.core.livestream_consumer.requests.Session") as session:
+                session.return_value.get.return_value = response
+                # the progress line is part of the hot path, but not the terminal
+                with contextlib.redirect_stdout(io.StringIO()):
+                    consumer.get_data(access_token="dummy", output_dir=tmp_dir)
+            consumer.close()
+
+        return run
+
+    return setup
+
+
+def create_historic_consumer() -> HistoricConsumer:
+    os.environ.setdefault("BARENTS_WATCH_CLIENT_ID", "benchmark")
+    os.environ.setdefault("BARENTS_WATCH_CLIENT_SECRET", "benchmark")
+    return HistoricConsumer()
+
+
+def setup_save_track(append: bool, count: int = 50000):
+    track = synthetic_track(count)
+
+    def setup(tmp_dir: Path):
+        if append:
+            # existing files contain the older half of the track, which are reopened
+            # and read by the consumer of the run
+            with create_historic_consumer() as consumer:
+                consumer.save_track(track[count // 2 :], tmp_dir)
+        consumer = create_historic_consumer()
+
+        def run():
+            consumer.save_track(track, tmp_dir)
+            consumer.close()
+
+        return run
+
+    return setup
+
+
+BENCHMARKS = [
+    Benchmark("read_timestamp", len(MSG_TIMES), setup_read_timestamp),
+    Benchmark("read_timestamps", len(MSG_TIMES), setup_read_timestamps),
+    Benchmark("day_intervals", 100 * 365, setup_day_intervals),
+    Benchmark("live_get_data_csv", 20000, setup_live_get_data("csv")),
+    Benchmark("live_get_data_raw", 20000, setup_live_get_data("raw")),
+    Benchmark("save_track_new", 50000, setup_save_track(append=False)),
+    Benchmark("save_track_append", 50000, setup_save_track(append=True)),
+]
+
+
+def machine() -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """
+    :return: descriptions of the benchmarks, whose throughput regressed beyond tolerance
+    """
+    regressions = []
+    for name, rate in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = rate / baseline[name]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {rate:,.0f} items/s is {1 - ratio:.0%} below baseline")
+    return regressions
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Benchmarks of the bwac hot paths")
+    parser.add_argument(
+        "--filter", type=str, default=None, help="Run only benchmarks containing this text"
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--output", type=str, default=None, help="Write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_BASELINE),
+        default=None,
+        help=f"Fail if a benchmark is slower than the baseline (default: {DEFAULT_BASELINE})",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Accepted slowdown as fraction (default: {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_BASELINE),
+        default=None,
+        help=f"Record the results as baseline (default: {DEFAULT_BASELINE})",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for benchmark in BENCHMARKS:
+        if args.filter and args.filter not in benchmark.name:
+            continue
+
+        rate = benchmark.run(repeat=args.repeat)
+        results[benchmark.name] = round(rate)
+        print(f"{benchmark.name:<24} {rate:14,.0f} items/s")
+
+    report = {"machine": machine(), "results": results}
+    for path in [args.output, args.save_baseline]:
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if baseline["machine"] != report["machine"]:
+            print(f"Warning: baseline has been recorded on {baseline['machine']}")
+
+        regressions = compare(results, baseline["results"], tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"Regression {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of bwac.utils.read_timestamp against the previous implementation,
+which relied on an exception and a regex for timestamps with more than six
+fractional digits - the exception path is taken on python < 3.11 only, where
+datetime.fromisoformat does not accept these timestamps
+
+    python benchmarks/bench_read_timestamp.py
+"""
+
+import datetime as dt
+import re
+import timeit
+
+import numpy as np
+
+from bwac.utils import normalize_timestamp, read_timestamp, read_timestamps
+
+MSG_TIMES = [
+    "2025-07-24T10:14:50+00:00",
+    "2025-07-24T10:14:50.123456+00:00",
+    "2025-07-24T10:14:50.1234567+00:00",
+    "2025-07-24T10:14:50.12+00:00",
+] * 2500
+
+
+def read_timestamp_legacy(msg_time: str):
+    try:
+        timestamp = dt.datetime.fromisoformat(msg_time)
+    except Exception:
+        m = re.match(
+            r"(.*T[0-9]{2}:[0-9]{2}:[0-9]{2})(\.[0-9]*)?(\+[0-9]{2}:[0-9]{2})", msg_time
+        )
+
+        milliseconds = m.groups()[1]
+        if milliseconds is None:
+            milliseconds = "000000"
+        else:
+            milliseconds = milliseconds[1:]
+            if len(milliseconds) > 6:
+                milliseconds = milliseconds[:6]
+            else:
+                milliseconds = milliseconds + "0" * (6 - len(milliseconds))
+
+        iso_format = "".join(m.groups()[0] + "." + milliseconds + m.groups()[2])
+        timestamp = dt.datetime.fromisoformat(iso_format)
+
+    return timestamp
+
+
+def bench(name: str, stmt, number: int = 10) -> float:
+    duration = min(timeit.repeat(stmt, number=number, repeat=5)) / number
+    rate = len(MSG_TIMES) / duration
+    print(f"{name:<40} {duration * 1000:8.2f} ms  {rate:12,.0f} timestamps/s")
+    return duration
+
+
+if __name__ == "__main__":
+    assert [read_timestamp(x) for x in MSG_TIMES[:4]] == [
+        read_timestamp_legacy(x) for x in MSG_TIMES[:4]
+    ]
+
+    print(f"Reading {len(MSG_TIMES)} timestamps")
+    legacy = bench("read_timestamp (legacy)", lambda: [read_timestamp_legacy(x) for x in MSG_TIMES])
+    current = bench("read_timestamp", lambda: [read_timestamp(x) for x in MSG_TIMES])
+    bench(
+        "read_timestamp (python < 3.11 path)",
+        lambda: [dt.datetime.fromisoformat(normalize_timestamp(x)) for x in MSG_TIMES],
+    )
+    print(f"Speedup read_timestamp: {legacy / current:.1f}x")
+
+    legacy_batch = bench(
+        "read_timestamp (legacy) to datetime64",
+        lambda: np.array(
+            [read_timestamp_legacy(x).replace(tzinfo=None) for x in MSG_TIMES],
+            dtype="datetime64[us]",
+        ),
+    )
+    batch = bench("read_timestamps (batch)", lambda: read_timestamps(MSG_TIMES))
+    print(f"Speedup read_timestamps: {legacy_batch / batch:.1f}x")
@@ -4,9 +4,13 @@ of subparsers.
 """
 
 import argparse
+import contextlib
 from abc import ABC, abstractmethod
 from argparse import ArgumentParser
 from logging import Logger, getLogger
+from typing import Iterator
+
+from bwac.core.metrics import Metrics, serve_metrics
 
 logger: Logger = getLogger(__name__)
 
@@ -21,3 +25,39 @@ class BaseParser(ABC):
 
     def execute(self, args):
         logger.debug(f"Subparser: {args.active_subparser.__class__.__name__}")
+
+
+def add_metrics_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve metrics for Prometheus at http://127.0.0.1:<port>/metrics (default: disabled)",
+    )
+    parser.add_argument(
+        "--metrics-log-interval",
+        type=float,
+        default=None,
+        help="Log metrics and rates as JSON line at this interval in seconds (default: disabled)",
+    )
+
+
+@contextlib.contextmanager
+def metrics_from_args(args) -> Iterator[Metrics | None]:
+    """
+    Provide the metrics requested by the arguments of add_metrics_arguments or
+    required by the profiler, or None if metrics are not needed
+    """
+    profiler = getattr(args, "profiler", None)
+    metrics = profiler.metrics if profiler is not None else None
+
+    if args.metrics_port is None and args.metrics_log_interval is None:
+        yield metrics
+        return
+
+    with serve_metrics(
+        metrics if metrics is not None else Metrics(),
+        port=args.metrics_port,
+        log_interval_in_s=args.metrics_log_interval,
+    ) as metrics:
+        yield metrics
@@ -4,8 +4,18 @@ from pathlib import Path
 
 from tqdm import tqdm
 
-from bwac.cli.base import BaseParser
-from bwac.core.historic_consumer import HistoricConsumer
+from bwac.cli.base import BaseParser, add_metrics_arguments, metrics_from_args
+from bwac.core.compression import COMPRESSIONS
+from bwac.core.file_pool import DEFAULT_MAX_OPEN_FILES
+from bwac.core.historic_consumer import HISTORIC_OUTPUT_FORMATS, HistoricConsumer
+from bwac.core.manifest import MANIFEST_FILENAME, Manifest
+from bwac.core.scheduler import DEFAULT_MAX_RETRIES, RequestScheduler
+from bwac.core.session import (
+    DEFAULT_CONNECT_TIMEOUT_IN_S,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT_IN_S,
+)
+from bwac.core.sharding import Shard
 from bwac.utils import DayIterator
 
 
@@ -36,10 +46,132 @@ class HistoricParser(BaseParser):
             "--output-dir", type=str, default=str(Path()), help="The output directory"
         )
 
+        parser.add_argument(
+            "--format",
+            type=str,
+            choices=HISTORIC_OUTPUT_FORMATS,
+            default="csv",
+            help="Format of the track files AIS_<day>_<mmsi>.<format> (default: csv)",
+        )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=COMPRESSIONS,
+            default="none",
+            help="Compression of the track files - csv files get the suffix .gz or .zst,"
+            " parquet files compress their columns (default: none)",
+        )
+        parser.add_argument(
+            "--compression-level",
+            type=int,
+            default=None,
+            help="Compression level (default: the default of the compression)",
+        )
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of tracks that are downloaded concurrently (default: 1)",
+        )
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            default=None,
+            help=f"Number of keep-alive connections (default: max(workers, {DEFAULT_POOL_SIZE}))",
+        )
+        parser.add_argument(
+            "--connect-timeout",
+            type=float,
+            default=DEFAULT_CONNECT_TIMEOUT_IN_S,
+            help=f"Connect timeout in seconds (default: {DEFAULT_CONNECT_TIMEOUT_IN_S})",
+        )
+        parser.add_argument(
+            "--read-timeout",
+            type=float,
+            default=DEFAULT_READ_TIMEOUT_IN_S,
+            help=f"Read timeout in seconds (default: {DEFAULT_READ_TIMEOUT_IN_S})",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=None,
+            help="Maximum number of requests per second (default: no limit)",
+        )
+        parser.add_argument(
+            "--max-retries",
+            type=int,
+            default=DEFAULT_MAX_RETRIES,
+            help="Number of retries of throttled (429) or failed requests, whereas"
+            f" the concurrency is reduced while being throttled (default: {DEFAULT_MAX_RETRIES})",
+        )
+        parser.add_argument(
+            "--max-open-files",
+            type=int,
+            default=DEFAULT_MAX_OPEN_FILES,
+            help="Maximum number of csv track files kept open between writes, whereas"
+            f" the least recently used files are closed first (default: {DEFAULT_MAX_OPEN_FILES})",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Decode tracks while they are received, so that memory use does not"
+            " depend on the length of a track",
+        )
+        parser.add_argument(
+            "--shard",
+            type=Shard.parse,
+            default=None,
+            help="Download only shard i of N (0 <= i < N) of the tracks into"
+            " <output-dir>/shard-<i>-of-<N>, e.g., to spread a download over several"
+            " machines, which use the same time range. Use 'bwac merge' to combine the shards",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Do not skip or record completed discoveries and tracks"
+            f" in <output-dir>/{MANIFEST_FILENAME}",
+        )
+        add_metrics_arguments(parser)
+
     def execute(self, args):
         super().execute(args)
 
-        consumer = HistoricConsumer()
+        pool_size = args.pool_size
+        if pool_size is None:
+            pool_size = max(args.workers, DEFAULT_POOL_SIZE)
+
+        output_dir = args.output_dir
+        if args.shard is not None:
+            output_dir = args.shard.output_dir(output_dir)
+
+        manifest = None
+        if not args.no_cache:
+            manifest = Manifest.in_directory(output_dir)
+
+        scheduler = RequestScheduler(
+            rate_per_s=args.rate_limit,
+            max_concurrency=pool_size,
+            max_retries=args.max_retries,
+        )
+
+        with metrics_from_args(args) as metrics, HistoricConsumer(
+            pool_size=pool_size,
+            connect_timeout_in_s=args.connect_timeout,
+            read_timeout_in_s=args.read_timeout,
+            manifest=manifest,
+            output_format=args.format,
+            compression=args.compression,
+            compression_level=args.compression_level,
+            stream_tracks=args.stream,
+            scheduler=scheduler,
+            refresh_token=True,
+            metrics=metrics,
+            max_open_files=args.max_open_files,
+        ) as consumer:
+            self.download(consumer, args, output_dir=output_dir)
+
+    def download(self, consumer: HistoricConsumer, args, output_dir: str | Path):
         from_date = dt.datetime.fromisoformat(args.from_date)
         to_date = dt.datetime.fromisoformat(args.to_date)
 
@@ -47,8 +179,19 @@ class HistoricParser(BaseParser):
             from_date, to_date = interval
 
             mmsis = consumer.query_all_mmsis(from_date, to_date)
-            for mmsi in tqdm(mmsis, desc=f"From {from_date} -- {to_date}"):
-                track = consumer.query_track(
-                    mmsi=mmsi, from_date=from_date, to_date=to_date
-                )
-                consumer.save_track(track, args.output_dir)
+            if args.shard is not None:
+                mmsis = args.shard.select(mmsis, from_date=from_date)
+
+            downloaded_tracks = consumer.download_tracks(
+                mmsis,
+                from_date=from_date,
+                to_date=to_date,
+                output_dir=output_dir,
+                workers=args.workers,
+            )
+            for _ in tqdm(
+                downloaded_tracks,
+                total=len(mmsis),
+                desc=f"From {from_date} -- {to_date}",
+            ):
+                pass
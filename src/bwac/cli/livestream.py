@@ -2,8 +2,19 @@ import logging
 from argparse import ArgumentParser
 from pathlib import Path
 
-from bwac.cli.base import BaseParser
-from bwac.core.livestream_consumer import LivestreamConsumer
+from bwac.cli.base import BaseParser, add_metrics_arguments, metrics_from_args
+from bwac.core.compression import COMPRESSIONS
+from bwac.core.dedup import DEFAULT_CAPACITY
+from bwac.core.livestream_consumer import (
+    DEFAULT_COMPRESSED_FLUSH_INTERVAL_MS,
+    DEFAULT_PROGRESS_INTERVAL_MS,
+    DEFAULT_PROGRESS_LOG_INTERVAL_IN_S,
+    OUTPUT_FORMATS,
+    FlushPolicy,
+    LivestreamConsumer,
+    ProgressReporter,
+)
+from bwac.core.pipeline import OVERFLOW_POLICIES
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +29,123 @@ class LivestreamParser(BaseParser):
             default=str(Path()),
             help="Output directory to use",
         )
+        parser.add_argument(
+            "--format",
+            type=str,
+            choices=OUTPUT_FORMATS,
+            default="csv",
+            help="Output format: 'csv' or 'parquet' for decoded messages in AIS_<day>.<format>,"
+            " 'raw' to archive the received messages in AIS_<day>.ndjson (default: csv)",
+        )
+        parser.add_argument(
+            "--compression",
+            type=str,
+            choices=COMPRESSIONS,
+            default="none",
+            help="Compression of the output files - csv and raw files get the suffix .gz or .zst,"
+            " parquet files compress their columns (default: none)",
+        )
+        parser.add_argument(
+            "--compression-level",
+            type=int,
+            default=None,
+            help="Compression level (default: the default of the compression)",
+        )
+        parser.add_argument(
+            "--flush-every",
+            type=int,
+            default=None,
+            help="Flush output after this number of messages, 0 to disable (default: 1,"
+            " with --compression: disabled)",
+        )
+        parser.add_argument(
+            "--flush-interval-ms",
+            type=int,
+            default=None,
+            help="Flush output at least at this interval in milliseconds (default: disabled,"
+            f" with --compression: {DEFAULT_COMPRESSED_FLUSH_INTERVAL_MS})."
+            " Output is always flushed on day rollover and shutdown",
+        )
+
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            default=0,
+            help="Number of messages buffered between reading the stream and writing,"
+            " 0 to read and write in a single thread (default: 0)",
+        )
+        parser.add_argument(
+            "--overflow",
+            type=str,
+            choices=OVERFLOW_POLICIES,
+            default="block",
+            help="Policy when the message buffer is full (default: block)",
+        )
+        parser.add_argument(
+            "--spill-dir",
+            type=str,
+            default=None,
+            help="Directory for spilled messages (default: the output directory)",
+        )
+
+        parser.add_argument(
+            "--seamless-renewal",
+            action="store_true",
+            help="Renew the token by opening a new stream before closing the old one,"
+            " so that there is no reconnect gap",
+        )
+
+        parser.add_argument(
+            "--deduplicate",
+            action="store_true",
+            help="Drop messages that are not newer than the last message of the same mmsi",
+        )
+        parser.add_argument(
+            "--deduplicate-capacity",
+            type=int,
+            default=DEFAULT_CAPACITY,
+            help=f"Maximum number of mmsis tracked for de-duplication (default: {DEFAULT_CAPACITY})",
+        )
+        parser.add_argument(
+            "--progress-interval-ms",
+            type=int,
+            default=DEFAULT_PROGRESS_INTERVAL_MS,
+            help="Minimum interval between updates of the progress line on a terminal,"
+            f" 0 to disable progress reports (default: {DEFAULT_PROGRESS_INTERVAL_MS})",
+        )
+        parser.add_argument(
+            "--progress-log-interval",
+            type=float,
+            default=DEFAULT_PROGRESS_LOG_INTERVAL_IN_S,
+            help="Interval in seconds between progress log lines, if the output is not a terminal"
+            f" (default: {DEFAULT_PROGRESS_LOG_INTERVAL_IN_S})",
+        )
+        add_metrics_arguments(parser)
 
     def execute(self, args):
         super().execute(args)
 
-        consumer = LivestreamConsumer()
-        logger.info(f"Starting consumer with output directory: {args.output_dir}")
-        consumer.start(output_dir=args.output_dir)
+        flush_policy = None
+        if args.flush_every is not None or args.flush_interval_ms is not None:
+            flush_policy = FlushPolicy(
+                every_n_messages=args.flush_every, every_ms=args.flush_interval_ms
+            )
+        with metrics_from_args(args) as metrics:
+            consumer = LivestreamConsumer(
+                output_format=args.format,
+                compression=args.compression,
+                compression_level=args.compression_level,
+                flush_policy=flush_policy,
+                queue_size=args.queue_size,
+                overflow=args.overflow,
+                spill_dir=args.spill_dir,
+                seamless_renewal=args.seamless_renewal,
+                deduplicate_capacity=args.deduplicate_capacity if args.deduplicate else None,
+                metrics=metrics,
+                progress=ProgressReporter(
+                    interval_ms=args.progress_interval_ms,
+                    log_interval_in_s=args.progress_log_interval,
+                ),
+            )
+            logger.info(f"Starting consumer with output directory: {args.output_dir}")
+            consumer.start(output_dir=args.output_dir)
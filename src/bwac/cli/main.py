@@ -8,10 +8,14 @@ from bwac import __version__
 from bwac.cli.base import BaseParser
 from bwac.cli.historic import HistoricParser
 from bwac.cli.livestream import LivestreamParser
+from bwac.cli.merge import MergeParser
+from bwac.core.profiling import DEFAULT_DUMP_INTERVAL_IN_S, PROFILE_MODES, Profiler
 
 logger = getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+DEFAULT_PROFILE_DIR = "bwac-profile"
+
 
 class MainParser(ArgumentParser):
     def __init__(self, **kwargs):
@@ -22,6 +26,42 @@ class MainParser(ArgumentParser):
         self.add_argument("--version", "-i", action="store_true", help="Show version")
         self.add_argument("--verbose", action="store_true", help="Show details")
 
+    def add_profile_arguments(self):
+        """
+        Add the options to profile a subcommand, which have to precede the subcommand
+        """
+        self.add_argument(
+            "--profile",
+            action="store_true",
+            help="Profile the subcommand and write timings of the processing stages",
+        )
+        self.add_argument(
+            "--profile-mode",
+            type=str,
+            default="cprofile",
+            choices=PROFILE_MODES,
+            help="Profile all function calls with cProfile or sample the stacks, which has"
+            " a lower overhead (default: cprofile)",
+        )
+        self.add_argument(
+            "--profile-memory",
+            action="store_true",
+            help="Trace memory allocations with tracemalloc while profiling",
+        )
+        self.add_argument(
+            "--profile-dir",
+            type=str,
+            default=DEFAULT_PROFILE_DIR,
+            help=f"Output directory of the profile dumps (default: {DEFAULT_PROFILE_DIR})",
+        )
+        self.add_argument(
+            "--profile-interval",
+            type=float,
+            default=DEFAULT_DUMP_INTERVAL_IN_S,
+            help="Interval in seconds between profile dumps of a running subcommand, e.g.,"
+            f" of the live consumer, 0 to dump only at exit (default: {DEFAULT_DUMP_INTERVAL_IN_S})",
+        )
+
     def attach_subcommand_parser(
         self, subcommand: str, help: str, parser_klass: BaseParser
     ):
@@ -40,6 +80,7 @@ def run():
     )
 
     main_parser = MainParser()
+    main_parser.add_profile_arguments()
 
     main_parser.attach_subcommand_parser(
         subcommand="live",
@@ -53,13 +94,33 @@ def run():
         parser_klass=HistoricParser,
     )
 
+    main_parser.attach_subcommand_parser(
+        subcommand="merge",
+        help="Merge the shards of a historic download",
+        parser_klass=MergeParser,
+    )
+
     args = main_parser.parse_args()
 
     if args.version:
         print(__version__)
         sys.exit(0)
 
+    for logger in [logging.getLogger(x) for x in logging.root.manager.loggerDict]:
+        logger.setLevel(logging.getLevelName(args.log_level))
+
+    args.profiler = None
+    if args.profile:
+        args.profiler = Profiler(
+            output_dir=args.profile_dir,
+            mode=args.profile_mode,
+            memory=args.profile_memory,
+            dump_interval_in_s=args.profile_interval if args.profile_interval > 0 else None,
+        )
+
     if hasattr(args, "active_subparser"):
+        if args.profiler is not None:
+            args.profiler.start()
         try:
             getattr(args, "active_subparser").execute(args)
         except Exception as e:
@@ -67,12 +128,12 @@ def run():
             if args.verbose:
                 tb.print_tb(e.__traceback__)
             sys.exit(-1)
+        finally:
+            if args.profiler is not None:
+                args.profiler.stop()
     else:
         main_parser.print_help()
 
-    for logger in [logging.getLogger(x) for x in logging.root.manager.loggerDict]:
-        logger.setLevel(logging.getLevelName(args.log_level))
-
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,31 @@
+import logging
+from argparse import ArgumentParser
+
+from bwac.cli.base import BaseParser
+from bwac.core.sharding import merge_shards
+
+logger = logging.getLogger(__name__)
+
+
+class MergeParser(BaseParser):
+    def __init__(self, parser: ArgumentParser):
+        super().__init__(parser=parser)
+
+        parser.add_argument(
+            "--input-dir",
+            type=str,
+            required=True,
+            help="Directory containing the shard-<i>-of-<N> directories of 'bwac historic --shard'",
+        )
+        parser.add_argument(
+            "--output-dir",
+            type=str,
+            default=None,
+            help="Directory of the merged per-day files (default: the input directory)",
+        )
+
+    def execute(self, args):
+        super().execute(args)
+
+        merged = merge_shards(input_dir=args.input_dir, output_dir=args.output_dir)
+        logger.info(f"Merged {merged} files")
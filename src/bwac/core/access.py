@@ -1,14 +1,28 @@
 import datetime as dt
 import logging
+import threading
+from pathlib import Path
 
 import requests
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from bwac.core.constants import BARENTS_WATCH_TOKEN_URL
+from bwac.core.constants import (
+    BARENTS_WATCH_HISTORIC_AIS_URL,
+    BARENTS_WATCH_LIVE_AIS_URL,
+    BARENTS_WATCH_TOKEN_URL,
+)
+from bwac.core.metrics import Metrics
+from bwac.core.session import DEFAULT_CONNECT_TIMEOUT_IN_S, DEFAULT_READ_TIMEOUT_IN_S
+from bwac.core.token_cache import TokenCache, token_key
 
 logger = logging.getLogger(__name__)
 
+# renew tokens on demand shortly before they expire
+DEFAULT_RENEWAL_MARGIN_IN_S = 100
+# renew tokens in the background well ahead of the on demand renewal
+DEFAULT_REFRESH_MARGIN_IN_S = 300
+
 
 class BarentsWatchSettings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -24,45 +38,66 @@ class BarentsWatchSettings(BaseSettings):
     scope: str = Field(default="ais")
     grant_type: str = Field(default="client_credentials")
 
+    # path of a token cache shared by all processes, None to keep tokens in memory only
+    token_cache: Path | None = Field(default=None)
+
+    # endpoints of the service, e.g., to use a local stand-in server
+    token_url: str = Field(default=BARENTS_WATCH_TOKEN_URL)
+    live_ais_url: str = Field(default=BARENTS_WATCH_LIVE_AIS_URL)
+    historic_ais_url: str = Field(default=BARENTS_WATCH_HISTORIC_AIS_URL)
+
+
+class AccessBase:
+    """
+    Token state, which is shared by the blocking and the asynchronous access
+    """
 
-class Access:
     config: BarentsWatchSettings
-    expiration: None
-    _token: str
+    expiration: dt.datetime
+    _token: dict[str, any] | None
 
     def __init__(self):
         self.config = BarentsWatchSettings()
         self._token = None
         self.expiration = dt.datetime.fromtimestamp(0, tz=dt.timezone.utc)
 
-    def acquire(self, force: bool = False):
-        if not force and not self.requires_renewal():
-            logger.debug("Access.acquire: no renewal required")
-            return
+    @property
+    def token_request_data(self) -> dict[str, str]:
+        return {
+            "client_id": self.config.client_id,
+            "client_secret": self.config.client_secret,
+            "scope": self.config.scope,
+            "grant_type": self.config.grant_type,
+        }
 
-        response = requests.post(
-            BARENTS_WATCH_TOKEN_URL,
-            data={
-                "client_id": self.config.client_id,
-                "client_secret": self.config.client_secret,
-                "scope": self.config.scope,
-                "grant_type": self.config.grant_type,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
+    def set_token(self, token: dict[str, any], now: dt.datetime):
+        """
+        Set a token that has been received at the given time
+        """
+        self._token = token
+        self.expiration = now + dt.timedelta(seconds=self.expires_in)
 
-        now = dt.datetime.now(tz=dt.timezone.utc)
-        self._token = response.json()
+    def restore_token(self, token: dict[str, any], expiration: dt.datetime):
+        """
+        Set a token, which has been received earlier, e.g., from a token cache
+        """
+        self._token = token
+        self.expiration = expiration
 
-        self.expiration = now + dt.timedelta(seconds=self.expires_in)
+    @property
+    def token_key(self) -> str:
+        return token_key(client_id=self.config.client_id, scope=self.config.scope)
 
     def ensure_token(self):
         if not self._token:
             raise RuntimeError("Access: not token available. Call .acquire() first")
 
-    def requires_renewal(self):
+    def requires_renewal(self, margin_in_s: float = DEFAULT_RENEWAL_MARGIN_IN_S):
+        """
+        Check whether the token expires within the given margin
+        """
         now = dt.datetime.now(tz=dt.timezone.utc)
-        return (now - dt.timedelta(seconds=100)) > self.expiration
+        return (now + dt.timedelta(seconds=margin_in_s)) > self.expiration
 
     @property
     def access_token(self):
@@ -73,3 +108,191 @@ class Access:
     def expires_in(self):
         self.ensure_token()
         return int(self._token["expires_in"])
+
+    @property
+    def remaining_lifetime_in_s(self) -> int:
+        """
+        Time until the token expires, which is less than expires_in for a token
+        that has been restored from a token cache
+        """
+        self.ensure_token()
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        return max(0, int((self.expiration - now).total_seconds()))
+
+
+class Access(AccessBase):
+    session: requests.Session
+    timeout: tuple[float, float]
+    token_cache: TokenCache | None
+    refresher: "TokenRefresher | None"
+    metrics: Metrics | None
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        timeout: tuple[float, float] = (
+            DEFAULT_CONNECT_TIMEOUT_IN_S,
+            DEFAULT_READ_TIMEOUT_IN_S,
+        ),
+        token_cache: TokenCache | None = None,
+        metrics: Metrics | None = None,
+    ):
+        """
+        :param session: session to reuse for token requests, e.g., the one of a consumer
+        :param timeout: connect and read timeout for token requests in seconds
+        :param token_cache: cache to share tokens across processes (default: the cache
+            configured by BARENTS_WATCH_TOKEN_CACHE, if any)
+        :param metrics: metrics to record token renewals, None to disable
+        """
+        super().__init__()
+        self.session = session if session is not None else requests.Session()
+        self.timeout = timeout
+        self.token_cache = token_cache
+        if token_cache is None and self.config.token_cache is not None:
+            self.token_cache = TokenCache(self.config.token_cache)
+        self.refresher = None
+        self.metrics = metrics
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, force: bool = False, margin_in_s: float = DEFAULT_RENEWAL_MARGIN_IN_S
+    ):
+        """
+        Ensure a token, which is valid for at least margin_in_s
+
+        :param force: renew the token even if it is still valid
+        :param margin_in_s: renew the token if it expires within this margin
+        """
+        if not force and not self.requires_renewal(margin_in_s):
+            logger.debug("Access.acquire: no renewal required")
+            return
+
+        # Access can be shared between multiple worker threads, so that
+        # only the first caller should renew the token
+        with self._lock:
+            if not force and not self.requires_renewal(margin_in_s):
+                logger.debug("Access.acquire: token has been renewed concurrently")
+                return
+
+            if self.token_cache is None:
+                self._renew()
+                return
+
+            # other processes wait for the renewal and reuse its token
+            with self.token_cache.locked():
+                if not force and self._restore_cached_token(margin_in_s):
+                    logger.debug("Access.acquire: using cached token")
+                    return
+
+                self._renew()
+                self.token_cache.put(self.token_key, self._token, self.expiration)
+
+    def _restore_cached_token(self, margin_in_s: float) -> bool:
+        cached = self.token_cache.get(self.token_key)
+        if cached is None:
+            return False
+
+        token, expiration = cached
+        self.restore_token(token, expiration)
+        return not self.requires_renewal(margin_in_s)
+
+    def start_refresher(
+        self, margin_in_s: float = DEFAULT_REFRESH_MARGIN_IN_S, retry_in_s: float = 10.0
+    ) -> "TokenRefresher":
+        """
+        Start renewing the token in the background, see TokenRefresher
+        """
+        if self.refresher is None or not self.refresher.is_alive():
+            self.refresher = TokenRefresher(
+                access=self, margin_in_s=margin_in_s, retry_in_s=retry_in_s
+            )
+            self.refresher.start()
+        return self.refresher
+
+    def stop_refresher(self):
+        if self.refresher is not None:
+            self.refresher.stop()
+            self.refresher = None
+
+    def _renew(self):
+        response = self.session.post(
+            self.config.token_url,
+            data=self.token_request_data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            timeout=self.timeout,
+        )
+        if self.metrics is not None:
+            self.metrics.http_request(
+                "token", response.status_code, response.elapsed.total_seconds()
+            )
+
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        self.set_token(response.json(), now)
+        if self.metrics is not None:
+            self.metrics.token_renewals.inc()
+
+
+class TokenRefresher(threading.Thread):
+    """
+    Background renewal of the token of an Access ahead of its expiry
+
+    The token is renewed once it expires within margin_in_s, which should exceed the
+    margin of the on demand renewal, so that callers of Access.acquire find a valid
+    token and do not wait for the identity server. Renewals are single-flight, since
+    they share the lock of Access.acquire. A failed renewal is retried after
+    retry_in_s, while callers fall back to the on demand renewal once necessary.
+    """
+
+    access: Access
+    margin_in_s: float
+    retry_in_s: float
+    renewals: int
+    failures: int
+
+    def __init__(
+        self,
+        access: Access,
+        margin_in_s: float = DEFAULT_REFRESH_MARGIN_IN_S,
+        retry_in_s: float = 10.0,
+    ):
+        super().__init__(name="bwac-token-refresher", daemon=True)
+
+        self.access = access
+        self.margin_in_s = margin_in_s
+        self.retry_in_s = retry_in_s
+        self.renewals = 0
+        self.failures = 0
+
+        self._stopped = threading.Event()
+
+    def next_renewal_in_s(self) -> float:
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        renew_at = self.access.expiration - dt.timedelta(seconds=self.margin_in_s)
+        return (renew_at - now).total_seconds()
+
+    def run(self):
+        while not self._stopped.is_set():
+            delay = self.next_renewal_in_s()
+            if delay > 0:
+                self._stopped.wait(delay)
+                continue
+
+            try:
+                self.access.acquire(margin_in_s=self.margin_in_s)
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"TokenRefresher: renewal failed: {e}")
+                self._stopped.wait(self.retry_in_s)
+                continue
+
+            self.renewals += 1
+            if self.next_renewal_in_s() <= 0:
+                # token lifetime is shorter than the margin
+                self._stopped.wait(self.retry_in_s)
+
+    def stop(self, timeout_in_s: float = 5.0):
+        self._stopped.set()
+        self.join(timeout=timeout_in_s)
+        if self.is_alive():
+            logger.warning("TokenRefresher: refresher did not stop in time")
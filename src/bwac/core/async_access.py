@@ -0,0 +1,46 @@
+import asyncio
+import datetime as dt
+import logging
+
+import httpx
+
+from bwac.core.access import AccessBase
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAccess(AccessBase):
+    """
+    Access for asyncio applications, which renews the token without blocking the event loop
+    """
+
+    client: httpx.AsyncClient
+    _lock: asyncio.Lock
+
+    def __init__(self, client: httpx.AsyncClient):
+        """
+        :param client: client to use for token requests, e.g., the one of a consumer
+        """
+        super().__init__()
+        self.client = client
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, force: bool = False):
+        if not force and not self.requires_renewal():
+            logger.debug("AsyncAccess.acquire: no renewal required")
+            return
+
+        # only the first of all concurrent tasks should renew the token
+        async with self._lock:
+            if not force and not self.requires_renewal():
+                logger.debug("AsyncAccess.acquire: token has been renewed concurrently")
+                return
+
+            response = await self.client.post(
+                self.config.token_url,
+                data=self.token_request_data,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+
+            now = dt.datetime.now(tz=dt.timezone.utc)
+            self.set_token(response.json(), now)
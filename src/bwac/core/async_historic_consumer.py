@@ -0,0 +1,141 @@
+import asyncio
+import datetime as dt
+import logging
+from typing import AsyncIterator
+
+import httpx
+
+from bwac.core.async_access import AsyncAccess
+from bwac.core.historic_consumer import HistoricConsumer, NorwayAreas
+from bwac.core.session import (
+    DEFAULT_CONNECT_TIMEOUT_IN_S,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT_IN_S,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHistoricConsumer:
+    """
+    Historic consumer for asyncio applications
+
+    All requests share one client and at most max_concurrency requests are
+    in flight at the same time.
+    """
+
+    client: httpx.AsyncClient
+    access: AsyncAccess
+    _semaphore: asyncio.Semaphore
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_POOL_SIZE,
+        connect_timeout_in_s: float = DEFAULT_CONNECT_TIMEOUT_IN_S,
+        read_timeout_in_s: float = DEFAULT_READ_TIMEOUT_IN_S,
+        client: httpx.AsyncClient | None = None,
+    ):
+        """
+        :param max_concurrency: maximum number of concurrent requests
+        :param connect_timeout_in_s: timeout for establishing a connection
+        :param read_timeout_in_s: timeout for waiting on data of a response
+        :param client: client to use instead of creating one
+        """
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_concurrency,
+                    max_keepalive_connections=max_concurrency,
+                ),
+                timeout=httpx.Timeout(read_timeout_in_s, connect=connect_timeout_in_s),
+            )
+
+        self.client = client
+        self.access = AsyncAccess(client=self.client)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def query_all_mmsis(
+        self, from_date: dt.datetime, to_date: dt.datetime
+    ) -> list[int]:
+        areas_mmsis = await asyncio.gather(
+            *[
+                self.query_mmsis_in_area(from_date=from_date, to_date=to_date, area=area)
+                for area in NorwayAreas.values()
+            ]
+        )
+        return sorted(set().union(*areas_mmsis))
+
+    async def query_mmsis_in_area(
+        self, from_date: dt.datetime, to_date: dt.datetime, area: list[list[float]]
+    ) -> list[int]:
+        async with self._semaphore:
+            await self.access.acquire()
+
+            response = await self.client.post(
+                self.access.config.historic_ais_url + "/mmsiinarea",
+                json=HistoricConsumer.prepare_query_data(
+                    from_date=from_date, to_date=to_date, area=area
+                ),
+                headers={
+                    "Authorization": f"Bearer {self.access.access_token}",
+                    "Content-Type": "application/json",
+                },
+            )
+
+        if response.status_code != 200:
+            logger.warning(response.content)
+            raise RuntimeError(f"Failed to extract mmsis in area: {response.content}")
+
+        return response.json()
+
+    async def query_track(
+        self, mmsi: int, from_date: dt.datetime, to_date: dt.datetime
+    ) -> list[dict[str, any]]:
+        async with self._semaphore:
+            await self.access.acquire()
+
+            response = await self.client.get(
+                self.access.config.historic_ais_url
+                + f"/tracks/{mmsi}/{from_date.isoformat()}/{to_date.isoformat()}",
+                headers={
+                    "Authorization": f"Bearer {self.access.access_token}",
+                    "Content-Type": "application/json",
+                },
+            )
+
+        if response.status_code != 200:
+            logger.warning(response.content)
+            raise RuntimeError(f"Failed to extract mmsi track: {response.content}")
+
+        return response.json()
+
+    async def query_tracks(
+        self, mmsis: list[int], from_date: dt.datetime, to_date: dt.datetime
+    ) -> AsyncIterator[tuple[int, list[dict[str, any]]]]:
+        """
+        Query the tracks of all mmsis concurrently
+
+        :return: async iterator over (mmsi, track) in the order of completion
+        """
+
+        async def query(mmsi: int):
+            return mmsi, await self.query_track(
+                mmsi=mmsi, from_date=from_date, to_date=to_date
+            )
+
+        tasks = [asyncio.create_task(query(mmsi)) for mmsi in mmsis]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator
+
+import httpx
+
+from bwac.core.async_access import AsyncAccess
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLivestreamConsumer:
+    """
+    Live consumer for asyncio applications, which provides the messages of the
+    stream as async iterator
+
+    The stream is reconnected transparently when the token has to be renewed or
+    the connection fails.
+    """
+
+    client: httpx.AsyncClient
+    access: AsyncAccess
+    timeout_in_s: int
+
+    def __init__(self, client: httpx.AsyncClient | None = None):
+        """
+        :param client: client to use instead of creating one
+        """
+        if client is None:
+            # the stream has no read timeout, since messages can be sparse
+            client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10.0))
+
+        self.client = client
+        self.access = AsyncAccess(client=self.client)
+        self.timeout_in_s = 0
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def wait_for_timeout(self):
+        """
+        Create a timeout that increase on recurrent failure
+        """
+        self.timeout_in_s += 5
+        await asyncio.sleep(self.timeout_in_s)
+
+    def __aiter__(self) -> AsyncIterator[dict[str, any]]:
+        return self.messages()
+
+    async def messages(self) -> AsyncIterator[dict[str, any]]:
+        async for line in self.lines():
+            yield json.loads(line)
+
+    async def lines(self) -> AsyncIterator[str]:
+        """
+        Iterate over the raw lines of the stream
+        """
+        while True:
+            try:
+                await self.access.acquire()
+                expires_in = self.access.remaining_lifetime_in_s
+                start_time = time.monotonic()
+                async for line in self.get_lines(self.access.access_token, expires_in):
+                    # the connection works, so that the next failure starts a new backoff
+                    self.timeout_in_s = 0
+                    yield line
+            except httpx.HTTPError as e:
+                logger.warning(f"Protocol Error: {e}")
+                await self.wait_for_timeout()
+                continue
+
+            if time.monotonic() - start_time < expires_in:
+                # closed by the server before the token has to be renewed
+                logger.warning("AsyncLivestreamConsumer: stream closed by the server")
+                await self.wait_for_timeout()
+
+    async def get_lines(
+        self, access_token: str, timeout_in_s: int = 3500
+    ) -> AsyncIterator[str]:
+        """
+        Iterate over the lines of a single connection until the token expires
+        """
+        start_time = time.monotonic()
+        async with self.client.stream(
+            "GET",
+            self.access.config.live_ais_url,
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={
+                "modelType": "Full",
+                "modelFormat": "Json",
+            },
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield line
+
+                if time.monotonic() - start_time >= timeout_in_s:
+                    logger.debug(f"AsyncLivestreamConsumer: timeout after {timeout_in_s} seconds")
+                    return
@@ -0,0 +1,117 @@
+"""
+Module to open output files with streaming compression
+
+Appending to an existing file adds a new gzip member or zstd frame, so that
+files remain valid concatenations across restarts.
+"""
+
+import gzip
+from pathlib import Path
+from typing import IO, Iterator
+
+from bwac.utils import iter_blocks_backwards, iter_csv_records_backwards, iter_lines_backwards
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = ["none", "gzip", "zstd"]
+
+EXTENSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def require_compression(compression: str):
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown compression '{compression}' - expected one of {COMPRESSIONS}"
+        )
+
+    if compression == "zstd" and zstandard is None:
+        raise RuntimeError(
+            "zstd compression requires zstandard - install with 'pip install bwac[zstd]'"
+        )
+
+
+def compression_of(path: str | Path) -> str:
+    """
+    Get the compression of a file from its suffix
+    """
+    suffix = Path(path).suffix
+    for compression, extension in EXTENSIONS.items():
+        if extension and suffix == extension:
+            return compression
+    return "none"
+
+
+def open_file(
+    path: str | Path,
+    mode: str,
+    compression: str = "none",
+    level: int | None = None,
+    newline: str | None = None,
+) -> IO:
+    """
+    Open a file with the given compression
+
+    :param mode: mode as for open, e.g., 'at' or 'ab' to append
+    :param compression: one of COMPRESSIONS
+    :param level: compression level, None for the default of the compression
+    :param newline: newline handling in text mode as for open
+    """
+    text_kwargs = {"newline": newline} if "b" not in mode else {}
+
+    if compression == "gzip":
+        return gzip.open(
+            path, mode, compresslevel=9 if level is None else level, **text_kwargs
+        )
+
+    if compression == "zstd":
+        require_compression(compression)
+        cctx = None
+        if "r" not in mode:
+            cctx = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return zstandard.open(path, mode, cctx=cctx, **text_kwargs)
+
+    return open(path, mode.replace("t", ""), **text_kwargs)
+
+
+def iter_last_lines(path: str | Path, compression: str = "none") -> Iterator[str]:
+    """
+    Iterate over the non-empty lines of a possibly compressed text file from its end
+
+    Uncompressed files are read backwards from their end, compressed ones have
+    to be decompressed as a whole.
+    """
+    if compression == "none":
+        yield from iter_lines_backwards(path)
+        return
+
+    with open_file(path, "rt", compression=compression, newline="") as fp:
+        lines = [line.rstrip("\r\n") for line in fp]
+    yield from (line for line in reversed(lines) if line)
+
+
+def iter_last_csv_records(path: str | Path, compression: str = "none") -> Iterator[str]:
+    """
+    Iterate over the records of a possibly compressed csv file from its end, which may
+    span several lines, e.g., if a name contains a line break
+    """
+    if compression == "none":
+        yield from iter_csv_records_backwards(iter_blocks_backwards(path))
+        return
+
+    with open_file(path, "rb", compression=compression) as fp:
+        data = fp.read()
+    yield from iter_csv_records_backwards([data])
+
+
+def read_last_line(path: str | Path, compression: str = "none") -> str | None:
+    """
+    Read the last non-empty line of a possibly compressed text file
+    """
+    return next(iter_last_lines(path, compression=compression), None)
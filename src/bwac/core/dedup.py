@@ -0,0 +1,59 @@
+"""
+Module containing the de-duplication of messages, which are received more than once,
+e.g., across reconnects of the live stream
+"""
+
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 500000
+
+
+class LastSeenIndex:
+    """
+    Bounded index of the last seen message time per mmsi
+
+    A message is considered a duplicate, if it is not newer than the last seen
+    message of the same mmsi. Once capacity mmsis are tracked, the least recently
+    seen mmsi is evicted, so that memory remains fixed.
+    """
+
+    capacity: int
+    dropped: int
+    evicted: int
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError(f"LastSeenIndex: capacity must be positive, got {capacity}")
+
+        self.capacity = capacity
+        self.dropped = 0
+        self.evicted = 0
+
+        # ordered by the time an mmsi was last seen - an OrderedDict moves and evicts
+        # in constant time, whereas iterating a plain dict from its front gets slower
+        # with every deletion there
+        self._last_seen: OrderedDict[int, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def is_duplicate(self, mmsi: int, msgtime: float) -> bool:
+        """
+        Check a message and record it as last seen message of its mmsi otherwise
+
+        :param mmsi: the mmsi of the message
+        :param msgtime: the time of the message as POSIX timestamp
+        """
+        last_seen = self._last_seen.get(mmsi)
+        if last_seen is not None:
+            self._last_seen.move_to_end(mmsi)
+            if msgtime <= last_seen:
+                self.dropped += 1
+                return True
+
+        self._last_seen[mmsi] = msgtime
+        if len(self._last_seen) > self.capacity:
+            self._last_seen.popitem(last=False)
+            self.evicted += 1
+
+        return False
@@ -0,0 +1,177 @@
+"""
+Module containing the pool of open output files, which the consumers use to keep
+files open across writes without running out of file descriptors
+"""
+
+import contextlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, TextIO
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_OPEN_FILES = 256
+
+# an open file and its writer, e.g., a csv.DictWriter, or None if written directly
+PooledFile = tuple[TextIO | BinaryIO, any]
+
+
+class FilePool:
+    """
+    Bounded set of open files by path with least-recently-used eviction
+
+    A file is flushed and closed when it is evicted, so that it can be reopened for
+    appending later. Files, which are in use (see use), are never evicted - the pool
+    then temporarily exceeds max_open_files. The pool is safe to share between threads,
+    as long as each file is written by a single thread at a time. Files are opened
+    outside of the pool's lock, so that opening a file, which may read it, does not
+    block the other files.
+    """
+
+    max_open_files: int
+    evictions: int
+
+    def __init__(self, max_open_files: int = DEFAULT_MAX_OPEN_FILES):
+        """
+        :param max_open_files: maximum number of files kept open
+        """
+        if max_open_files < 1:
+            raise ValueError(f"FilePool: max_open_files must be at least 1, got {max_open_files}")
+
+        self.max_open_files = max_open_files
+        self.evictions = 0
+
+        self._files: OrderedDict[Path, PooledFile] = OrderedDict()
+        self._in_use: dict[Path, int] = {}
+        # files that are being opened, which other users of the same file wait for
+        self._opening: set[Path] = set()
+        self._lock = threading.RLock()
+        self._opened = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self._files
+
+    def keys(self) -> list[Path]:
+        with self._lock:
+            return list(self._files.keys())
+
+    def values(self) -> list[PooledFile]:
+        with self._lock:
+            return list(self._files.values())
+
+    def items(self) -> list[tuple[Path, PooledFile]]:
+        with self._lock:
+            return list(self._files.items())
+
+    def get(self, path: Path) -> PooledFile | None:
+        """
+        Get an open file and mark it as most recently used
+
+        :return: the file and its writer or None, if the file is not open
+        """
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._files.move_to_end(path)
+            return entry
+
+    def put(self, path: Path, entry: PooledFile) -> PooledFile:
+        """
+        Add an opened file, which evicts the least recently used files beyond max_open_files
+        """
+        with self._lock:
+            previous = self._files.pop(path, None)
+            if previous is not None and previous[0] is not entry[0]:
+                previous[0].close()
+
+            self._files[path] = entry
+            self._evict()
+        return entry
+
+    @contextlib.contextmanager
+    def use(self, path: Path, open: Callable[[Path], PooledFile]) -> Iterator[PooledFile]:
+        """
+        Provide the open file of path, which is opened if required and cannot be evicted
+        while in use
+
+        :param open: function to open the file at path and create its writer
+        """
+        # a file is marked as in use with its lookup, so that it is not evicted in between,
+        # and as being opened, so that it is not opened twice
+        with self._lock:
+            while path in self._opening:
+                self._opened.wait()
+
+            entry = self.get(path)
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+            if entry is None:
+                self._opening.add(path)
+
+        if entry is None:
+            try:
+                entry = open(path)
+            except BaseException:
+                with self._lock:
+                    self._release(path)
+                    self._opening.discard(path)
+                    self._opened.notify_all()
+                raise
+
+            with self._lock:
+                self.put(path, entry)
+                self._opening.discard(path)
+                self._opened.notify_all()
+
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                self._release(path)
+                self._evict()
+
+    def _release(self, path: Path):
+        self._in_use[path] -= 1
+        if self._in_use[path] == 0:
+            del self._in_use[path]
+
+    def _evict(self):
+        while len(self._files) > self.max_open_files:
+            path = next((x for x in self._files if x not in self._in_use), None)
+            if path is None:
+                return
+
+            logger.debug(f"FilePool: evicting {path}")
+            self.close(path)
+            self.evictions += 1
+
+    def flush(self, paths: Iterable[Path] | None = None):
+        """
+        Flush the given or all open files
+        """
+        with self._lock:
+            entries = self._files.values() if paths is None else [self._files.get(x) for x in paths]
+            for entry in entries:
+                if entry is not None and not entry[0].closed:
+                    entry[0].flush()
+
+    def close(self, path: Path):
+        """
+        Close a file, which flushes its pending output
+        """
+        with self._lock:
+            entry = self._files.pop(path, None)
+            if entry is not None:
+                entry[0].close()
+
+    def clear(self):
+        """
+        Close all files
+        """
+        with self._lock:
+            for path in list(self._files.keys()):
+                self.close(path)
@@ -1,16 +1,37 @@
+import csv
 import datetime as dt
+import io
 import logging
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import requests
 
 from bwac.core.access import Access
-from bwac.core.constants import BARENTS_WATCH_HISTORIC_AIS_URL
-from bwac.utils import read_timestamp, timestamp_to_txt
+from bwac.core.compression import EXTENSIONS, iter_last_csv_records, open_file, require_compression
+from bwac.core.file_pool import DEFAULT_MAX_OPEN_FILES, FilePool, PooledFile
+from bwac.core.manifest import Manifest
+from bwac.core.metrics import Metrics
+from bwac.core.scheduler import RequestScheduler
+from bwac.core.session import (
+    DEFAULT_CONNECT_TIMEOUT_IN_S,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_READ_TIMEOUT_IN_S,
+    create_session,
+)
+from bwac.core.sinks import ParquetFileWriter, read_last_rows, require_pyarrow, to_row
+from bwac.core.streaming import DEFAULT_CHUNK_SIZE, iter_json_array, iter_reversed
+from bwac.utils import as_utc, read_timestamp, timestamp_to_txt
 
 logger = logging.getLogger(__name__)
 
+HISTORIC_OUTPUT_FORMATS = ["csv", "parquet"]
+
+# maximum number of messages of a track that are written at once
+DEFAULT_WRITE_BATCH_SIZE = 10000
+
 # TODO: current areas have been coarsly defined with geojson.io
 #
 NorwayAreas = {
@@ -84,36 +105,297 @@ NorwayAreas = {
 }
 
 
+def encode_csv_row(data: dict[str, any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(data.values())
+    return buffer.getvalue()
+
+
+class TrackWriter:
+    """
+    Writer of an open csv track file, which skips messages that are older than the
+    last message in the file, e.g., when a track is downloaded again
+
+    Messages with the same time as the last message are kept, unless they repeat one
+    of the rows of that time, so that distinct messages sharing a msgtime are not lost.
+    """
+
+    writer: any
+    last_timestamp: dt.datetime | None
+
+    def __init__(
+        self,
+        writer: any,
+        last_timestamp: dt.datetime | None = None,
+        last_lines: Iterable[str] = (),
+    ):
+        """
+        :param writer: csv.writer of the file
+        :param last_timestamp: time of the last message in the file, None if the file is empty
+        :param last_lines: the rows in the file with the time of the last message
+        """
+        self.writer = writer
+        self.last_timestamp = last_timestamp
+        self._last_lines = set(last_lines)
+        # rows are only encoded when needed for a comparison
+        self._last_data = []
+
+    def is_written(self, data: dict[str, any]) -> bool:
+        """
+        Check whether a message with the time of the last message has been written
+        """
+        if self._last_data:
+            self._last_lines.update(encode_csv_row(x) for x in self._last_data)
+            self._last_data = []
+        return encode_csv_row(data) in self._last_lines
+
+    def write(self, messages: list[tuple[dt.datetime, dict[str, any]]]):
+        """
+        Write time-ordered messages
+        """
+        for timestamp, data in messages:
+            if self.last_timestamp is not None:
+                if timestamp < self.last_timestamp:
+                    # skip existing messages
+                    continue
+                if timestamp == self.last_timestamp:
+                    if self.is_written(data):
+                        continue
+                else:
+                    self._last_lines.clear()
+                    self._last_data = []
+
+            self.writer.writerow(data.values())
+            self.last_timestamp = timestamp
+            self._last_data.append(data)
+
+
+
+class ParquetTrackWriter:
+    """
+    Writer of a Parquet track file, which skips messages like TrackWriter and writes
+    each batch of messages as a row group
+
+    Only the last row group of an existing file is read to find its last messages,
+    which are then kept in memory.
+    """
+
+    file: ParquetFileWriter
+    last_timestamp: dt.datetime | None
+
+    def __init__(self, path: Path, compression: str = "none", compression_level: int | None = None):
+        """
+        :param path: path of the track file, which may exist already
+        :param compression: compression of the column chunks
+        :param compression_level: compression level, None for the default of the compression
+        """
+        self.file = ParquetFileWriter(
+            path, compression=compression, compression_level=compression_level
+        )
+        self.last_timestamp = None
+        # rows with the time of the last message as read from the file and as written
+        self._last_rows = read_last_rows(path) if path.exists() else []
+        self._last_data = []
+        if self._last_rows:
+            self.last_timestamp = self._last_rows[0]["msgtime"]
+
+    def write(self, messages: list[tuple[dt.datetime, dict[str, any]]]):
+        """
+        Write time-ordered messages
+        """
+        rows = []
+        for timestamp, data in messages:
+            if self.last_timestamp is not None:
+                if timestamp < self.last_timestamp:
+                    # skip existing messages
+                    continue
+                if timestamp == self.last_timestamp:
+                    if data in self._last_data or (self._last_rows and to_row(data) in self._last_rows):
+                        continue
+                else:
+                    self._last_rows = []
+                    self._last_data = []
+
+            rows.append(data)
+            self._last_data.append(data)
+            self.last_timestamp = timestamp
+
+        self.file.write(rows)
+
+    def close(self):
+        self.file.close()
+
 class HistoricConsumer:
     access: Access
+    session: requests.Session
+    timeout: tuple[float, float]
+    manifest: Manifest | None
+    output_format: str
+    compression: str
+    compression_level: int | None
+    stream_tracks: bool
+    scheduler: RequestScheduler
+    refresh_token: bool
+    metrics: Metrics | None
+    files: FilePool
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        connect_timeout_in_s: float = DEFAULT_CONNECT_TIMEOUT_IN_S,
+        read_timeout_in_s: float = DEFAULT_READ_TIMEOUT_IN_S,
+        manifest: Manifest | None = None,
+        output_format: str = "csv",
+        compression: str = "none",
+        compression_level: int | None = None,
+        stream_tracks: bool = False,
+        scheduler: RequestScheduler | None = None,
+        refresh_token: bool = False,
+        metrics: Metrics | None = None,
+        max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+    ):
+        """
+        :param pool_size: number of keep-alive connections, should be at least the number of workers
+        :param connect_timeout_in_s: timeout for establishing a connection
+        :param read_timeout_in_s: timeout for waiting on data of a response
+        :param manifest: manifest to cache results of completed queries, None to disable caching
+        :param output_format: format of the track files, 'csv' or 'parquet'
+        :param compression: compression of the track files, one of 'none', 'gzip' or 'zstd'
+        :param compression_level: compression level, None for the default of the compression
+        :param stream_tracks: decode tracks incrementally while they are received, see stream_track
+        :param scheduler: scheduler to limit and retry requests (default: retries with a concurrency of pool_size)
+        :param refresh_token: renew the access token in the background while tracks are downloaded
+        :param metrics: metrics to record requests and written messages, None to disable
+        :param max_open_files: maximum number of csv track files kept open across writes
+        """
+        if output_format not in HISTORIC_OUTPUT_FORMATS:
+            raise ValueError(
+                f"HistoricConsumer: unknown output format '{output_format}' - expected one of {HISTORIC_OUTPUT_FORMATS}"
+            )
+        if output_format == "parquet":
+            require_pyarrow()
+        require_compression(compression)
+
+        self.session = create_session(pool_size=pool_size)
+        self.timeout = (connect_timeout_in_s, read_timeout_in_s)
+        self.access = Access(session=self.session, timeout=self.timeout, metrics=metrics)
+        self.manifest = manifest
+        self.output_format = output_format
+        self.compression = compression
+        self.compression_level = compression_level
+        self.stream_tracks = stream_tracks
+        self.scheduler = scheduler
+        if scheduler is None:
+            self.scheduler = RequestScheduler(max_concurrency=pool_size)
+        self.refresh_token = refresh_token
+        self.metrics = metrics
+        self.files = FilePool(max_open_files=max_open_files)
+
+    def close(self):
+        self.files.clear()
+        self.access.stop_refresher()
+        self.session.close()
+        if self.manifest is not None:
+            self.manifest.close()
 
-    def __init__(self):
-        self.access = Access()
+    def __enter__(self):
+        return self
 
-    def query_all_mmsis(self, from_date: str, to_date: str):
-        mmsis = set()
-        for name, area in NorwayAreas.items():
-            areas_mmsis = self.query_mmsis_in_area(
-                from_date=from_date, to_date=to_date, area=area
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def query_all_mmsis(
+        self,
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        workers: int = len(NorwayAreas),
+    ) -> list[int]:
+        """
+        Query the mmsis of all NorwayAreas, whereas the areas are queried concurrently
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            areas_mmsis = executor.map(
+                lambda area: self.discover_mmsis_in_area(
+                    from_date=from_date, to_date=to_date, area=area
+                ),
+                NorwayAreas.values(),
+            )
+            mmsis = set().union(*areas_mmsis)
+        return sorted(mmsis)
+
+    def discover_mmsis_in_area(
+        self, from_date: dt.datetime, to_date: dt.datetime, area: list[list[float]]
+    ) -> list[int]:
+        """
+        Get the mmsis in an area, using the manifest's result if the area has
+        already been queried for this interval
+        """
+        if self.manifest is not None:
+            mmsis = self.manifest.get_discovery(
+                area=area, from_date=from_date, to_date=to_date
             )
-            mmsis = mmsis.union(areas_mmsis)
-        return sorted(list(mmsis))
+            if mmsis is not None:
+                return mmsis
+
+        mmsis = self.query_mmsis_in_area(
+            from_date=from_date, to_date=to_date, area=area
+        )
+        if self.manifest is not None:
+            self.manifest.add_discovery(
+                area=area, from_date=from_date, to_date=to_date, mmsis=mmsis
+            )
+        return mmsis
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send an authorized request through the scheduler, which retries it while it
+        is throttled or fails
+
+        :param kwargs: further arguments of requests.Session.request
+        """
+
+        def send():
+            self.access.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    headers={
+                        "Authorization": f"Bearer {self.access.access_token}",
+                        "Content-Type": "application/json",
+                    },
+                    timeout=self.timeout,
+                    **kwargs,
+                )
+            except Exception:
+                if self.metrics is not None:
+                    self.record_request(url, "error", start_time)
+                raise
+
+            if self.metrics is not None:
+                self.record_request(url, response.status_code, start_time)
+            return response
+
+        return self.scheduler.request(send, description=f"{method} {url}")
+
+    def record_request(self, url: str, status: int | str, start_time: float):
+        """
+        Record a request by its endpoint, i.e., 'mmsiinarea' or 'tracks'
+        """
+        endpoint = url.removeprefix(self.access.config.historic_ais_url).strip("/").split("/")[0]
+        self.metrics.http_request(endpoint, status, time.perf_counter() - start_time)
 
     def query_mmsis_in_area(
         self, from_date: str, to_date: str, area: list[list[float]]
     ):
-        self.access.acquire()
-
         query_data = self.prepare_query_data(
             from_date=from_date, to_date=to_date, area=area
         )
-        response = requests.post(
-            BARENTS_WATCH_HISTORIC_AIS_URL + "/mmsiinarea",
+        response = self.request(
+            "POST",
+            self.access.config.historic_ais_url + "/mmsiinarea",
             json=query_data,
-            headers={
-                "Authorization": f"Bearer {self.access.access_token}",
-                "Content-Type": "application/json",
-            },
         )
 
         if response.status_code != 200:
@@ -123,74 +405,301 @@ class HistoricConsumer:
         return response.json()
 
     def query_track(self, mmsi: int, from_date: dt.datetime, to_date: dt.datetime):
-        self.access.acquire()
-        response = requests.get(
-            BARENTS_WATCH_HISTORIC_AIS_URL
+        response = self.request(
+            "GET",
+            self.access.config.historic_ais_url
             + f"/tracks/{mmsi}/{from_date.isoformat()}/{to_date.isoformat()}",
-            headers={
-                "Authorization": f"Bearer {self.access.access_token}",
-                "Content-Type": "application/json",
-            },
         )
 
         if response.status_code != 200:
             logger.warning(response.__dict__)
             raise RuntimeError(f"Failed to extract mmsi track: {response.content}")
 
-        return response.json()
+        start_time = time.perf_counter()
+        track = response.json()
+        if self.metrics is not None:
+            self.metrics.parse_seconds.observe(time.perf_counter() - start_time, consumer="historic")
+        return track
+
+    def stream_track(
+        self, mmsi: int, from_date: dt.datetime, to_date: dt.datetime
+    ) -> Iterator[dict[str, any]]:
+        """
+        Query a track and decode its messages while the response is received,
+        so that memory use does not depend on the length of the track
+
+        The response is released once the iterator is exhausted or closed.
+        """
+        response = self.request(
+            "GET",
+            self.access.config.historic_ais_url
+            + f"/tracks/{mmsi}/{from_date.isoformat()}/{to_date.isoformat()}",
+            stream=True,
+        )
+
+        with response:
+            if response.status_code != 200:
+                logger.warning(response.__dict__)
+                raise RuntimeError(f"Failed to extract mmsi track: {response.content}")
+
+            yield from iter_json_array(response.iter_content(chunk_size=DEFAULT_CHUNK_SIZE))
+
+    def download_track(
+        self,
+        mmsi: int,
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        output_dir: str | Path,
+    ) -> int:
+        """
+        Download and save a track and record it in the manifest
+
+        :return: number of messages of the track
+        """
+        if not self.stream_tracks:
+            track = self.query_track(mmsi=mmsi, from_date=from_date, to_date=to_date)
+            rows = self.save_track(track, output_dir)
+        else:
+            # a body that breaks off is received again, whereas the messages that have
+            # been saved already are skipped
+            rows = self.scheduler.retry(
+                lambda: self.save_streamed_track(mmsi, from_date, to_date, output_dir),
+                description=f"track of {mmsi}",
+            )
+
+        if self.manifest is not None:
+            self.manifest.add_track(
+                mmsi=mmsi,
+                from_date=from_date,
+                to_date=to_date,
+                output=self.output,
+                rows=rows,
+            )
+        return rows
+
+    def save_streamed_track(
+        self,
+        mmsi: int,
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        output_dir: str | Path,
+    ) -> int:
+        """
+        Save a track while it is received, see stream_track
 
-    def prepare_query_data(self, from_date, to_date, area):
+        :return: number of messages of the track
+        """
+        track = self.stream_track(mmsi=mmsi, from_date=from_date, to_date=to_date)
+        try:
+            return self.save_track(track, output_dir)
+        finally:
+            track.close()
+
+    def download_tracks(
+        self,
+        mmsis: list[int],
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        output_dir: str | Path,
+        workers: int = 1,
+    ) -> Iterator[int]:
+        """
+        Download and save the tracks for the given mmsis using a pool of worker threads
+
+        Each worker writes only the files of its own mmsi, while the access token
+        is shared (and renewed) across all workers. Tracks, which the manifest lists
+        as completed, are skipped.
+
+        :return: iterator over the mmsis in the order their tracks have been saved
+        """
+        if self.manifest is not None:
+            completed = self.manifest.get_tracks(
+                from_date=from_date, to_date=to_date, output=self.output
+            )
+            if completed:
+                logger.info(
+                    f"Skipping {len(completed)} completed tracks from {from_date} to {to_date}"
+                )
+                yield from (mmsi for mmsi in mmsis if mmsi in completed)
+                mmsis = [mmsi for mmsi in mmsis if mmsi not in completed]
+
+        if not mmsis:
+            return
+
+        # acquire once upfront, so that the workers do not start with a renewal
+        self.access.acquire()
+        if self.refresh_token:
+            self.access.start_refresher()
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {
+                executor.submit(
+                    self.download_track,
+                    mmsi=mmsi,
+                    from_date=from_date,
+                    to_date=to_date,
+                    output_dir=output_dir,
+                ): mmsi
+                for mmsi in mmsis
+            }
+            for future in as_completed(futures):
+                future.result()
+                yield futures[future]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def output(self) -> str:
+        """
+        Kind of the output files, e.g., 'csv' or 'csv+gzip'
+        """
+        if self.compression == "none":
+            return self.output_format
+        return f"{self.output_format}+{self.compression}"
+
+    @staticmethod
+    def prepare_query_data(from_date, to_date, area):
         return {
             "polygon": {"coordinates": [area], "type": "Polygon"},
             "msgTimeFrom": timestamp_to_txt(from_date),
             "msgTimeTo": timestamp_to_txt(to_date),
         }
 
-    def save_track(self, track: list[dict[str, any]], output_dir: str | Path):
-        last_message_timestamps = {}
+    def save_track(
+        self,
+        track: Iterable[dict[str, any]],
+        output_dir: str | Path,
+        batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+    ) -> int:
+        """
+        Save a track to daily files AIS_<day>_<mmsi>.<csv[.gz|.zst]|parquet>, skipping messages
+        that are not newer than the last message already in a file
 
-        # reverse timeorder
-        for data in reversed(track):
-            timestamp = read_timestamp(data["msgtime"])
+        :param track: messages in reverse time order as returned by the api, either as list
+            or as iterator, e.g., from stream_track
+        :param batch_size: maximum number of messages that are written at once
+        :return: number of messages of the track
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
 
-            day = timestamp.strftime("%Y_%m_%d")
+        # collect consecutive messages of the same file into batches
+        batch_path = None
+        batch: list[tuple[dt.datetime, dict[str, any]]] = []
+        paths = set()
+        # Parquet files remain open for the whole track, so that each is written once
+        parquet_writers: dict[Path, ParquetTrackWriter] = {}
+        rows = 0
+        try:
+            for data in iter_reversed(track):
+                rows += 1
+                timestamp = as_utc(read_timestamp(data["msgtime"]))
 
-            output_dir = Path(output_dir)
-            if not output_dir.exists():
-                output_dir.mkdir(parents=True, exist_ok=True)
+                day = timestamp.strftime("%Y_%m_%d")
+                path = output_dir / f"AIS_{day}_{data['mmsi']}.{self.output_format}"
+                if self.output_format == "csv":
+                    path = path.with_name(path.name + EXTENSIONS[self.compression])
 
-            path = output_dir / f"AIS_{day}_{data['mmsi']}.csv"
-            if path not in last_message_timestamps:
-                msgtime_idx = list(data.keys()).index("msgtime")
+                if path != batch_path or len(batch) >= batch_size:
+                    if batch:
+                        self.write_batch(batch_path, batch, parquet_writers)
+                    batch_path = path
+                    paths.add(path)
+                    batch = []
+                batch.append((timestamp, data))
 
-                if path.exists():
-                    f = subprocess.run(
-                        ["tail", "-n", "1", path], stdout=subprocess.PIPE
-                    )
-                    last_msg_time = read_timestamp(
-                        f.stdout.decode("UTF-8").strip().split(",")[msgtime_idx]
-                    )
-                    last_message_timestamps[path] = last_msg_time
-                else:
-                    last_message_timestamps[path] = timestamp - dt.timedelta(seconds=1)
+            if batch:
+                self.write_batch(batch_path, batch, parquet_writers)
+        finally:
+            for writer in parquet_writers.values():
+                writer.close()
 
-            if last_message_timestamps[path] > timestamp:
-                # skip existing messages
-                continue
+        self.release_files(paths)
+        return rows
 
-            if timestamp.tzinfo is None:
-                timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+    def release_files(self, paths: Iterable[Path]):
+        """
+        Complete the files of a track on disk, while uncompressed files remain open
+        for further writes
 
-            write_header = False
-            if not path.exists():
-                write_header = True
+        Compressed files are closed, since they are only readable once their
+        compressed stream has been finished.
+        """
+        if self.compression == "none":
+            self.files.flush(paths)
+        else:
+            for path in paths:
+                self.files.close(path)
 
-            with open(path, "a") as fp:
-                if write_header:
-                    header = ",".join(data.keys())
-                    fp.write(f"{header}\n")
+    def write_batch(
+        self,
+        path: Path,
+        messages: list[tuple[dt.datetime, dict[str, any]]],
+        parquet_writers: dict[Path, ParquetTrackWriter],
+    ):
+        """
+        Write time-ordered messages to a single track file
 
-                values = ",".join([str(x) for x in data.values()])
-                fp.write(f"{values}\n")
+        :param parquet_writers: open Parquet files of the track by path
+        """
+        start_time = time.perf_counter()
+        if self.output_format == "parquet":
+            writer = parquet_writers.get(path)
+            if writer is None:
+                writer = ParquetTrackWriter(
+                    path, compression=self.compression, compression_level=self.compression_level
+                )
+                parquet_writers[path] = writer
+            writer.write(messages)
+        else:
+            self.write_messages(path, messages)
 
-                last_message_timestamps[path] = timestamp
+        if self.metrics is not None:
+            self.metrics.messages.inc(len(messages), consumer="historic")
+            self.metrics.write_seconds.observe(
+                time.perf_counter() - start_time, consumer="historic"
+            )
+
+    def write_messages(
+        self, path: Path, messages: list[tuple[dt.datetime, dict[str, any]]]
+    ):
+        """
+        Append time-ordered messages to a single csv file, which is kept open in the pool of files
+        """
+        fieldnames = list(messages[0][1].keys())
+        with self.files.use(path, lambda x: self.open_track_file(x, fieldnames)) as (_, writer):
+            writer.write(messages)
+
+    def open_track_file(self, path: Path, fieldnames: list[str]) -> PooledFile:
+        """
+        Open a csv track file for appending and read its last message
+        """
+        last_timestamp = None
+        last_lines = []
+        write_header = not path.exists() or path.stat().st_size == 0
+        if not write_header:
+            msgtime_idx = fieldnames.index("msgtime")
+            last_msgtime = None
+            for line in iter_last_csv_records(path, compression=self.compression):
+                msgtime = next(csv.reader(io.StringIO(line, newline="")))[msgtime_idx]
+                if msgtime == "msgtime" or (last_msgtime is not None and msgtime != last_msgtime):
+                    # header or older message
+                    break
+                last_msgtime = msgtime
+                last_lines.append(line)
+
+            if last_msgtime is not None:
+                last_timestamp = as_utc(read_timestamp(last_msgtime))
+
+        fp = open_file(
+            path,
+            "at",
+            compression=self.compression,
+            level=self.compression_level,
+            newline="",
+        )
+        writer = csv.writer(fp, lineterminator="\n")
+        if write_header:
+            writer.writerow(fieldnames)
+        return fp, TrackWriter(writer, last_timestamp=last_timestamp, last_lines=last_lines)
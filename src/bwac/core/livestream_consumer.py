@@ -1,27 +1,376 @@
-import csv
+import contextlib
 import datetime as dt
 import json
 import logging
+import signal
+import sys
+import threading
 import time
+from collections import deque
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, TextIO
 
 import requests
 
 from bwac.core.access import Access
+from bwac.core.compression import require_compression
 from bwac.core.constants import BARENTS_WATCH_LIVE_AIS_URL
-from bwac.utils import read_timestamp
+from bwac.core.dedup import LastSeenIndex
+from bwac.core.file_pool import FilePool
+from bwac.core.metrics import Metrics
+from bwac.core.pipeline import (
+    DEFAULT_QUEUE_SIZE,
+    OVERFLOW_POLICIES,
+    LineQueue,
+    RecentLines,
+    StreamReader,
+)
+from bwac.core.sinks import OUTPUT_FORMATS, Sink, create_sink, require_pyarrow
+from bwac.utils import as_utc, read_timestamp
 
 logger = logging.getLogger(__name__)
 
 # Example data: b{"courseOverGround":268,"latitude":66.004573,"longitude":8.029767,"name":"TRANSOCEAN ENCOURAGE","rateOfTurn":-3,"shipType":90,"speedOverGround":0,"trueHeading":225,"navigationalStatus":3,"mmsi":258627000,"msgtime":"2025-07-24T10:14:50+00:00"}'
 
+MSGTIME_FIELD = b'"msgtime":"'
+
+# besides the current day only the previous day remains open for delayed messages
+LIVE_MAX_OPEN_FILES = 2
+
+# every flush ends a compressed block, so compressed output is flushed in intervals
+DEFAULT_COMPRESSED_FLUSH_INTERVAL_MS = 1000
+
+DEFAULT_PROGRESS_INTERVAL_MS = 500
+DEFAULT_PROGRESS_LOG_INTERVAL_IN_S = 60.0
+
+
+class FlushPolicy:
+    """
+    Defines when the buffered output of the live consumer is flushed to disk
+
+    Independent of the policy, output is always flushed on day rollover and
+    shutdown - setting neither every_n_messages nor every_ms limits flushing
+    to these events.
+    """
+
+    every_n_messages: int | None
+    every_ms: int | None
+
+    def __init__(self, every_n_messages: int | None = 1, every_ms: int | None = None):
+        self.every_n_messages = every_n_messages
+        self.every_ms = every_ms
+
+    @classmethod
+    def for_compression(cls, compression: str) -> "FlushPolicy":
+        """
+        Get the default policy for output with the given compression: uncompressed output
+        is flushed after every message, compressed output every
+        DEFAULT_COMPRESSED_FLUSH_INTERVAL_MS, since flushing a compressed stream ends its
+        block and thereby reduces the compression ratio
+        """
+        if compression == "none":
+            return cls()
+        return cls(every_n_messages=None, every_ms=DEFAULT_COMPRESSED_FLUSH_INTERVAL_MS)
+
+    def requires_flush(self, pending_messages: int, last_flush_time: float) -> bool:
+        """
+        :param pending_messages: number of messages written since the last flush
+        :param last_flush_time: time of the last flush as given by time.monotonic()
+        """
+        if self.every_n_messages and pending_messages >= self.every_n_messages:
+            return True
+
+        if self.every_ms and (time.monotonic() - last_flush_time) * 1000 >= self.every_ms:
+            return True
+
+        return False
+
+
+def read_raw_field(line: bytes, name: bytes) -> bytes | None:
+    """
+    Get the value of a top-level field of a raw JSON message without decoding it
+
+    :return: the value (without quotes for strings) or None if the field could not be found
+    """
+    key = b'"' + name + b'":'
+    idx = line.find(key)
+    if idx < 0:
+        return None
+
+    start = idx + len(key)
+    while line[start : start + 1] == b" ":
+        start += 1
+
+    if line[start : start + 1] == b'"':
+        end = line.find(b'"', start + 1)
+        return None if end < 0 else line[start + 1 : end]
+
+    end = start
+    while end < len(line) and line[end] not in b",}":
+        end += 1
+    return line[start:end].strip()
+
+
+def read_day(line: bytes) -> str | None:
+    """
+    Get the day (YYYY_mm_dd) of a raw JSON message by slicing its msgtime without decoding it
+
+    :return: the day or None if the msgtime could not be found
+    """
+    idx = line.find(MSGTIME_FIELD)
+    if idx < 0:
+        return None
+
+    start = idx + len(MSGTIME_FIELD)
+    date = line[start : start + 10]
+    if len(date) != 10 or date[4:5] != b"-" or date[7:8] != b"-":
+        return None
+
+    return date.replace(b"-", b"_").decode("ascii")
+
+
+def prepare_output_dir(output_dir: Path | str | None) -> Path:
+    if output_dir is None:
+        return Path()
+
+    output_dir = Path(output_dir)
+    if not output_dir.exists():
+        output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir
+
+
+class ProgressReporter:
+    """
+    Reports the progress of the live consumer at most every interval_ms
+
+    On a terminal the progress is shown as a single, updated line. Otherwise, e.g., under
+    systemd, it is logged every log_interval_in_s. The rate is averaged over the last
+    window_in_s and the lag of the last message is only decoded when a report is due.
+    """
+
+    interval_ms: int
+    log_interval_in_s: float
+    window_in_s: float
+    stream: TextIO
+    is_tty: bool
+    status: Callable[[float], str] | None
+    messages: int
+
+    def __init__(
+        self,
+        interval_ms: int = DEFAULT_PROGRESS_INTERVAL_MS,
+        log_interval_in_s: float = DEFAULT_PROGRESS_LOG_INTERVAL_IN_S,
+        window_in_s: float = 10.0,
+        stream: TextIO | None = None,
+    ):
+        """
+        :param interval_ms: minimum interval between updates of the progress line, 0 to disable reporting
+        :param log_interval_in_s: interval between progress log lines, if stream is not a terminal
+        :param window_in_s: time over which the message rate is averaged
+        :param stream: stream of the progress line (default: sys.stdout)
+        """
+        self.interval_ms = interval_ms
+        self.log_interval_in_s = log_interval_in_s
+        self.window_in_s = window_in_s
+        self.stream = stream if stream is not None else sys.stdout
+        self.is_tty = self.stream.isatty()
+        # provides further details of the consumer for a report given time.monotonic()
+        self.status = None
+        self.messages = 0
+
+        self._interval_in_s = interval_ms / 1000 if self.is_tty else log_interval_in_s
+        self._next_report_at = time.monotonic() + self._interval_in_s
+        self._history = deque([(time.monotonic(), 0)])
+        self._line = None
+        self._day = None
+
+    def update(self, line: bytes, day: str, now: float):
+        """
+        Count a message and report if the interval has passed
+
+        :param now: the current time.monotonic()
+        """
+        self.messages += 1
+        self._line = line
+        self._day = day
+        if now >= self._next_report_at and self.interval_ms > 0:
+            self.report(now)
+
+    def rate(self, now: float) -> float:
+        """
+        Get the number of messages per second in the window before now
+        """
+        self._history.append((now, self.messages))
+        while len(self._history) > 2 and now - self._history[1][0] >= self.window_in_s:
+            self._history.popleft()
+
+        start_time, start_messages = self._history[0]
+        if now <= start_time:
+            return 0.0
+        return (self.messages - start_messages) / (now - start_time)
+
+    def lag(self) -> float | None:
+        """
+        Get the time between the last message and now in seconds
+        """
+        msgtime = read_raw_field(self._line, b"msgtime") if self._line else None
+        if msgtime is None:
+            return None
+
+        timestamp = as_utc(read_timestamp(msgtime.decode("ascii")))
+        return (dt.datetime.now(tz=dt.timezone.utc) - timestamp).total_seconds()
+
+    def format(self, now: float) -> str:
+        lag = self.lag()
+        lag_txt = f"{lag:.1f} s" if lag is not None else "unknown"
+        text = (
+            f"Processed {self.messages} messages ({self.rate(now):.0f} msg/s, lag: {lag_txt})"
+            f" - current day: {self._day}"
+        )
+        if self.status is not None:
+            text += self.status(now)
+        return text
+
+    def report(self, now: float):
+        self._next_report_at = now + self._interval_in_s
+        if self.is_tty:
+            print(self.format(now), end="\r", file=self.stream, flush=True)
+        else:
+            logger.info(self.format(now))
+
+    def close(self):
+        """
+        End the progress line on a terminal
+        """
+        if self.is_tty and self.messages > 0 and self.interval_ms > 0:
+            print(file=self.stream, flush=True)
+
+
+class LiveStream:
+    """
+    A single authenticated connection to the live stream, which is drained into a queue
+    """
+
+    response: requests.Response
+    reader: StreamReader
+    renew_at: float
+
+    def __init__(self, response: requests.Response, reader: StreamReader, renew_at: float):
+        """
+        :param renew_at: time.monotonic() at which the stream's token has to be renewed
+        """
+        self.response = response
+        self.reader = reader
+        self.renew_at = renew_at
+
+    def close(self):
+        # closing the response unblocks the reader
+        self.response.close()
+        self.reader.stop()
+
+
+def raise_system_exit(signum, frame):
+    raise SystemExit(f"Received signal {signal.Signals(signum).name}")
+
+
 class LivestreamConsumer:
     timeout_in_s: int
-    open_files: dict[str, any]
+    _url: str | None
+    open_files: FilePool
+    output_format: str
+    compression: str
+    compression_level: int | None
+    sink: Sink | None
+    queue_size: int
+    overflow: str
+    spill_dir: str | Path | None
+    queue: LineQueue | None
+    seamless_renewal: bool
+    renewal_margin_in_s: int
+    handover_in_s: int
+    last_seen: LastSeenIndex | None
+    flush_policy: FlushPolicy
+    pending_messages: int
+    last_flush_time: float
+    metrics: Metrics | None
+    progress: ProgressReporter
+
+    def __init__(
+        self,
+        output_format: str = "csv",
+        flush_policy: FlushPolicy | None = None,
+        queue_size: int = 0,
+        overflow: str = "block",
+        spill_dir: str | Path | None = None,
+        seamless_renewal: bool = False,
+        renewal_margin_in_s: int = 300,
+        handover_in_s: int = 5,
+        deduplicate_capacity: int | None = None,
+        compression: str = "none",
+        compression_level: int | None = None,
+        url: str | None = None,
+        metrics: Metrics | None = None,
+        progress: ProgressReporter | None = None,
+    ):
+        """
+        :param output_format: 'csv' or 'parquet' to write the decoded messages or 'raw' to archive the received lines as NDJSON
+        :param flush_policy: policy to flush written messages to disk (default: see FlushPolicy.for_compression)
+        :param queue_size: size of the queue between the stream reader and the writer, 0 to read and write inline
+        :param overflow: policy when the queue is full, see LineQueue
+        :param spill_dir: directory for spilled messages (default: the output directory)
+        :param seamless_renewal: renew the token without reconnect gap, see get_data_seamless
+        :param renewal_margin_in_s: time before the token expires at which a seamless renewal starts
+        :param handover_in_s: time during which old and renewed stream overlap
+        :param deduplicate_capacity: number of mmsis tracked to drop duplicate messages, None to keep all messages
+        :param compression: compression of the output files, one of 'none', 'gzip' or 'zstd'
+        :param compression_level: compression level, None for the default of the compression
+        :param url: url of the live stream (default: as configured in BarentsWatchSettings when
+            started, otherwise BARENTS_WATCH_LIVE_AIS_URL)
+        :param metrics: metrics to record messages, latencies and reconnects, None to disable
+        :param progress: reporter of the progress (default: rate-limited reports to stdout)
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"LivestreamConsumer: unknown output format '{output_format}' - expected one of {OUTPUT_FORMATS}"
+            )
+
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"LivestreamConsumer: unknown overflow policy '{overflow}' - expected one of {OVERFLOW_POLICIES}"
+            )
+
+        if output_format == "parquet":
+            require_pyarrow()
+        require_compression(compression)
 
-    def __init__(self):
         self.timeout_in_s = 0
-        self.open_files = {}
+        self._url = url
+        self.output_format = output_format
+        self.compression = compression
+        self.compression_level = compression_level
+        self.sink = None
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.spill_dir = spill_dir
+        self.queue = None
+        self.seamless_renewal = seamless_renewal
+        self.renewal_margin_in_s = renewal_margin_in_s
+        self.handover_in_s = handover_in_s
+        self.last_seen = None
+        if deduplicate_capacity is not None:
+            self.last_seen = LastSeenIndex(capacity=deduplicate_capacity)
+        self.open_files = FilePool(max_open_files=LIVE_MAX_OPEN_FILES)
+        self.flush_policy = flush_policy
+        if flush_policy is None:
+            self.flush_policy = FlushPolicy.for_compression(compression)
+        self.pending_messages = 0
+        self.last_flush_time = time.monotonic()
+        self.metrics = metrics
+        self.progress = progress if progress is not None else ProgressReporter()
+
+    @property
+    def url(self) -> str:
+        return self._url if self._url is not None else BARENTS_WATCH_LIVE_AIS_URL
 
     def wait_for_timeout(self):
         """
@@ -37,92 +386,355 @@ class LivestreamConsumer:
         """
         self.timeout_in_s = 0
 
+    def flush(self):
+        """
+        Flush all open output files
+        """
+        if self.sink is not None:
+            self.sink.flush()
+
+        self.pending_messages = 0
+        self.last_flush_time = time.monotonic()
+
+    def close(self):
+        """
+        Close all open output files, which flushes pending output
+        """
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def get_sink(self, output_dir: Path) -> Sink:
+        if self.sink is None or self.sink.output_dir != output_dir:
+            self.close()
+            self.sink = create_sink(
+                self.output_format,
+                output_dir,
+                self.open_files,
+                compression=self.compression,
+                compression_level=self.compression_level,
+            )
+        return self.sink
+
+    def is_raw_duplicate(self, line: bytes) -> bool:
+        mmsi = read_raw_field(line, b"mmsi")
+        msgtime = read_raw_field(line, b"msgtime")
+        if mmsi is None or msgtime is None:
+            data = json.loads(line)
+            mmsi, msgtime = data["mmsi"], data["msgtime"]
+        else:
+            msgtime = msgtime.decode("ascii")
+
+        timestamp = as_utc(read_timestamp(msgtime))
+        return self.last_seen.is_duplicate(int(mmsi), timestamp.timestamp())
+
+    def write_decoded(self, sink: Sink, line: bytes) -> str:
+        """
+        Decode a message and write it to the file of its day
+
+        :return: the day of the message
+        """
+        start_time = time.perf_counter()
+        data = json.loads(line.decode("UTF-8"))
+
+        timestamp = read_timestamp(data["msgtime"])
+        day = timestamp.strftime("%Y_%m_%d")
+
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+
+        if self.metrics is not None:
+            self.record_message(line, timestamp, start_time)
+
+        if self.last_seen is not None and self.last_seen.is_duplicate(
+            data["mmsi"], timestamp.timestamp()
+        ):
+            if self.metrics is not None:
+                self.metrics.duplicates.inc(consumer="live")
+            return day
+
+        start_time = time.perf_counter()
+        sink.write(day, line, data=data, timestamp=timestamp)
+        if self.metrics is not None:
+            self.metrics.write_seconds.observe(time.perf_counter() - start_time, consumer="live")
+        return day
+
+    def write_raw(self, sink: Sink, line: bytes) -> str:
+        """
+        Write a message unchanged to the file of its day
+
+        :return: the day of the message
+        """
+        start_time = time.perf_counter()
+        day = read_day(line)
+        if day is None:
+            day = read_timestamp(json.loads(line)["msgtime"]).strftime("%Y_%m_%d")
+
+        if self.metrics is not None:
+            # the lag requires the full msgtime, which raw archiving does not need otherwise
+            msgtime = read_raw_field(line, b"msgtime")
+            timestamp = None
+            if msgtime is not None:
+                timestamp = as_utc(read_timestamp(msgtime.decode("ascii")))
+            self.record_message(line, timestamp, start_time)
+
+        if self.last_seen is not None and self.is_raw_duplicate(line):
+            if self.metrics is not None:
+                self.metrics.duplicates.inc(consumer="live")
+            return day
+
+        start_time = time.perf_counter()
+        sink.write(day, line)
+        if self.metrics is not None:
+            self.metrics.write_seconds.observe(time.perf_counter() - start_time, consumer="live")
+        return day
+
+    def record_message(self, line: bytes, timestamp: dt.datetime | None, start_time: float):
+        """
+        Record a received message, the time to parse it since start_time and its lag
+        """
+        self.metrics.parse_seconds.observe(time.perf_counter() - start_time, consumer="live")
+        self.metrics.message("live", len(line), timestamp)
+        if self.queue is not None:
+            self.metrics.queue_depth.set(self.queue.depth)
+
+    @contextlib.contextmanager
+    def read_lines(
+        self, response: requests.Response, output_dir: Path
+    ) -> Iterator[Iterable[bytes]]:
+        """
+        Provide the lines of the stream - with a queue_size > 0 the stream is drained
+        by a separate reader thread, so that slow writes do not stall the connection
+        """
+        if self.queue_size <= 0:
+            yield response.iter_lines()
+            return
+
+        self.queue = LineQueue(
+            maxsize=self.queue_size,
+            overflow=self.overflow,
+            spill_dir=output_dir if self.spill_dir is None else self.spill_dir,
+        )
+        reader = StreamReader(response.iter_lines(), self.queue)
+        reader.start()
+        try:
+            yield self.queue
+        finally:
+            # closing the response unblocks the reader
+            response.close()
+            reader.stop()
+
+        if reader.error is not None:
+            raise reader.error
+
+    def write_line(self, line: bytes, output_dir: Path) -> str:
+        """
+        Write a message in the output format and flush according to the flush policy
+
+        :return: the day of the message
+        """
+        sink = self.get_sink(output_dir)
+        if sink.decodes:
+            day = self.write_decoded(sink, line)
+        else:
+            day = self.write_raw(sink, line)
+
+        self.pending_messages += 1
+        if self.flush_policy.requires_flush(self.pending_messages, self.last_flush_time):
+            self.flush()
+
+        return day
+
     def get_data(
         self, access_token: str, timeout_in_s: int = 3500, output_dir: Path | str = None
     ):
-        if output_dir is None:
-            output_dir = Path()
-        else:
-            output_dir = Path(output_dir)
-            if not output_dir.exists():
-                output_dir.mkdir(parents=True, exist_ok=True)
+        output_dir = prepare_output_dir(output_dir)
 
         self.timeout_in_s = timeout_in_s
 
         session = requests.Session()
         headers = {"Authorization": f"Bearer {access_token}"}
 
-        start_time = dt.datetime.now()
-        with session.get(
-            url=BARENTS_WATCH_LIVE_AIS_URL, headers=headers, stream=True,
+        renew_at = time.monotonic() + self.timeout_in_s
+
+        def status(now: float) -> str:
+            text = f" -- (token renewal in: {int(renew_at - now)} s)"
+            if self.queue is not None:
+                text += f" -- (queue depth: {self.queue.depth}, dropped: {self.queue.dropped}, spilled: {self.queue.spilled})"
+            return text
+
+        self.progress.status = status
+        try:
+            with session.get(
+                url=self.url, headers=headers, stream=True,
+                params={
+                    "modelType": "Full",
+                    "modelFormat": "Json",
+                }
+            ) as response, self.read_lines(response, output_dir) as lines:
+                if self.metrics is not None:
+                    self.metrics.http_request(
+                        "live", response.status_code, response.elapsed.total_seconds()
+                    )
+                for line in lines:
+                    if line:
+                        day = self.write_line(line, output_dir)
+
+                        now = time.monotonic()
+                        self.progress.update(line, day, now)
+                        if now >= renew_at:
+                            raise RuntimeError(
+                                f"Consumer.get_data: timeout after {self.timeout_in_s} seconds"
+                            )
+        finally:
+            self.flush()
+
+    def open_stream(
+        self, session: requests.Session, access: Access, queue: LineQueue
+    ) -> LiveStream:
+        """
+        Open a stream with the current token of access, whose lines are added to queue
+        """
+        response = session.get(
+            url=self.url,
+            headers={"Authorization": f"Bearer {access.access_token}"},
+            stream=True,
             params={
                 "modelType": "Full",
                 "modelFormat": "Json",
-            }
-        ) as response:
-            for idx, line in enumerate(response.iter_lines()):
-                if line:
-                    data = json.loads(line.decode("UTF-8"))
-
-                    timestamp = read_timestamp(data["msgtime"])
-                    day = timestamp.strftime("%Y_%m_%d")
-                    path = output_dir / f"AIS_{day}.csv"
-
-                    if timestamp.tzinfo is None:
-                        timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
-
-                    # considering maximum 2h delay
-                    if (
-                        len(self.open_files) == 2
-                        and (
-                            dt.datetime.now(dt.timezone.utc) - timestamp
-                        ).total_seconds()
-                        > 7200
-                    ):
-                        prev_day_filename = sorted(self.open_files.keys())[0]
-                        self.open_files[prev_day_filename].close()
-                        del self.open_files[prev_day_filename]
-
-
-                    if path not in self.open_files or self.open_files[path][0].closed:
-                        write_header = not path.exists()
-                        fp = open(path, "a", newline="")
-                        writer = csv.DictWriter(fp, fieldnames=list(data.keys()), quoting=csv.QUOTE_MINIMAL)
-                        self.open_files[path] = (fp, writer)
-                        if write_header:
-                            writer.writeheader()
-
-                    fp, writer = self.open_files[path]
-                    writer.writerow(data)
-                    fp.flush()
-
-                    delta_time = (dt.datetime.now() - start_time).total_seconds()
-                    print(
-                        f"Processed {idx} message - current day: {day} -- (token used since: {int(delta_time)} s, renewal after: {self.timeout_in_s} s)",
-                        end="\r",
-                        flush=True,
-                    )
-                    if delta_time >= self.timeout_in_s:
-                        raise RuntimeError(
-                            f"Consumer.get_data: timeout after {self.timeout_in_s} seconds"
-                        )
+            },
+        )
+        if self.metrics is not None:
+            self.metrics.http_request(
+                "live", response.status_code, response.elapsed.total_seconds()
+            )
+        if response.status_code != 200:
+            response.close()
+            raise RuntimeError(
+                f"LivestreamConsumer.open_stream: failed with status {response.status_code}"
+            )
 
-    def start(self, output_dir: Path | str = None):
-        access = Access()
-        while True:
-            try:
-                access.acquire()
-                self.get_data(
-                    access.access_token, access.expires_in, output_dir=output_dir
-                )
+        reader = StreamReader(response.iter_lines(), queue, close_queue=False)
+        reader.start()
+
+        renew_at = time.monotonic() + access.remaining_lifetime_in_s - self.renewal_margin_in_s
+        return LiveStream(response=response, reader=reader, renew_at=renew_at)
+
+    def get_data_seamless(self, access: Access, output_dir: Path | str = None):
+        """
+        Consume the stream and renew the token make-before-break
+
+        Before the token expires, a second stream is opened with a renewed token.
+        Both streams feed the same queue for handover_in_s seconds, while messages
+        received on both are de-duplicated, before the old stream is closed.
+        """
+        output_dir = prepare_output_dir(output_dir)
+
+        session = requests.Session()
+        self.queue = LineQueue(
+            maxsize=self.queue_size if self.queue_size > 0 else DEFAULT_QUEUE_SIZE,
+            overflow=self.overflow,
+            spill_dir=output_dir if self.spill_dir is None else self.spill_dir,
+        )
+        recent_lines = RecentLines()
+        deduplicate_until = None
+
+        access.acquire()
+        streams = [self.open_stream(session, access, self.queue)]
+        ended_stream = None
+
+        self.progress.status = lambda now: (
+            f" -- (renewal in: {int(streams[-1].renew_at - now)} s)"
+            f" -- (queue depth: {self.queue.depth}, dropped: {self.queue.dropped}, spilled: {self.queue.spilled})"
+        )
+        try:
+            while True:
+                line = self.queue.get(timeout_in_s=1.0)
+                now = time.monotonic()
+
+                if len(streams) == 1 and now >= streams[0].renew_at:
+                    try:
+                        access.acquire(force=True)
+                        streams.append(self.open_stream(session, access, self.queue))
+                        deduplicate_until = now + 2 * self.handover_in_s
+                        logger.info("LivestreamConsumer: token renewed - handing over to new stream")
+                    except Exception as e:
+                        logger.warning(f"LivestreamConsumer: failed to open renewed stream: {e}")
+                        streams[0].renew_at = now + 10
+
+                if len(streams) == 2 and now >= deduplicate_until - self.handover_in_s:
+                    # keep deduplicating while lines of the old stream are still queued
+                    streams.pop(0).close()
+
+                for stream in [x for x in streams if not x.reader.is_alive()]:
+                    streams.remove(stream)
+                    stream.close()
+                    ended_stream = stream
+                    if streams:
+                        logger.warning(f"LivestreamConsumer: stream ended during handover: {stream.reader.error}")
+
+                if line is None:
+                    if not streams:
+                        # all streams ended and the queue has been drained
+                        if ended_stream.reader.error is not None:
+                            raise ended_stream.reader.error
+                        raise ConnectionError("LivestreamConsumer.get_data_seamless: stream ended")
+                    continue
+
+                if deduplicate_until is not None:
+                    if now < deduplicate_until:
+                        if recent_lines.seen(line):
+                            continue
+                    else:
+                        recent_lines.clear()
+                        deduplicate_until = None
+
+                day = self.write_line(line, output_dir)
+                self.progress.update(line, day, now)
+                # the stream delivers data, so that the next failure starts a new backoff
                 self.reset_timeout()
-            except RuntimeError as e:
-                if "timeout after" in f"{e}":
-                    pass
-                else:
-                    raise
-            except Exception as e:
-                logger.warning(f"Protocol Error: {e}")
-                self.wait_for_timeout()
-            finally:
-                [fp.close() for _,(fp,_) in self.open_files.items()]
+        finally:
+            for stream in streams:
+                stream.close()
+            self.flush()
+
+    def start(self, output_dir: Path | str = None):
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            # ensure that pending output is written when being terminated
+            previous_handler = signal.signal(signal.SIGTERM, raise_system_exit)
+
+        access = Access(metrics=self.metrics)
+        if self._url is None:
+            self._url = access.config.live_ais_url
+
+        try:
+            reconnect = False
+            while True:
+                if reconnect and self.metrics is not None:
+                    self.metrics.reconnects.inc()
+                reconnect = True
+                try:
+                    if self.seamless_renewal:
+                        self.get_data_seamless(access, output_dir=output_dir)
+                    else:
+                        access.acquire()
+                        self.get_data(
+                            access.access_token, access.remaining_lifetime_in_s, output_dir=output_dir
+                        )
+                    self.reset_timeout()
+                except RuntimeError as e:
+                    if "timeout after" in f"{e}":
+                        pass
+                    else:
+                        raise
+                except Exception as e:
+                    logger.warning(f"Protocol Error: {e}")
+                    self.wait_for_timeout()
+        finally:
+            # files remain open across reconnects, which matters for sinks
+            # that cannot append to existing files
+            self.close()
+            self.progress.close()
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
@@ -0,0 +1,154 @@
+"""
+Module containing the persistent manifest of a historic download, which records
+the work that has already been completed
+"""
+
+import datetime as dt
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = ".bwac-manifest.sqlite"
+
+
+def area_key(area: list[list[float]]) -> str:
+    """
+    Get a stable key for a polygon, so that changed polygons do not match older entries
+    """
+    return hashlib.sha1(json.dumps(area).encode("UTF-8")).hexdigest()
+
+
+def is_completed(to_date: dt.datetime) -> bool:
+    """
+    Check whether an interval lies completely in the past, so that its results can
+    no longer change
+    """
+    if to_date.tzinfo is None:
+        to_date = to_date.replace(tzinfo=dt.timezone.utc)
+    return to_date < dt.datetime.now(tz=dt.timezone.utc)
+
+
+class Manifest:
+    path: Path
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # the manifest is shared between worker threads, so access is serialized by a lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS discoveries ("
+                " area TEXT NOT NULL,"
+                " from_date TEXT NOT NULL,"
+                " to_date TEXT NOT NULL,"
+                " mmsis TEXT NOT NULL,"
+                " PRIMARY KEY (area, from_date, to_date)"
+                ")"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " mmsi INTEGER NOT NULL,"
+                " from_date TEXT NOT NULL,"
+                " to_date TEXT NOT NULL,"
+                " output TEXT NOT NULL,"
+                " rows INTEGER NOT NULL,"
+                " PRIMARY KEY (mmsi, from_date, to_date, output)"
+                ")"
+            )
+
+    @classmethod
+    def in_directory(cls, output_dir: str | Path) -> "Manifest":
+        return cls(Path(output_dir) / MANIFEST_FILENAME)
+
+    def get_discovery(
+        self, area: list[list[float]], from_date: dt.datetime, to_date: dt.datetime
+    ) -> list[int] | None:
+        """
+        Get the mmsis of a completed discovery or None if there is no such discovery
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT mmsis FROM discoveries WHERE area=? AND from_date=? AND to_date=?",
+                (area_key(area), from_date.isoformat(), to_date.isoformat()),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def add_discovery(
+        self,
+        area: list[list[float]],
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        mmsis: list[int],
+    ):
+        if not is_completed(to_date):
+            logger.debug(f"Manifest: interval until {to_date} is ongoing - not recording")
+            return
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO discoveries VALUES (?, ?, ?, ?)",
+                (
+                    area_key(area),
+                    from_date.isoformat(),
+                    to_date.isoformat(),
+                    json.dumps(sorted(mmsis)),
+                ),
+            )
+
+    def get_tracks(
+        self, from_date: dt.datetime, to_date: dt.datetime, output: str
+    ) -> dict[int, int]:
+        """
+        Get the completed tracks of an interval
+
+        :param output: the kind of output files, e.g., 'csv+gzip', since tracks have to be
+            downloaded again for a different output
+        :return: number of messages by mmsi
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT mmsi, rows FROM tracks WHERE from_date=? AND to_date=? AND output=?",
+                (from_date.isoformat(), to_date.isoformat(), output),
+            ).fetchall()
+        return dict(rows)
+
+    def add_track(
+        self,
+        mmsi: int,
+        from_date: dt.datetime,
+        to_date: dt.datetime,
+        output: str,
+        rows: int,
+    ):
+        """
+        Record a track, which has been saved completely
+
+        :param rows: number of messages of the track
+        """
+        if not is_completed(to_date):
+            logger.debug(f"Manifest: interval until {to_date} is ongoing - not recording")
+            return
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?)",
+                (mmsi, from_date.isoformat(), to_date.isoformat(), output, rows),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,453 @@
+"""
+Module containing the metrics of the consumers, i.e., counters, gauges and histograms,
+which are exposed in the Prometheus text format over HTTP and as periodic JSON log
+"""
+
+import bisect
+import contextlib
+import datetime as dt
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+]
+LAG_BUCKETS = [0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0]
+
+DEFAULT_LOG_INTERVAL_IN_S = 60.0
+
+
+def format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of all metrics, whose values are kept per combination of label values
+    """
+
+    kind: str
+    name: str
+    help: str
+    labelnames: tuple[str, ...]
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels: dict[str, any]) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {list(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def items(self) -> list[tuple[tuple[str, ...], any]]:
+        with self._lock:
+            return [(k, self.copy(v)) for k, v in self._values.items()]
+
+    def copy(self, value):
+        return value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self.items():
+            lines.append(
+                f"{self.name}{format_labels(self.labelnames, values)} {format_value(value)}"
+            )
+        return lines
+
+    def snapshot(self) -> dict[str, any]:
+        return {",".join(values) or "": value for values, value in self.items()}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self.key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float | None:
+        with self._lock:
+            return self._values.get(self.key(labels))
+
+
+class HistogramValue:
+    counts: list[int]
+    sum: float
+    count: int
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    """
+    Histogram of observations in fixed buckets, whose upper bounds are given
+    """
+
+    kind = "histogram"
+    buckets: list[float]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: list[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name=name, help=help, labelnames=labelnames)
+        self.buckets = sorted(buckets) + [float("inf")]
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = HistogramValue(len(self.buckets))
+            histogram.counts[idx] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def copy(self, value: HistogramValue) -> HistogramValue:
+        histogram = HistogramValue(len(self.buckets))
+        histogram.counts = list(value.counts)
+        histogram.sum = value.sum
+        histogram.count = value.count
+        return histogram
+
+    def quantile(self, histogram: HistogramValue, q: float) -> float:
+        """
+        Estimate a quantile by the upper bound of the bucket it falls into
+        """
+        rank = q * histogram.count
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets, histogram.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return upper_bound
+        return self.buckets[-1]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, histogram in self.items():
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, values, le=format_value(upper_bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{labels} {histogram.count}")
+        return lines
+
+    def snapshot(self) -> dict[str, any]:
+        snapshot = {}
+        for values, histogram in self.items():
+            if histogram.count == 0:
+                continue
+            snapshot[",".join(values)] = {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count,
+                "p50": self.quantile(histogram, 0.5),
+                "p99": self.quantile(histogram, 0.99),
+            }
+        return snapshot
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics, which are rendered together
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"MetricsRegistry: metric {metric.name} exists already")
+            self._metrics[metric.name] = metric
+        return metric
+
+    @property
+    def metrics(self) -> list[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict[str, dict[str, any]]:
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+
+class Metrics:
+    """
+    Metrics of the consumers, which are shared by all of their components
+
+    Messages are labeled by consumer ('live' or 'historic'), http requests by the
+    endpoint ('token', 'live', 'mmsiinarea' or 'tracks').
+    """
+
+    registry: MetricsRegistry
+
+    def __init__(self, registry: MetricsRegistry | None = None):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        register = self.registry.register
+
+        self.messages = register(
+            Counter("bwac_messages_total", "Number of received messages", ("consumer",))
+        )
+        self.bytes = register(
+            Counter("bwac_bytes_total", "Number of received message bytes", ("consumer",))
+        )
+        self.duplicates = register(
+            Counter("bwac_duplicates_total", "Number of dropped duplicate messages", ("consumer",))
+        )
+        self.parse_seconds = register(
+            Histogram("bwac_parse_seconds", "Time to decode a message", ("consumer",))
+        )
+        self.write_seconds = register(
+            Histogram(
+                "bwac_write_seconds",
+                "Time to write a message (live) or a batch of messages (historic)",
+                ("consumer",),
+            )
+        )
+        self.lag_seconds = register(
+            Histogram(
+                "bwac_lag_seconds",
+                "Time between a message and its processing",
+                ("consumer",),
+                buckets=LAG_BUCKETS,
+            )
+        )
+        self.last_lag_seconds = register(
+            Gauge("bwac_last_lag_seconds", "Lag of the last message", ("consumer",))
+        )
+        self.queue_depth = register(
+            Gauge("bwac_queue_depth", "Number of messages waiting to be written")
+        )
+        self.reconnects = register(
+            Counter("bwac_reconnects_total", "Number of reconnects of the live stream")
+        )
+        self.token_renewals = register(
+            Counter("bwac_token_renewals_total", "Number of access token renewals")
+        )
+        self.http_requests = register(
+            Counter(
+                "bwac_http_requests_total",
+                "Number of http requests by endpoint and status code",
+                ("endpoint", "status"),
+            )
+        )
+        self.http_request_seconds = register(
+            Histogram(
+                "bwac_http_request_seconds",
+                "Time until the response headers of an http request have been received",
+                ("endpoint",),
+            )
+        )
+
+    def message(self, consumer: str, size: int, timestamp: dt.datetime | None = None):
+        """
+        Record a received message and its lag
+        """
+        self.messages.inc(consumer=consumer)
+        self.bytes.inc(size, consumer=consumer)
+        if timestamp is not None:
+            lag = (dt.datetime.now(tz=dt.timezone.utc) - timestamp).total_seconds()
+            self.lag_seconds.observe(lag, consumer=consumer)
+            self.last_lag_seconds.set(lag, consumer=consumer)
+
+    def http_request(self, endpoint: str, status: int, duration_in_s: float):
+        self.http_requests.inc(endpoint=endpoint, status=status)
+        self.http_request_seconds.observe(duration_in_s, endpoint=endpoint)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(f"MetricsServer: {format % args}")
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """
+    HTTP server, which exposes the metrics of a registry for Prometheus at /metrics
+    """
+
+    registry: MetricsRegistry
+    host: str
+    port: int
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        """
+        :param port: port to listen on, 0 to pick a free port
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self) -> "MetricsServer":
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        self._server.daemon_threads = True
+        self._server.registry = self.registry
+        self.port = self._server.server_address[1]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="bwac-metrics-server", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Serving metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+class MetricsLogger(threading.Thread):
+    """
+    Background logging of the metrics as a single JSON line per interval, which
+    includes the rate of all counters since the previous line
+    """
+
+    registry: MetricsRegistry
+    interval_in_s: float
+
+    def __init__(self, registry: MetricsRegistry, interval_in_s: float = DEFAULT_LOG_INTERVAL_IN_S):
+        super().__init__(name="bwac-metrics-logger", daemon=True)
+        self.registry = registry
+        self.interval_in_s = interval_in_s
+
+        self._previous = {}
+        self._previous_time = time.monotonic()
+        self._stopped = threading.Event()
+
+    def report(self) -> dict[str, any]:
+        """
+        Get the current metrics and the rates of the counters since the last report
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._previous_time, 1e-9)
+
+        current = {}
+        rates = {}
+        for metric in self.registry.metrics:
+            snapshot = metric.snapshot()
+            current[metric.name] = snapshot
+            if isinstance(metric, Counter):
+                previous = self._previous.get(metric.name, {})
+                rates[metric.name.removesuffix("_total") + "_per_s"] = {
+                    labels: (value - previous.get(labels, 0)) / elapsed
+                    for labels, value in snapshot.items()
+                }
+
+        self._previous = {k: v for k, v in current.items()}
+        self._previous_time = now
+
+        return {
+            "time": dt.datetime.now(tz=dt.timezone.utc).isoformat(),
+            "metrics": current,
+            "rates": rates,
+        }
+
+    def run(self):
+        while not self._stopped.wait(self.interval_in_s):
+            logger.info(json.dumps(self.report()))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        logger.info(json.dumps(self.report()))
+
+
+@contextlib.contextmanager
+def serve_metrics(
+    metrics: Metrics,
+    port: int | None = None,
+    log_interval_in_s: float | None = None,
+    host: str = "127.0.0.1",
+) -> Iterator[Metrics]:
+    """
+    Expose metrics over HTTP and/or as periodic JSON log while the context is active
+
+    :param port: port of the Prometheus endpoint, None to disable
+    :param log_interval_in_s: interval of the JSON log, None to disable
+    """
+    server = None
+    if port is not None:
+        server = MetricsServer(metrics.registry, host=host, port=port).start()
+
+    metrics_logger = None
+    if log_interval_in_s is not None:
+        metrics_logger = MetricsLogger(metrics.registry, interval_in_s=log_interval_in_s)
+        metrics_logger.start()
+
+    try:
+        yield metrics
+    finally:
+        if metrics_logger is not None:
+            metrics_logger.stop()
+        if server is not None:
+            server.stop()
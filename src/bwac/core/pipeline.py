@@ -0,0 +1,241 @@
+"""
+Module containing the stages to decouple reading the live stream from processing
+and writing its messages
+"""
+
+import collections
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ["block", "drop-oldest", "spill"]
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class LineQueue:
+    """
+    Bounded queue of raw lines between the stream reader and the writer
+
+    When the queue is full, the overflow policy decides whether the reader waits
+    ('block'), the oldest queued line is discarded ('drop-oldest') or lines are
+    appended to a spill file on disk ('spill'), from which they are replayed in
+    order once the queue drains.
+    """
+
+    maxsize: int
+    overflow: str
+    spill_dir: Path | None
+
+    dropped: int
+    spilled: int
+    max_depth: int
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_QUEUE_SIZE,
+        overflow: str = "block",
+        spill_dir: str | Path | None = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"LineQueue: unknown overflow policy '{overflow}' - expected one of {OVERFLOW_POLICIES}"
+            )
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.spill_dir = None if spill_dir is None else Path(spill_dir)
+
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+
+        self._lines = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._spill_file = None
+        self._spill_read_position = 0
+        self._spill_count = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of lines waiting to be processed, including spilled ones
+        """
+        return len(self._lines) + self._spill_count
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, line: bytes):
+        with self._condition:
+            if self._closed:
+                return
+
+            if self._spill_count > 0:
+                # keep the order: once spilling, lines go to disk until it has been drained
+                self._spill(line)
+            elif len(self._lines) >= self.maxsize:
+                if self.overflow == "block":
+                    while len(self._lines) >= self.maxsize and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                    self._lines.append(line)
+                elif self.overflow == "drop-oldest":
+                    self._lines.popleft()
+                    self._lines.append(line)
+                    self.dropped += 1
+                else:
+                    self._spill(line)
+            else:
+                self._lines.append(line)
+
+            self.max_depth = max(self.max_depth, self.depth)
+            self._condition.notify_all()
+
+    def get(self, timeout_in_s: float | None = None) -> bytes | None:
+        """
+        Get the next line, waiting until one is available
+
+        :param timeout_in_s: maximum time to wait for a line, None to wait until the queue is closed
+        :return: the next line or None if the queue has been closed and is drained, or on timeout
+        """
+        with self._condition:
+            if not self._lines and self._spill_count == 0 and not self._closed:
+                self._condition.wait_for(
+                    lambda: self._lines or self._spill_count > 0 or self._closed,
+                    timeout=timeout_in_s,
+                )
+
+            if self._lines:
+                line = self._lines.popleft()
+            elif self._spill_count > 0:
+                line = self._unspill()
+            else:
+                return None
+
+            self._condition.notify_all()
+            return line
+
+    def close(self):
+        """
+        Signal the end of the stream - remaining lines can still be retrieved
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while (line := self.get()) is not None:
+            yield line
+
+    def _spill(self, line: bytes):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(
+                prefix="bwac-spill-", dir=self.spill_dir
+            )
+
+        self._spill_file.seek(0, 2)
+        self._spill_file.write(line + b"\n")
+        self._spill_count += 1
+        self.spilled += 1
+
+    def _unspill(self) -> bytes:
+        self._spill_file.seek(self._spill_read_position)
+        line = self._spill_file.readline()
+        self._spill_read_position = self._spill_file.tell()
+        self._spill_count -= 1
+
+        if self._spill_count == 0:
+            # the spill file has been drained, so it can be reused from the start
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read_position = 0
+
+        return line[:-1]
+
+
+class StreamReader(threading.Thread):
+    """
+    Reader stage, which drains the lines of a stream into a LineQueue
+
+    Multiple readers can feed the same queue, if they are created with
+    close_queue=False - the queue then remains open when a reader ends.
+    """
+
+    lines: Iterable[bytes]
+    queue: LineQueue
+    close_queue: bool
+    error: Exception | None
+    received: int
+
+    def __init__(self, lines: Iterable[bytes], queue: LineQueue, close_queue: bool = True):
+        super().__init__(name="bwac-stream-reader", daemon=True)
+
+        self.lines = lines
+        self.queue = queue
+        self.close_queue = close_queue
+        self.error = None
+        self.received = 0
+
+        self._stopped = threading.Event()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set() or self.queue.closed
+
+    def run(self):
+        try:
+            for line in self.lines:
+                if self.stopped:
+                    break
+                if line:
+                    self.queue.put(line)
+                    self.received += 1
+        except Exception as e:
+            if not self.stopped:
+                self.error = e
+        finally:
+            if self.close_queue:
+                self.queue.close()
+
+    def stop(self, timeout_in_s: float = 5.0):
+        self._stopped.set()
+        if self.close_queue:
+            self.queue.close()
+        self.join(timeout=timeout_in_s)
+        if self.is_alive():
+            logger.warning("StreamReader: reader did not stop in time")
+
+
+class RecentLines:
+    """
+    Bounded set of recently seen lines, to drop the duplicates while two streams overlap
+    """
+
+    maxsize: int
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._lines = collections.OrderedDict()
+
+    def seen(self, line: bytes) -> bool:
+        """
+        Check whether a line has been seen before and remember it otherwise
+        """
+        if line in self._lines:
+            return True
+
+        self._lines[line] = None
+        if len(self._lines) > self.maxsize:
+            self._lines.popitem(last=False)
+        return False
+
+    def clear(self):
+        self._lines.clear()
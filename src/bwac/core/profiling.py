@@ -0,0 +1,334 @@
+"""
+Module containing the profiling of the consumers: CPU profiles (cProfile or sampling),
+memory allocation snapshots (tracemalloc) and timings of the processing stages
+"""
+
+import collections
+import cProfile
+import datetime as dt
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from bwac.core.metrics import Histogram, Metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ["cprofile", "sampling"]
+
+DEFAULT_DUMP_INTERVAL_IN_S = 300.0
+DEFAULT_SAMPLING_INTERVAL_IN_S = 0.01
+DEFAULT_KEEP_DUMPS = 5
+DEFAULT_MEMORY_FRAMES = 25
+
+# stages and the histogram (and label, if any) of the metrics, which times them
+STAGES = {
+    "token": ("bwac_http_request_seconds", "token"),
+    "discovery": ("bwac_http_request_seconds", "mmsiinarea"),
+    "download": ("bwac_http_request_seconds", "tracks"),
+    "parse": ("bwac_parse_seconds", None),
+    "write": ("bwac_write_seconds", None),
+}
+
+
+def stage_timings(metrics: Metrics) -> dict[str, dict[str, float]]:
+    """
+    Summarize the time spent per stage, i.e., token acquisition, discovery, download,
+    parse and write, whereas parse and write are reported per consumer, e.g., 'parse[live]'
+    """
+    histograms = {m.name: m for m in metrics.registry.metrics if isinstance(m, Histogram)}
+
+    timings = {}
+    for stage, (name, label) in STAGES.items():
+        histogram = histograms[name]
+        for values, value in histogram.items():
+            if value.count == 0 or (label is not None and values != (label,)):
+                continue
+
+            key = stage if label is not None else f"{stage}[{','.join(values)}]"
+            timings[key] = {
+                "count": value.count,
+                "total_s": value.sum,
+                "mean_ms": 1000 * value.sum / value.count,
+                "p50_ms": 1000 * histogram.quantile(value, 0.5),
+                "p99_ms": 1000 * histogram.quantile(value, 0.99),
+            }
+    return timings
+
+
+def format_stage_timings(timings: dict[str, dict[str, float]]) -> str:
+    lines = [f"{'stage':<20} {'count':>10} {'total s':>10} {'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10}"]
+    for stage, t in timings.items():
+        lines.append(
+            f"{stage:<20} {t['count']:>10} {t['total_s']:>10.3f} {t['mean_ms']:>10.3f}"
+            f" {t['p50_ms']:>10.3f} {t['p99_ms']:>10.3f}"
+        )
+    return "\n".join(lines)
+
+
+class StatsSnapshot:
+    """
+    Stats of a running cProfile.Profile, which can be loaded by pstats without
+    disabling the profile (as pstats.Stats(profile) does)
+    """
+
+    def __init__(self, profile: cProfile.Profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+class StackSampler(threading.Thread):
+    """
+    Sampling profiler, which periodically records the stacks of all threads
+
+    The overhead does not depend on the number of function calls, so that it is
+    suitable for long-running processes. Stacks are counted in the collapsed format
+    of flamegraph.pl, which can also be loaded by speedscope.
+    """
+
+    interval_in_s: float
+    samples: int
+
+    def __init__(self, interval_in_s: float = DEFAULT_SAMPLING_INTERVAL_IN_S):
+        super().__init__(name="bwac-stack-sampler", daemon=True)
+        self.interval_in_s = interval_in_s
+        self.samples = 0
+
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(stack)))
+
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def run(self):
+        while not self._stopped.wait(self.interval_in_s):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+class Profiler:
+    """
+    Profile the whole process and write dumps to an output directory
+
+    Dumps are written when stopped and, with a dump_interval_in_s, periodically while
+    running, so that long-running processes, e.g., the live consumer, can be inspected
+    without restarting them. Each dump covers the time since start; only the latest
+    keep dumps are retained. A dump consists of:
+
+    - profile-<time>.prof (cprofile, for pstats or snakeviz) or profile-<time>.collapsed (sampling)
+    - memory-<time>.txt with the top allocations and the growth since the previous dump,
+      if memory profiling is enabled
+    - stages-<time>.json with the timings of the processing stages, see stage_timings
+    """
+
+    output_dir: Path
+    mode: str
+    memory: bool
+    dump_interval_in_s: float | None
+    sampling_interval_in_s: float
+    keep: int
+    metrics: Metrics
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        mode: str = "cprofile",
+        memory: bool = False,
+        dump_interval_in_s: float | None = DEFAULT_DUMP_INTERVAL_IN_S,
+        sampling_interval_in_s: float = DEFAULT_SAMPLING_INTERVAL_IN_S,
+        keep: int = DEFAULT_KEEP_DUMPS,
+        metrics: Metrics | None = None,
+    ):
+        """
+        :param output_dir: directory of the dumps
+        :param mode: 'cprofile' to trace all function calls or 'sampling' to sample stacks
+        :param memory: trace memory allocations with tracemalloc
+        :param dump_interval_in_s: interval of periodic dumps, None to dump only when stopped
+        :param sampling_interval_in_s: interval between stack samples in 'sampling' mode
+        :param keep: number of dumps to retain
+        :param metrics: metrics from which the stage timings are taken (default: new metrics,
+            which have to be passed to the consumers)
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Profiler: unknown mode '{mode}' - expected one of {PROFILE_MODES}")
+
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.memory = memory
+        self.dump_interval_in_s = dump_interval_in_s
+        self.sampling_interval_in_s = sampling_interval_in_s
+        self.keep = keep
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self._profiles: list[cProfile.Profile] = []
+        self._main_profile = None
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._memory_snapshot = None
+        self._dumper = None
+        self._stopped = threading.Event()
+        self._start_time = None
+
+    def _profile_thread(self, frame, event, arg):
+        # installed by threading.setprofile for new threads - replaced by the thread's profile
+        self._add_profile().enable()
+
+    def _add_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def start(self) -> "Profiler":
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._start_time = time.perf_counter()
+
+        if self.memory:
+            tracemalloc.start(DEFAULT_MEMORY_FRAMES)
+
+        if self.mode == "cprofile":
+            # cProfile only profiles the thread that enables it
+            self._main_profile = self._add_profile()
+            self._main_profile.enable()
+            threading.setprofile(self._profile_thread)
+        else:
+            self._sampler = StackSampler(interval_in_s=self.sampling_interval_in_s)
+            self._sampler.start()
+
+        if self.dump_interval_in_s is not None:
+            self._dumper = threading.Thread(
+                target=self._dump_periodically, name="bwac-profile-dumper", daemon=True
+            )
+            self._dumper.start()
+
+        logger.info(f"Profiling ({self.mode}{', memory' if self.memory else ''}) into {self.output_dir}")
+        return self
+
+    def _dump_periodically(self):
+        while not self._stopped.wait(self.dump_interval_in_s):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.warning(f"Profiler: failed to write dump: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        if self._dumper is not None:
+            self._dumper.join()
+
+        if self.mode == "cprofile":
+            threading.setprofile(None)
+            # only the profile of the starting thread can be disabled, the others
+            # end with their threads
+            self._main_profile.disable()
+        else:
+            self._sampler.stop()
+
+        self.dump()
+        logger.info(f"Stage timings:\n{format_stage_timings(stage_timings(self.metrics))}")
+
+        if self.memory:
+            tracemalloc.stop()
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def dump(self) -> list[Path]:
+        """
+        Write a dump of the profile since start
+
+        :return: the paths of the written files
+        """
+        suffix = dt.datetime.now(tz=dt.timezone.utc).strftime("%Y%m%dT%H%M%S_%f")
+        paths = []
+
+        if self.mode == "cprofile":
+            path = self.output_dir / f"profile-{suffix}.prof"
+            with self._lock:
+                snapshots = [StatsSnapshot(profile) for profile in self._profiles]
+            pstats.Stats(*snapshots).dump_stats(path)
+        else:
+            path = self.output_dir / f"profile-{suffix}.collapsed"
+            path.write_text(self._sampler.collapsed())
+        paths.append(path)
+
+        if self.memory:
+            path = self.output_dir / f"memory-{suffix}.txt"
+            path.write_text(self.memory_report())
+            paths.append(path)
+
+        path = self.output_dir / f"stages-{suffix}.json"
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "elapsed_s": time.perf_counter() - self._start_time,
+                    "stages": stage_timings(self.metrics),
+                },
+                f,
+                indent=2,
+            )
+        paths.append(path)
+
+        self.prune()
+        logger.debug(f"Profiler: written {[str(x) for x in paths]}")
+        return paths
+
+    def memory_report(self, limit: int = 30) -> str:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        current, peak = tracemalloc.get_traced_memory()
+
+        lines = [f"traced memory: {current / 2**20:.1f} MiB (peak: {peak / 2**20:.1f} MiB)", ""]
+        lines.append(f"top {limit} allocations:")
+        lines.extend(str(x) for x in snapshot.statistics("lineno")[:limit])
+
+        if self._memory_snapshot is not None:
+            lines.extend(["", f"top {limit} changes since the previous dump:"])
+            lines.extend(str(x) for x in snapshot.compare_to(self._memory_snapshot, "lineno")[:limit])
+        self._memory_snapshot = snapshot
+
+        return "\n".join(lines) + "\n"
+
+    def prune(self):
+        """
+        Remove all but the latest keep dumps
+        """
+        for pattern in ["profile-*", "memory-*", "stages-*"]:
+            for path in sorted(self.output_dir.glob(pattern))[: -self.keep]:
+                path.unlink(missing_ok=True)
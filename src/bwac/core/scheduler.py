@@ -0,0 +1,357 @@
+"""
+Module containing the scheduling of requests to the historic api, which limits the
+request rate and concurrency and retries throttled or failed requests
+"""
+
+import datetime as dt
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Callable
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_IN_S = 1.0
+DEFAULT_MAX_BACKOFF_IN_S = 60.0
+DEFAULT_THROTTLE_COOLDOWN_IN_S = 1.0
+
+THROTTLED_STATUS_CODES = [429]
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# failures of the connection or while receiving a body, e.g., a truncated or corrupted
+# (compressed) body, after which an idempotent request can be sent again
+RETRY_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+)
+
+
+def read_retry_after(value: str | None) -> float | None:
+    """
+    Get the delay in seconds of a Retry-After header, which is either a number of
+    seconds or an HTTP date
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.warning(f"read_retry_after: ignoring invalid Retry-After '{value}'")
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (retry_at - dt.datetime.now(tz=dt.timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Token bucket, which limits the rate of requests while allowing bursts
+    """
+
+    rate_per_s: float
+    burst: int
+
+    def __init__(self, rate_per_s: float, burst: int = 1):
+        if rate_per_s <= 0:
+            raise ValueError(f"TokenBucket: rate must be positive, got {rate_per_s}")
+        if burst < 1:
+            raise ValueError(f"TokenBucket: burst must be at least 1, got {burst}")
+
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token
+
+        :return: time in seconds to wait until the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate_per_s
+            )
+            self._updated_at = now
+
+            # tokens can become negative, so that waiting callers are queued
+            self._tokens -= 1
+            if self._tokens < 0:
+                return -self._tokens / self.rate_per_s
+            return 0.0
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit of concurrent requests, which is adapted by additive increase and
+    multiplicative decrease (AIMD)
+
+    Each successful request increases the limit by 1/limit, i.e., by one per limit
+    successful requests, while a throttled request halves it. Requests in flight are
+    usually throttled together, so the limit is halved at most once per cooldown.
+    """
+
+    minimum: int
+    maximum: int
+    cooldown_in_s: float
+    limit: float
+    in_flight: int
+
+    def __init__(
+        self,
+        maximum: int = DEFAULT_MAX_CONCURRENCY,
+        minimum: int = 1,
+        cooldown_in_s: float = DEFAULT_THROTTLE_COOLDOWN_IN_S,
+    ):
+        """
+        :param maximum: maximum number of concurrent requests
+        :param minimum: minimum number of concurrent requests
+        :param cooldown_in_s: time after a decrease, during which further throttled requests are ignored
+        """
+        if not 1 <= minimum <= maximum:
+            raise ValueError(
+                f"AdaptiveConcurrency: expected 1 <= minimum <= maximum, got {minimum}, {maximum}"
+            )
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown_in_s = cooldown_in_s
+        self.limit = float(maximum)
+        self.in_flight = 0
+
+        self._decreased_at = None
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            if self._decreased_at is not None and now - self._decreased_at < self.cooldown_in_s:
+                return
+
+            self.limit = max(self.minimum, self.limit / 2)
+            self._decreased_at = now
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class RequestScheduler:
+    """
+    Scheduler for idempotent requests, which is shared by all workers of a consumer
+
+    Requests are limited by an optional token bucket and an adaptive concurrency limit,
+    whereas a returned response occupies its slot until it is closed, unless its body
+    has been read already.
+    Throttled (429) and failed (5xx, connection errors, timeouts and broken bodies)
+    requests are retried with jittered exponential backoff, whereas a Retry-After header of the
+    response pauses all requests.
+    """
+
+    bucket: TokenBucket | None
+    concurrency: AdaptiveConcurrency
+    max_retries: int
+    backoff_in_s: float
+    max_backoff_in_s: float
+
+    retries: int
+    throttled: int
+
+    def __init__(
+        self,
+        rate_per_s: float | None = None,
+        burst: int = 1,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_in_s: float = DEFAULT_BACKOFF_IN_S,
+        max_backoff_in_s: float = DEFAULT_MAX_BACKOFF_IN_S,
+    ):
+        """
+        :param rate_per_s: maximum number of requests per second, None for no limit
+        :param burst: number of requests that may exceed the rate at once
+        :param max_concurrency: maximum number of concurrent requests
+        :param max_retries: number of retries before the last response or error is returned
+        :param backoff_in_s: base delay of the exponential backoff
+        :param max_backoff_in_s: maximum delay of the exponential backoff
+        """
+        self.bucket = None
+        if rate_per_s is not None:
+            self.bucket = TokenBucket(rate_per_s=rate_per_s, burst=burst)
+        self.concurrency = AdaptiveConcurrency(maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_in_s = backoff_in_s
+        self.max_backoff_in_s = max_backoff_in_s
+
+        self.retries = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get the delay before a retry using exponential backoff with full jitter
+        """
+        return random.uniform(
+            0, min(self.max_backoff_in_s, self.backoff_in_s * 2**attempt)
+        )
+
+    def pause(self, delay_in_s: float):
+        """
+        Do not send any request before the given delay has passed
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay_in_s)
+
+    def wait_for_pause(self):
+        with self._lock:
+            delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release_on_close(self, response: requests.Response) -> requests.Response:
+        """
+        Keep the concurrency slot of a response until the response is closed, so that
+        streamed bodies count towards the limit while they are received
+        """
+        if getattr(response, "_content_consumed", False):
+            # the body has been received already
+            self.concurrency.release()
+            return response
+
+        close = response.close
+        released = False
+
+        def close_and_release():
+            nonlocal released
+            try:
+                close()
+            finally:
+                if not released:
+                    released = True
+                    self.concurrency.release()
+
+        response.close = close_and_release
+        return response
+
+    def retry(self, operation: Callable[[], any], description: str = "operation") -> any:
+        """
+        Run an idempotent operation, which sends requests and receives their responses,
+        again while receiving fails, e.g., if a streamed body breaks off
+
+        :return: the result of the operation
+        """
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except RETRY_EXCEPTIONS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"{description} failed: {e} - retry in {delay:.1f}s")
+
+            with self._lock:
+                self.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def request(
+        self, send: Callable[[], requests.Response], description: str = "request"
+    ) -> requests.Response:
+        """
+        Send a request, retrying it while it is throttled or fails
+
+        :param send: function that sends the request, it is called once per attempt
+        :param description: description of the request for logging
+        :return: the first successful response or the response of the last attempt,
+            whose status code has to be checked by the caller and which has to be closed
+            by the caller, if its body is streamed
+        """
+        attempt = 0
+        while True:
+            self.wait_for_pause()
+            if self.bucket is not None:
+                self.bucket.acquire()
+
+            self.concurrency.acquire()
+            try:
+                response = send()
+            except RETRY_EXCEPTIONS as e:
+                self.concurrency.release()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"{description} failed: {e} - retry in {delay:.1f}s")
+            except BaseException:
+                self.concurrency.release()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.concurrency.on_success()
+                    return self.release_on_close(response)
+
+                if attempt >= self.max_retries:
+                    return self.release_on_close(response)
+
+                delay = self.backoff(attempt)
+                if response.status_code in THROTTLED_STATUS_CODES:
+                    with self._lock:
+                        self.throttled += 1
+                    self.concurrency.on_throttle()
+
+                    retry_after = read_retry_after(response.headers.get("Retry-After"))
+                    if retry_after is not None:
+                        delay = retry_after
+                        self.pause(retry_after)
+
+                logger.warning(
+                    f"{description} returned {response.status_code} - retry in {delay:.1f}s"
+                )
+                response.close()
+                self.concurrency.release()
+
+            with self._lock:
+                self.retries += 1
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,28 @@
+"""
+Module to create pooled keep-alive HTTP sessions, which are shared by all requests
+of a consumer
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT_IN_S = 10.0
+DEFAULT_READ_TIMEOUT_IN_S = 120.0
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Create a session that keeps up to pool_size connections per host alive and
+    negotiates compressed responses
+
+    :param pool_size: maximum number of connections that are kept per host
+    """
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
@@ -0,0 +1,171 @@
+"""
+Module containing the partitioning of a historic download into shards, which can
+run as independent processes on several machines, and the merging of their output
+"""
+
+import csv
+import datetime as dt
+import hashlib
+import logging
+import re
+import shutil
+from pathlib import Path
+
+from bwac.core.compression import compression_of, open_file
+from bwac.core.sinks import merge_parquet
+from bwac.utils import as_utc, read_timestamp
+
+logger = logging.getLogger(__name__)
+
+SHARD_DIR_PATTERN = re.compile(r"shard-(\d+)-of-(\d+)")
+
+
+class Shard:
+    """
+    Part i of N of the (interval, mmsi) work items of a historic download
+
+    Work items are assigned by a stable hash, so that all shards agree on the
+    partition as long as they are run with the same time range.
+    """
+
+    index: int
+    count: int
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Shard: expected 0 <= index < count, got {index}/{count}")
+
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, txt: str) -> "Shard":
+        """
+        Create a shard from its description 'i/N'
+        """
+        try:
+            index, count = (int(x) for x in txt.split("/"))
+        except ValueError:
+            raise ValueError(f"Shard: expected 'i/N', got '{txt}'")
+        return cls(index=index, count=count)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @property
+    def name(self) -> str:
+        return f"shard-{self.index}-of-{self.count}"
+
+    def output_dir(self, output_dir: str | Path) -> Path:
+        """
+        Get the output directory of this shard, which is disjoint from all other shards
+        """
+        return Path(output_dir) / self.name
+
+    def owns(self, from_date: dt.datetime, mmsi: int) -> bool:
+        """
+        Check whether the track of an mmsi in the interval starting at from_date
+        belongs to this shard
+        """
+        key = f"{from_date.isoformat()}|{mmsi}".encode("UTF-8")
+        value = int.from_bytes(hashlib.sha1(key).digest()[:8], "big")
+        return value % self.count == self.index
+
+    def select(self, mmsis: list[int], from_date: dt.datetime) -> list[int]:
+        """
+        Get the mmsis, whose tracks in the interval starting at from_date belong to this shard
+        """
+        return [mmsi for mmsi in mmsis if self.owns(from_date=from_date, mmsi=mmsi)]
+
+
+def merge_csv(path: Path, other_path: Path):
+    """
+    Merge the messages of another csv file into a csv file, keeping the
+    messages ordered by time and dropping messages that are in both files
+
+    Distinct messages with the same time are kept in the order of the files.
+    The file is replaced atomically.
+    """
+    compression = compression_of(path)
+
+    rows = []
+    fieldnames = None
+    for p in [path, other_path]:
+        with open_file(p, "rt", compression=compression, newline="") as fp:
+            reader = csv.DictReader(fp)
+            if fieldnames is None:
+                fieldnames = reader.fieldnames
+            for row in reader:
+                rows.append((as_utc(read_timestamp(row["msgtime"])), row))
+    # stable, so that messages with the same time keep their order
+    rows.sort(key=lambda x: x[0])
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open_file(tmp_path, "wt", compression=compression, newline="") as fp:
+        writer = csv.DictWriter(
+            fp, fieldnames=fieldnames, lineterminator="\n", extrasaction="ignore"
+        )
+        writer.writeheader()
+
+        # messages are duplicates only among messages of the same time
+        last_timestamp = None
+        seen = set()
+        for timestamp, row in rows:
+            if timestamp != last_timestamp:
+                last_timestamp = timestamp
+                seen.clear()
+
+            key = tuple(row.get(x) for x in fieldnames)
+            if key not in seen:
+                seen.add(key)
+                writer.writerow(row)
+    tmp_path.replace(path)
+
+
+def merge_file(path: Path, other_path: Path):
+    if path.name.endswith(".parquet"):
+        merge_parquet(path, other_path)
+    else:
+        merge_csv(path, other_path)
+
+
+def merge_shards(input_dir: str | Path, output_dir: str | Path | None = None) -> int:
+    """
+    Merge the output of all shards in input_dir into the per-day files of output_dir
+
+    Files, which exist in several shards or already in output_dir, e.g., since a track
+    crosses the day boundary, are merged message by message, so that merging again
+    does not duplicate messages. The shard directories are left unchanged.
+
+    :param input_dir: directory containing the shard-<i>-of-<N> directories
+    :param output_dir: directory of the merged files (default: input_dir)
+    :return: number of merged shard files
+    """
+    input_dir = Path(input_dir)
+    output_dir = input_dir if output_dir is None else Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    shard_dirs = sorted(
+        x for x in input_dir.iterdir() if x.is_dir() and SHARD_DIR_PATTERN.fullmatch(x.name)
+    )
+    if not shard_dirs:
+        raise RuntimeError(f"merge_shards: no shard directories found in {input_dir}")
+
+    merged = 0
+    for shard_dir in shard_dirs:
+        files = sorted(shard_dir.glob("AIS_*"))
+        logger.info(f"Merging {len(files)} files of {shard_dir.name}")
+
+        for path in files:
+            if path.name.endswith(".tmp"):
+                continue
+
+            target = output_dir / path.name
+            if target.exists():
+                merge_file(target, path)
+            else:
+                tmp_path = target.with_name(target.name + ".tmp")
+                shutil.copyfile(path, tmp_path)
+                tmp_path.replace(target)
+            merged += 1
+    return merged
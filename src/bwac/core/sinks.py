@@ -0,0 +1,486 @@
+"""
+Module containing the sinks, which write the messages of the live consumer into
+one file per day, and the typed columnar (Parquet) representation of messages
+"""
+
+import csv
+import datetime as dt
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from bwac.core.compression import EXTENSIONS, open_file, require_compression
+from bwac.core.file_pool import FilePool
+from bwac.utils import read_timestamps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ["csv", "raw", "parquet"]
+
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError(
+            "Parquet output requires pyarrow - install with 'pip install bwac[parquet]'"
+        )
+
+
+def ais_field_types() -> dict[str, "pa.DataType"]:
+    """
+    Get the column types of known message fields - all other fields are stored as strings
+    """
+    require_pyarrow()
+    return {
+        "mmsi": pa.int32(),
+        "msgtime": pa.timestamp("us", tz="UTC"),
+        "latitude": pa.float32(),
+        "longitude": pa.float32(),
+        "courseOverGround": pa.float32(),
+        "speedOverGround": pa.float32(),
+        "rateOfTurn": pa.float32(),
+        "trueHeading": pa.int16(),
+        "shipType": pa.int16(),
+        "navigationalStatus": pa.int16(),
+        "name": pa.dictionary(pa.int32(), pa.string()),
+    }
+
+
+def ais_schema(rows: list[dict[str, any]]) -> "pa.Schema":
+    """
+    Get the schema for the given messages, using the order of their fields
+    """
+    field_types = ais_field_types()
+
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row.keys()))
+
+    return pa.schema([(name, field_types.get(name, pa.string())) for name in names])
+
+
+def to_table(rows: list[dict[str, any]], schema: "pa.Schema") -> "pa.Table":
+    """
+    Convert messages into a table of the given schema - fields which are not part of
+    the schema are dropped
+    """
+    columns = []
+    for field in schema:
+        if field.name == "msgtime":
+            timestamps = read_timestamps([row["msgtime"] for row in rows])
+            columns.append(pa.array(timestamps).cast(field.type))
+        elif pa.types.is_string(field.type):
+            values = [row.get(field.name) for row in rows]
+            columns.append(
+                pa.array([x if x is None else str(x) for x in values], type=field.type)
+            )
+        else:
+            columns.append(pa.array([row.get(field.name) for row in rows], type=field.type))
+
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class Sink(ABC):
+    """
+    Output of the live consumer, which writes messages into one file per day
+    """
+
+    extension: str
+    # whether the sink requires the decoded message or writes the raw line
+    decodes: bool = True
+
+    output_dir: Path
+    compression: str
+    compression_level: int | None
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        compression: str = "none",
+        compression_level: int | None = None,
+    ):
+        require_compression(compression)
+
+        self.output_dir = Path(output_dir)
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def path(self, day: str) -> Path:
+        return self.output_dir / f"AIS_{day}.{self.extension}{EXTENSIONS[self.compression]}"
+
+    def open(self, path: Path, mode: str, newline: str | None = None):
+        return open_file(
+            path,
+            mode,
+            compression=self.compression,
+            level=self.compression_level,
+            newline=newline,
+        )
+
+    @abstractmethod
+    def write(
+        self,
+        day: str,
+        line: bytes,
+        data: dict[str, any] | None = None,
+        timestamp: dt.datetime | None = None,
+    ):
+        """
+        Write a message
+
+        :param day: the day (YYYY_mm_dd) of the message
+        :param line: the message as received
+        :param data: the decoded message, if the sink decodes
+        :param timestamp: the time of the message, if the sink decodes
+        """
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSink(Sink):
+    """
+    Sink that keeps the files of the current days open in a pool of (file, writer)
+
+    The pool should be limited to two files, so that the previous day remains
+    open for delayed messages, while older days are closed on day rollover. The
+    sink owns the pool, which is cleared when the sink is closed.
+    """
+
+    open_files: FilePool
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        open_files: FilePool,
+        compression: str = "none",
+        compression_level: int | None = None,
+    ):
+        super().__init__(
+            output_dir, compression=compression, compression_level=compression_level
+        )
+        self.open_files = open_files
+
+    def flush(self):
+        self.open_files.flush()
+
+    def close(self):
+        self.open_files.clear()
+
+
+class CsvSink(FileSink):
+    extension = "csv"
+
+    def write(self, day, line, data=None, timestamp=None):
+        path = self.path(day)
+
+        entry = self.open_files.get(path)
+        if entry is None:
+            # day rollover
+            self.flush()
+
+            write_header = not path.exists()
+            fp = self.open(path, "at", newline="")
+            writer = csv.DictWriter(fp, fieldnames=list(data.keys()), quoting=csv.QUOTE_MINIMAL)
+            entry = self.open_files.put(path, (fp, writer))
+            if write_header:
+                writer.writeheader()
+
+        fp, writer = entry
+        writer.writerow(data)
+
+
+class RawSink(FileSink):
+    """
+    Sink that archives the received lines unchanged as NDJSON
+    """
+
+    extension = "ndjson"
+    decodes = False
+
+    def write(self, day, line, data=None, timestamp=None):
+        path = self.path(day)
+
+        entry = self.open_files.get(path)
+        if entry is None:
+            # day rollover
+            self.flush()
+            entry = self.open_files.put(path, (self.open(path, "ab"), None))
+
+        fp, _ = entry
+        fp.write(line + b"\n")
+
+
+class ParquetSink(Sink):
+    """
+    Sink that buffers messages into typed row groups of daily Parquet files
+
+    Parquet files cannot be appended to, so a day that already has a file
+    (e.g., after a restart) continues in AIS_<day>.<n>.parquet. Since a Parquet
+    file is only readable once it has been closed, flushing does not apply -
+    row groups are written when full and files are completed on day rollover
+    and close. Compression applies to the column chunks inside the file.
+    """
+
+    extension = "parquet"
+
+    row_group_size: int
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression: str = "none",
+        compression_level: int | None = None,
+    ):
+        require_pyarrow()
+        super().__init__(
+            output_dir, compression=compression, compression_level=compression_level
+        )
+
+        self.row_group_size = row_group_size
+        self._rows: dict[str, list[dict[str, any]]] = {}
+        self._writers: dict[str, pq.ParquetWriter] = {}
+
+    def path(self, day: str) -> Path:
+        return self.output_dir / f"AIS_{day}.{self.extension}"
+
+    def new_path(self, day: str) -> Path:
+        path = self.path(day)
+        part = 0
+        while path.exists():
+            part += 1
+            path = self.output_dir / f"AIS_{day}.{part}.{self.extension}"
+        return path
+
+    def write(self, day, line, data=None, timestamp=None):
+        if day not in self._rows:
+            # keep only the previous day open for delayed messages
+            if len(self._rows) >= 2:
+                self.close_day(sorted(self._rows.keys())[0])
+            self._rows[day] = []
+
+        rows = self._rows[day]
+        rows.append(data)
+        if len(rows) >= self.row_group_size:
+            self.write_row_group(day)
+
+    def write_row_group(self, day: str):
+        rows = self._rows[day]
+        if not rows:
+            return
+
+        writer = self._writers.get(day)
+        if writer is None:
+            writer = pq.ParquetWriter(
+                self.new_path(day),
+                ais_schema(rows),
+                **parquet_compression(self.compression, self.compression_level),
+            )
+            self._writers[day] = writer
+
+        writer.write_table(to_table(rows, writer.schema), row_group_size=len(rows))
+        self._rows[day] = []
+
+    def close_day(self, day: str):
+        self.write_row_group(day)
+        del self._rows[day]
+
+        writer = self._writers.pop(day, None)
+        if writer is not None:
+            writer.close()
+
+    def close(self):
+        for day in list(self._rows.keys()):
+            self.close_day(day)
+
+
+def create_sink(
+    output_format: str,
+    output_dir: str | Path,
+    open_files: FilePool,
+    compression: str = "none",
+    compression_level: int | None = None,
+) -> Sink:
+    compression_kwargs = {
+        "compression": compression,
+        "compression_level": compression_level,
+    }
+    if output_format == "csv":
+        return CsvSink(output_dir, open_files, **compression_kwargs)
+    if output_format == "raw":
+        return RawSink(output_dir, open_files, **compression_kwargs)
+    if output_format == "parquet":
+        return ParquetSink(output_dir, **compression_kwargs)
+
+    raise ValueError(
+        f"Unknown output format '{output_format}' - expected one of {OUTPUT_FORMATS}"
+    )
+
+
+def parquet_compression(compression: str, level: int | None) -> dict[str, any]:
+    """
+    Get the arguments for pyarrow to use a compression for column chunks
+    """
+    if compression == "none":
+        # keep pyarrow's default
+        return {}
+    return {"compression": compression, "compression_level": level}
+
+
+def write_parquet(
+    path: Path,
+    rows: list[dict[str, any]],
+    compression: str = "none",
+    compression_level: int | None = None,
+):
+    """
+    Write messages to a Parquet file, keeping the messages of an existing file
+
+    The file is replaced atomically, since Parquet files cannot be appended to.
+    """
+    require_pyarrow()
+
+    table = to_table(rows, ais_schema(rows))
+    if path.exists():
+        table = pa.concat_tables(
+            [pq.read_table(path), table], promote_options="permissive"
+        )
+
+    tmp_path = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, **parquet_compression(compression, compression_level))
+    tmp_path.replace(path)
+
+
+class ParquetFileWriter:
+    """
+    Writer that adds row groups to a Parquet file, which is kept open until closed
+
+    Parquet files cannot be appended to, so the row groups of an existing file are
+    copied once into a temporary file, which replaces the file when closed. The
+    columns are those of the existing file or of the first written messages.
+    """
+
+    path: Path
+    compression: str
+    compression_level: int | None
+
+    def __init__(
+        self, path: Path, compression: str = "none", compression_level: int | None = None
+    ):
+        require_pyarrow()
+        self.path = path
+        self.compression = compression
+        self.compression_level = compression_level
+
+        self._tmp_path = path.with_suffix(".parquet.tmp")
+        self._writer = None
+
+    def write(self, rows: list[dict[str, any]]):
+        """
+        Write messages as a row group
+        """
+        if not rows:
+            return
+
+        if self._writer is None:
+            self._open(rows)
+        self._writer.write_table(to_table(rows, self._writer.schema), row_group_size=len(rows))
+
+    def _open(self, rows: list[dict[str, any]]):
+        existing_file = pq.ParquetFile(self.path) if self.path.exists() else None
+        schema = existing_file.schema_arrow if existing_file is not None else ais_schema(rows)
+
+        self._writer = pq.ParquetWriter(
+            self._tmp_path, schema, **parquet_compression(self.compression, self.compression_level)
+        )
+        if existing_file is not None:
+            for idx in range(existing_file.metadata.num_row_groups):
+                self._writer.write_table(existing_file.read_row_group(idx))
+
+    def close(self):
+        """
+        Complete the file, which replaces an existing file atomically
+        """
+        if self._writer is None:
+            return
+
+        self._writer.close()
+        self._writer = None
+        self._tmp_path.replace(self.path)
+
+
+def merge_parquet(path: Path, other_path: Path):
+    """
+    Merge the messages of another Parquet file into a Parquet file, keeping the
+    messages ordered by time and dropping messages that are in both files
+
+    Distinct messages with the same time are kept in the order of the files.
+    The file is replaced atomically and keeps its compression.
+    """
+    require_pyarrow()
+
+    parquet_file = pq.ParquetFile(path)
+    compression = "none"
+    if parquet_file.metadata.num_row_groups > 0:
+        compression = parquet_file.metadata.row_group(0).column(0).compression.lower()
+        if compression == "uncompressed":
+            compression = "none"
+
+    # the sort is stable, so that messages with the same time keep their order
+    table = pa.concat_tables(
+        [parquet_file.read(), pq.read_table(other_path)], promote_options="permissive"
+    ).sort_by("msgtime")
+
+    # messages are duplicates only among messages of the same time
+    is_new = []
+    last_msgtime = None
+    seen = set()
+    for row in table.to_pylist():
+        if row["msgtime"] != last_msgtime:
+            last_msgtime = row["msgtime"]
+            seen.clear()
+
+        key = tuple(row.values())
+        is_new.append(key not in seen)
+        seen.add(key)
+    table = table.filter(pa.array(is_new, type=pa.bool_()))
+
+    tmp_path = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, compression=compression)
+    tmp_path.replace(path)
+
+
+def read_last_rows(path: Path) -> list[dict[str, any]]:
+    """
+    Get the messages with the time of the last message of a Parquet file, whereas
+    only its last row group is read
+    """
+    require_pyarrow()
+
+    parquet_file = pq.ParquetFile(path)
+    for idx in reversed(range(parquet_file.metadata.num_row_groups)):
+        rows = parquet_file.read_row_group(idx).to_pylist()
+        if rows:
+            last_msgtime = rows[-1]["msgtime"]
+            return [row for row in rows if row["msgtime"] == last_msgtime]
+    return []
+
+
+def to_row(data: dict[str, any]) -> dict[str, any]:
+    """
+    Convert a message to a row as read from a Parquet file, i.e., to the column types
+    """
+    return to_table([data], ais_schema([data])).to_pylist()[0]
+
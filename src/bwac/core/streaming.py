@@ -0,0 +1,103 @@
+"""
+Module containing the incremental decoding of large JSON responses, so that
+their messages can be processed without holding the whole response in memory
+"""
+
+import codecs
+import json
+import pickle
+import re
+import tempfile
+from typing import Iterable, Iterator, Sequence
+
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_SPOOL_CHUNK_SIZE = 10000
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[any]:
+    """
+    Decode the elements of a JSON array incrementally from chunks of its UTF-8 encoding
+
+    Only the not yet decoded remainder of the received chunks is kept in memory.
+
+    :param chunks: the encoded array, e.g., the chunks of a response body
+    :return: iterator over the elements of the array
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    buffer = ""
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(
+                        f"iter_json_array: expected a JSON array, got '{buffer[pos:pos + 20]}'"
+                    )
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # element is incomplete, wait for the next chunk
+                break
+
+            if end == len(buffer) and not isinstance(element, (dict, list)):
+                # a number might continue in the next chunk
+                break
+
+            yield element
+            pos = end
+
+    raise ValueError("iter_json_array: incomplete JSON array")
+
+
+def iter_reversed(
+    items: Iterable[any], chunk_size: int = DEFAULT_SPOOL_CHUNK_SIZE
+) -> Iterator[any]:
+    """
+    Iterate over items in reverse order
+
+    Sequences are reversed directly. Other iterables are spooled to a temporary file
+    in chunks, which are read back last to first, so that at most one chunk is held
+    in memory.
+    """
+    if isinstance(items, Sequence):
+        yield from reversed(items)
+        return
+
+    with tempfile.TemporaryFile() as spool:
+        offsets = []
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                offsets.append(spool.tell())
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk = []
+
+        # the last chunk is still in memory
+        yield from reversed(chunk)
+
+        for offset in reversed(offsets):
+            spool.seek(offset)
+            yield from reversed(pickle.load(spool))
@@ -0,0 +1,119 @@
+"""
+Module containing the on-disk cache of access tokens, which is shared by all
+processes of a user, so that a token is only requested once until it expires
+"""
+
+import contextlib
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking on Windows - writes remain atomic, but concurrent processes
+    # might request a token each
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def default_token_cache_path() -> Path:
+    cache_dir = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_dir) / "bwac" / "tokens.json"
+
+
+def token_key(client_id: str, scope: str) -> str:
+    """
+    Get the key of the tokens of a client and scope, which does not reveal the client id
+    """
+    return hashlib.sha256(f"{client_id}|{scope}".encode("UTF-8")).hexdigest()
+
+
+class TokenCache:
+    """
+    JSON file of tokens and their expiration by client and scope
+
+    The file is only readable by the user and replaced atomically. A lock file
+    serializes renewals across processes, so that only the first process
+    requests a token while the others wait for and reuse it.
+    """
+
+    path: Path
+
+    def __init__(self, path: str | Path | None = None):
+        """
+        :param path: path of the cache (default: $XDG_CACHE_HOME/bwac/tokens.json)
+        """
+        self.path = Path(path).expanduser() if path is not None else default_token_cache_path()
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    @property
+    def lock_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".lock")
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Hold the lock of the cache, which is exclusive across threads and processes
+        """
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self) -> dict[str, dict[str, any]]:
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"TokenCache: ignoring unreadable cache {self.path}: {e}")
+            return {}
+
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def get(self, key: str) -> tuple[dict[str, any], dt.datetime] | None:
+        """
+        Get a token and its expiration or None, if there is no token for the key
+        """
+        entry = self.read().get(key)
+        if entry is None:
+            return None
+
+        try:
+            return entry["token"], dt.datetime.fromisoformat(entry["expiration"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def put(self, key: str, token: dict[str, any], expiration: dt.datetime):
+        """
+        Store a token and drop expired tokens - should be called while holding the lock
+        """
+        now = dt.datetime.now(tz=dt.timezone.utc)
+
+        entries = {}
+        for k, entry in self.read().items():
+            try:
+                if dt.datetime.fromisoformat(entry["expiration"]) > now:
+                    entries[k] = entry
+            except (KeyError, TypeError, ValueError):
+                continue
+        entries[key] = {"token": token, "expiration": expiration.isoformat()}
+
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,493 @@
+"""
+Module containing a local stand-in for the BarentsWatch services, which serves
+the token endpoint, the live stream and the historic api with synthetic messages,
+so that the consumers can be load tested offline and reproducibly
+
+The server can be started from the command line with
+
+    $> python -m bwac.testing.fake_server --port 8080 --message-rate 5000
+
+and prints the settings that point the bwac clients to it.
+"""
+
+import argparse
+import datetime as dt
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATH = "/connect/token"
+LIVE_PATH = "/v1/combined"
+HISTORIC_PATH = "/v1/historic"
+TRACK_PATH = re.compile(HISTORIC_PATH + r"/tracks/(\d+)/([^/]+)/([^/]+)")
+
+FIRST_MMSI = 257000000
+# maximum number of messages of the live stream that are sent in one chunk
+MAX_BATCH_SIZE = 1000
+
+
+class FakeServerConfig:
+    """
+    Behaviour of the fake server
+    """
+
+    vessels: int
+    message_rate: float
+    track_length: int
+    latency_in_s: float
+    error_rate: float
+    throttle_rate: float
+    retry_after_in_s: int
+    disconnect_after: int | None
+    token_expires_in: int
+    seed: int
+
+    def __init__(
+        self,
+        vessels: int = 100,
+        message_rate: float = 1000.0,
+        track_length: int = 100,
+        latency_in_s: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after_in_s: int = 1,
+        disconnect_after: int | None = None,
+        token_expires_in: int = 3600,
+        seed: int = 0,
+    ):
+        """
+        :param vessels: number of vessels, whose messages are served
+        :param message_rate: messages per second of the live stream, 0 for as fast as possible
+        :param track_length: number of messages of a historic track
+        :param latency_in_s: delay before each api response
+        :param error_rate: fraction of api requests that fail with status 500
+        :param throttle_rate: fraction of api requests that are throttled with status 429
+        :param retry_after_in_s: Retry-After of throttled requests
+        :param disconnect_after: number of messages after which the live stream is cut,
+            None to stream until the client disconnects
+        :param token_expires_in: lifetime of issued tokens in seconds
+        :param seed: seed of the random failures and messages
+        """
+        self.vessels = vessels
+        self.message_rate = message_rate
+        self.track_length = track_length
+        self.latency_in_s = latency_in_s
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after_in_s = retry_after_in_s
+        self.disconnect_after = disconnect_after
+        self.token_expires_in = token_expires_in
+        self.seed = seed
+
+    @property
+    def mmsis(self) -> list[int]:
+        return list(range(FIRST_MMSI, FIRST_MMSI + self.vessels))
+
+
+def fake_message(mmsi: int, msgtime: dt.datetime) -> dict[str, any]:
+    """
+    Create a position message of a vessel, which is deterministic for mmsi and msgtime
+    """
+    rng = random.Random(mmsi * 1000003 + int(msgtime.timestamp()))
+    return {
+        "courseOverGround": round(rng.uniform(0, 360), 1),
+        "latitude": round(rng.uniform(58.0, 71.0), 6),
+        "longitude": round(rng.uniform(4.0, 31.0), 6),
+        "name": f"VESSEL {mmsi - FIRST_MMSI}",
+        "rateOfTurn": rng.randint(-10, 10),
+        "shipType": rng.choice([30, 52, 60, 70, 80]),
+        "speedOverGround": round(rng.uniform(0, 25), 1),
+        "trueHeading": rng.randint(0, 359),
+        "navigationalStatus": rng.choice([0, 1, 5]),
+        "mmsi": mmsi,
+        "msgtime": msgtime.isoformat(),
+    }
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 for keep-alive connections and chunked responses
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self) -> "FakeBarentsWatch":
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        logger.debug(f"FakeBarentsWatch: {format % args}")
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def send_json(self, status: int, data: any, headers: dict[str, str] | None = None):
+        body = json.dumps(data).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def is_authorized(self) -> bool:
+        authorization = self.headers.get("Authorization", "")
+        if self.fake.is_valid_token(authorization.removeprefix("Bearer ")):
+            return True
+
+        self.send_json(401, {"error": "invalid_token"})
+        return False
+
+    def inject_failure(self) -> bool:
+        """
+        Delay the response and answer with an injected failure
+
+        :return: True, if a failure has been sent
+        """
+        if self.fake.config.latency_in_s > 0:
+            time.sleep(self.fake.config.latency_in_s)
+
+        failure = self.fake.draw_failure()
+        if failure == 429:
+            self.send_json(
+                429,
+                {"error": "too many requests"},
+                headers={"Retry-After": str(self.fake.config.retry_after_in_s)},
+            )
+            return True
+        if failure == 500:
+            self.send_json(500, {"error": "internal server error"})
+            return True
+        return False
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        self.fake.count("requests")
+
+        if path == TOKEN_PATH:
+            self.read_body()
+            self.send_json(
+                200,
+                {
+                    "access_token": self.fake.issue_token(),
+                    "expires_in": self.fake.config.token_expires_in,
+                    "token_type": "Bearer",
+                },
+            )
+        elif path == HISTORIC_PATH + "/mmsiinarea":
+            body = self.read_body()
+            if self.is_authorized() and not self.inject_failure():
+                self.send_json(200, self.fake.mmsis_in_area(body))
+        else:
+            self.read_body()
+            self.send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        self.fake.count("requests")
+
+        if path == LIVE_PATH:
+            if self.is_authorized() and not self.inject_failure():
+                self.stream_messages()
+            return
+
+        match = TRACK_PATH.fullmatch(path)
+        if match is not None:
+            if self.is_authorized() and not self.inject_failure():
+                self.send_track(
+                    mmsi=int(match.group(1)),
+                    from_date=dt.datetime.fromisoformat(unquote(match.group(2))),
+                    to_date=dt.datetime.fromisoformat(unquote(match.group(3))),
+                )
+            return
+
+        self.send_json(404, {"error": "not found"})
+
+    def send_track(self, mmsi: int, from_date: dt.datetime, to_date: dt.datetime):
+        """
+        Send a track in reverse time order as chunked JSON array
+        """
+        if from_date.tzinfo is None:
+            from_date = from_date.replace(tzinfo=dt.timezone.utc)
+        if to_date.tzinfo is None:
+            to_date = to_date.replace(tzinfo=dt.timezone.utc)
+
+        to_date = min(to_date, dt.datetime.now(tz=dt.timezone.utc))
+        length = self.fake.config.track_length if to_date > from_date else 0
+        step = (to_date - from_date) / max(length, 1)
+
+        self.start_chunked("application/json")
+        self.write_chunk(b"[")
+        for i in reversed(range(length)):
+            message = json.dumps(fake_message(mmsi, from_date + i * step))
+            separator = "," if i > 0 else ""
+            self.write_chunk((message + separator).encode("UTF-8"))
+        self.write_chunk(b"]")
+        self.end_chunked()
+
+    def stream_messages(self):
+        """
+        Stream NDJSON messages of all vessels round-robin at the configured rate
+        """
+        config = self.fake.config
+        mmsis = config.mmsis
+
+        self.start_chunked("application/x-ndjson")
+
+        sent = 0
+        start_time = time.monotonic()
+        try:
+            while not self.fake.stopped:
+                if config.disconnect_after is not None and sent >= config.disconnect_after:
+                    self.fake.count("disconnects")
+                    # cut the connection without the final chunk
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                    return
+
+                batch_size = MAX_BATCH_SIZE
+                if config.message_rate > 0:
+                    due = int((time.monotonic() - start_time) * config.message_rate) - sent
+                    if due <= 0:
+                        time.sleep(min(0.01, 1 / config.message_rate))
+                        continue
+                    batch_size = min(due, MAX_BATCH_SIZE)
+                if config.disconnect_after is not None:
+                    batch_size = min(batch_size, config.disconnect_after - sent)
+
+                now = dt.datetime.now(tz=dt.timezone.utc)
+                lines = [
+                    json.dumps(fake_message(mmsis[(sent + i) % len(mmsis)], now))
+                    for i in range(batch_size)
+                ]
+                self.write_chunk(("\n".join(lines) + "\n").encode("UTF-8"))
+                sent += batch_size
+                self.fake.count("messages", batch_size)
+
+            self.end_chunked()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("FakeBarentsWatch: client disconnected from live stream")
+            self.close_connection = True
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    # do not wait for open live streams on shutdown
+    daemon_threads = True
+    fake: "FakeBarentsWatch"
+
+
+class FakeBarentsWatch:
+    """
+    Local server, which stands in for the BarentsWatch token endpoint, live stream
+    and historic api
+
+    Use env() to point the clients to the server, e.g., via monkeypatch.setenv or
+    os.environ. The counters (see stats) allow to check the load the server received.
+    """
+
+    config: FakeServerConfig
+    host: str
+    port: int
+    stats: dict[str, int]
+
+    def __init__(
+        self, config: FakeServerConfig | None = None, host: str = "127.0.0.1", port: int = 0
+    ):
+        """
+        :param port: port to listen on, 0 to pick a free port
+        """
+        self.config = config if config is not None else FakeServerConfig()
+        self.host = host
+        self.port = port
+        self.stats = {
+            "requests": 0,
+            "tokens": 0,
+            "throttled": 0,
+            "errors": 0,
+            "messages": 0,
+            "disconnects": 0,
+        }
+
+        self._tokens = set()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def token_url(self) -> str:
+        return self.url + TOKEN_PATH
+
+    @property
+    def live_ais_url(self) -> str:
+        return self.url + LIVE_PATH
+
+    @property
+    def historic_ais_url(self) -> str:
+        return self.url + HISTORIC_PATH
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def env(self) -> dict[str, str]:
+        """
+        Get the settings (see BarentsWatchSettings), which point the clients to this server
+        """
+        return {
+            "BARENTS_WATCH_CLIENT_ID": "fake",
+            "BARENTS_WATCH_CLIENT_SECRET": "fake",
+            "BARENTS_WATCH_TOKEN_URL": self.token_url,
+            "BARENTS_WATCH_LIVE_AIS_URL": self.live_ais_url,
+            "BARENTS_WATCH_HISTORIC_AIS_URL": self.historic_ais_url,
+        }
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def issue_token(self) -> str:
+        with self._lock:
+            self.stats["tokens"] += 1
+            token = f"fake-{self.stats['tokens']}"
+            self._tokens.add(token)
+        return token
+
+    def is_valid_token(self, token: str) -> bool:
+        with self._lock:
+            return token in self._tokens
+
+    def draw_failure(self) -> int | None:
+        """
+        Draw whether a request fails
+
+        :return: the status code of the failure or None
+        """
+        with self._lock:
+            x = self._rng.random()
+            if x < self.config.throttle_rate:
+                self.stats["throttled"] += 1
+                return 429
+            if x < self.config.throttle_rate + self.config.error_rate:
+                self.stats["errors"] += 1
+                return 500
+        return None
+
+    def mmsis_in_area(self, body: bytes) -> list[int]:
+        """
+        Get a stable subset of the vessels for an area, so that areas overlap partially
+        """
+        rng = random.Random(zlib.crc32(body))
+        mmsis = self.config.mmsis
+        return sorted(rng.sample(mmsis, k=(len(mmsis) + 1) // 2))
+
+    def start(self) -> "FakeBarentsWatch":
+        self._stopped.clear()
+        self._server = FakeHTTPServer((self.host, self.port), FakeRequestHandler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="bwac-fake-server",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.info(f"FakeBarentsWatch: listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the BarentsWatch services"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+
+    defaults = FakeServerConfig()
+    parser.add_argument("--vessels", type=int, default=defaults.vessels)
+    parser.add_argument(
+        "--message-rate",
+        type=float,
+        default=defaults.message_rate,
+        help="Messages per second of the live stream, 0 for as fast as possible",
+    )
+    parser.add_argument("--track-length", type=int, default=defaults.track_length)
+    parser.add_argument("--latency", type=float, default=defaults.latency_in_s)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--retry-after", type=int, default=defaults.retry_after_in_s)
+    parser.add_argument("--disconnect-after", type=int, default=defaults.disconnect_after)
+    parser.add_argument("--token-expires-in", type=int, default=defaults.token_expires_in)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        vessels=args.vessels,
+        message_rate=args.message_rate,
+        track_length=args.track_length,
+        latency_in_s=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after_in_s=args.retry_after,
+        disconnect_after=args.disconnect_after,
+        token_expires_in=args.token_expires_in,
+        seed=args.seed,
+    )
+
+    logging.basicConfig(level=logging.INFO)
+    with FakeBarentsWatch(config, host=args.host, port=args.port) as fake:
+        for name, value in fake.env().items():
+            print(f"{name}={value}")
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    run()
@@ -1,39 +1,165 @@
 import datetime as dt
 import logging
-import re
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Sequence
 
 from bwac.core.constants import BARENTS_WATCH_DATETIME_PATTERN
 
+if TYPE_CHECKING:
+    import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# python 3.11 extended fromisoformat to any number of fractional digits and 'Z'
+FROMISOFORMAT_READS_ALL = sys.version_info >= (3, 11)
 
-def read_timestamp(msg_time: str):
-    # some milliseconds go beyond six digits, so filtering those out
-    try:
-        timestamp = dt.datetime.fromisoformat(msg_time)
-    except Exception as e:
-        logger.debug(e)
-        m = re.match(
-            r"(.*T[0-9]{2}:[0-9]{2}:[0-9]{2})(\.[0-9]*)?(\+[0-9]{2}:[0-9]{2})", msg_time
-        )
 
-        milliseconds = m.groups()[1]
-        if milliseconds is None:
-            milliseconds = "000000"
+def normalize_timestamp(msg_time: str) -> str:
+    """
+    Normalize a timestamp, so that it can be read by datetime.fromisoformat on
+    python < 3.11, i.e., use six fractional digits and +00:00 instead of Z
+    """
+    length = len(msg_time)
+
+    # "YYYY-mm-ddTHH:MM:SS" is followed by optional fractional seconds and timezone
+    if length > 19 and msg_time[19] == ".":
+        if msg_time[-1] == "Z":
+            end = length - 1
+        elif msg_time[-6] in "+-":
+            end = length - 6
         else:
-            # strip . at the beginning
-            milliseconds = milliseconds[1:]
-            if len(milliseconds) > 6:
-                milliseconds = milliseconds[:6]
-            else:
-                milliseconds = milliseconds + "0" * (6 - len(milliseconds))
+            end = length
+
+        digits = end - 20
+        if digits > 6:
+            msg_time = msg_time[:26] + msg_time[end:]
+        elif digits < 6:
+            msg_time = msg_time[:end] + "0" * (6 - digits) + msg_time[end:]
+
+    if msg_time[-1] == "Z":
+        msg_time = msg_time[:-1] + "+00:00"
+
+    return msg_time
+
 
-        iso_format = "".join(m.groups()[0] + "." + milliseconds + m.groups()[2])
-        timestamp = dt.datetime.fromisoformat(iso_format)
+def read_timestamp(msg_time: str) -> dt.datetime:
+    """
+    Read a timestamp in one of the ISO formats used by BarentsWatch, e.g.,
+    2025-07-24T10:14:50+00:00, 2025-07-24T10:14:50.1234567+00:00 or 2025-07-24T10:14:50Z
 
+    This is on the path of every single message, so there is no exception-driven
+    fallback: since python 3.11 datetime.fromisoformat reads all these formats,
+    before the timestamp is normalized by slicing.
+    """
+    if FROMISOFORMAT_READS_ALL:
+        return dt.datetime.fromisoformat(msg_time)
+    return dt.datetime.fromisoformat(normalize_timestamp(msg_time))
+
+
+def read_timestamps(msg_times: Sequence[str]) -> "np.ndarray":
+    """
+    Read a batch of timestamps (see read_timestamp) in a vectorized way
+
+    :return: array of datetime64[us] in UTC
+    """
+    # imported on demand, since pandas would slow down every import of bwac, e.g., cli starts
+    import pandas as pd
+
+    timestamps = pd.to_datetime(pd.Series(msg_times, dtype=object), format="ISO8601", utc=True)
+    return timestamps.dt.tz_localize(None).to_numpy(dtype="datetime64[us]")
+
+
+def as_utc(timestamp: dt.datetime) -> dt.datetime:
+    """
+    Interpret timestamps without timezone information as UTC
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=dt.timezone.utc)
     return timestamp
 
 
+def iter_lines_backwards(path: str | Path, chunk_size: int = 4096) -> Iterator[str]:
+    """
+    Iterate over the non-empty lines of a text file from its end by seeking backwards
+    """
+    with open(path, "rb") as fp:
+        position = fp.seek(0, 2)
+        data = b""
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            fp.seek(position)
+            data = fp.read(read_size) + data
+
+            # a complete line requires a line break before its content
+            lines = data.split(b"\n")
+            data = lines[0]
+            for line in reversed(lines[1:]):
+                line = line.rstrip(b"\r")
+                if line:
+                    yield line.decode("UTF-8")
+
+        data = data.rstrip(b"\r")
+        if data:
+            yield data.decode("UTF-8")
+
+
+def iter_blocks_backwards(path: str | Path, chunk_size: int = 4096) -> Iterator[bytes]:
+    """
+    Iterate over the blocks of a file from its end by seeking backwards
+    """
+    with open(path, "rb") as fp:
+        position = fp.seek(0, 2)
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            fp.seek(position)
+            yield fp.read(read_size)
+
+
+def iter_csv_records_backwards(blocks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Iterate over the non-empty records of a csv file, whose blocks are given from its end
+
+    Line breaks inside quoted fields do not end a record: going backwards from the end
+    of a record, a line break is outside of quotes, if an even number of quotes follows it.
+    """
+    # the scanned part of the current record, which starts in an earlier block
+    data = b""
+    quoted = False
+    for block in blocks:
+        data = block + data
+        end = len(data)
+        position = len(block)
+        while True:
+            idx = data.rfind(b"\n", 0, position)
+            if idx < 0:
+                break
+
+            quoted ^= data.count(b'"', idx + 1, position) % 2 == 1
+            position = idx
+            if not quoted:
+                record = data[idx + 1 : end].rstrip(b"\r")
+                end = idx
+                if record:
+                    yield record.decode("UTF-8")
+
+        quoted ^= data.count(b'"', 0, position) % 2 == 1
+        data = data[:end]
+
+    record = data.rstrip(b"\r")
+    if record:
+        yield record.decode("UTF-8")
+
+
+def read_last_line(path: str | Path, chunk_size: int = 4096) -> str | None:
+    """
+    Read the last non-empty line of a text file by seeking backwards from its end
+    """
+    return next(iter_lines_backwards(path, chunk_size=chunk_size), None)
+
+
 def timestamp_to_txt(t: dt.datetime):
     value = t.strftime(BARENTS_WATCH_DATETIME_PATTERN)
     return value[:-6] + "Z"
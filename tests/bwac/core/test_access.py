@@ -1,4 +1,9 @@
+import datetime as dt
+import time
+from unittest.mock import MagicMock
+
 from bwac.core.access import Access
+from bwac.core.token_cache import TokenCache, token_key
 
 
 def test_acquire(tmp_path):
@@ -7,3 +12,111 @@ def test_acquire(tmp_path):
 
     assert access.access_token
     assert access.expires_in
+
+
+def token_response(access_token: str, expires_in: int = 3600):
+    response = MagicMock()
+    response.json.return_value = {"access_token": access_token, "expires_in": expires_in}
+    return response
+
+
+def test_access_uses_token_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_TOKEN_CACHE", str(tmp_path / "tokens.json"))
+
+    session = MagicMock()
+    session.post.side_effect = [token_response("first"), token_response("second")]
+
+    access = Access(session=session)
+    assert access.token_cache.path == tmp_path / "tokens.json"
+    access.acquire()
+
+    # a further process reuses the token
+    other = Access(session=session)
+    other.acquire()
+    assert other.access_token == "first"
+    assert other.expiration == access.expiration
+    assert session.post.call_count == 1
+
+    other.acquire(force=True)
+    assert other.access_token == "second"
+    assert session.post.call_count == 2
+
+    assert (tmp_path / "tokens.json").stat().st_mode & 0o777 == 0o600
+
+
+def test_access_renews_expired_cached_token(monkeypatch, tmp_path):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+
+    token_cache = TokenCache(tmp_path / "tokens.json")
+    session = MagicMock()
+    session.post.side_effect = [token_response("expiring", expires_in=50), token_response("new")]
+
+    Access(session=session, token_cache=token_cache).acquire()
+
+    access = Access(session=session, token_cache=token_cache)
+    access.acquire()
+    assert access.access_token == "new"
+    assert session.post.call_count == 2
+
+
+def test_access_restores_remaining_lifetime(monkeypatch, tmp_path):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+
+    # a token that has been received half an hour ago
+    token_cache = TokenCache(tmp_path / "tokens.json")
+    expiration = dt.datetime.now(tz=dt.timezone.utc) + dt.timedelta(seconds=1800)
+    access = Access(session=MagicMock(), token_cache=token_cache)
+    token_cache.put(access.token_key, {"access_token": "cached", "expires_in": 3600}, expiration)
+
+    access.acquire()
+    assert access.access_token == "cached"
+    assert access.expires_in == 3600
+    assert 1790 < access.remaining_lifetime_in_s <= 1800
+    access.session.post.assert_not_called()
+
+
+def test_token_cache_keys(tmp_path):
+    token_cache = TokenCache(tmp_path / "tokens.json")
+    expiration = dt.datetime.now(tz=dt.timezone.utc) + dt.timedelta(hours=1)
+    token_cache.put(token_key("a", "ais"), {"access_token": "a"}, expiration)
+
+    assert token_cache.get(token_key("a", "ais")) == ({"access_token": "a"}, expiration)
+    assert token_cache.get(token_key("a", "other")) is None
+    assert token_cache.get(token_key("b", "ais")) is None
+
+    (tmp_path / "tokens.json").write_text("{broken")
+    assert token_cache.get(token_key("a", "ais")) is None
+
+
+def test_token_refresher(monkeypatch):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+
+    session = MagicMock()
+    session.post.side_effect = [
+        token_response("first", expires_in=200),
+        ConnectionError("unavailable"),
+        token_response("second", expires_in=3600),
+    ]
+
+    access = Access(session=session)
+    access.acquire()
+
+    # the first token expires within the margin of the refresher
+    refresher = access.start_refresher(margin_in_s=300, retry_in_s=0.01)
+    deadline = time.monotonic() + 5
+    while refresher.renewals == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert refresher.is_alive()
+    assert refresher.failures == 1
+    assert refresher.renewals == 1
+    assert access.access_token == "second"
+    assert session.post.call_count == 3
+
+    access.stop_refresher()
+    assert not refresher.is_alive()
@@ -0,0 +1,68 @@
+import contextlib
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from bwac.core.async_historic_consumer import AsyncHistoricConsumer
+from bwac.core.async_livestream_consumer import AsyncLivestreamConsumer
+from bwac.utils import read_timestamp
+
+TOKEN = {"access_token": "dummy", "expires_in": 3600}
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/connect/token":
+        return httpx.Response(200, json=TOKEN)
+
+    assert request.headers["Authorization"] == "Bearer dummy"
+    if request.url.path.endswith("/mmsiinarea"):
+        return httpx.Response(200, json=[1, 2, 3])
+    if "/tracks/" in request.url.path:
+        mmsi = int(request.url.path.split("/")[4])
+        return httpx.Response(200, json=[{"mmsi": mmsi, "msgtime": "2026-04-20T00:00:00+00:00"}])
+    if request.url.path == "/v1/combined":
+        lines = [json.dumps({"mmsi": mmsi, "msgtime": "2026-04-20T00:00:00+00:00"}) for mmsi in range(10)]
+        return httpx.Response(200, content="\n".join(lines).encode("UTF-8"))
+
+    return httpx.Response(404)
+
+
+@pytest.mark.asyncio
+async def test_async_historic_consumer():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    async with AsyncHistoricConsumer(max_concurrency=2, client=client) as consumer:
+        mmsis = await consumer.query_all_mmsis(from_date, to_date)
+        assert mmsis == [1, 2, 3]
+
+        tracks = {mmsi: track async for mmsi, track in consumer.query_tracks(mmsis, from_date, to_date)}
+        assert sorted(tracks) == mmsis
+        assert all(track[0]["mmsi"] == mmsi for mmsi, track in tracks.items())
+
+
+@pytest.mark.asyncio
+async def test_async_livestream_consumer():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async with AsyncLivestreamConsumer(client=client) as consumer:
+        messages = []
+        with patch.object(consumer, "wait_for_timeout", AsyncMock()) as wait_for_timeout:
+            async with contextlib.aclosing(consumer.messages()) as stream:
+                async for message in stream:
+                    messages.append(message)
+                    if len(messages) == 15:
+                        break
+
+    # the stream is reconnected with a backoff after the server closed the first connection
+    assert [m["mmsi"] for m in messages] == list(range(10)) + list(range(5))
+    wait_for_timeout.assert_awaited_once()
@@ -0,0 +1,45 @@
+import pytest
+
+from bwac.core.compression import open_file, read_last_line
+from bwac.core.file_pool import FilePool
+from bwac.core.sinks import RawSink
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_append_compressed(compression, tmp_path):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    path = tmp_path / "lines.txt"
+    for lines in [["a,1", "b,2"], ["c,3"]]:
+        with open_file(path, "at", compression=compression, level=1, newline="") as fp:
+            for line in lines:
+                fp.write(line + "\n")
+
+    with open_file(path, "rt", compression=compression, newline="") as fp:
+        assert fp.read() == "a,1\nb,2\nc,3\n"
+
+    assert read_last_line(path, compression=compression) == "c,3"
+
+
+@pytest.mark.parametrize("compression,suffix", [("gzip", ".gz"), ("zstd", ".zst")])
+def test_raw_sink_compressed(compression, suffix, tmp_path):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    lines = [b'{"mmsi":1}', b'{"mmsi":2}']
+    for line in lines:
+        # a new sink appends to the file of the previous one
+        sink = RawSink(tmp_path, open_files=FilePool(), compression=compression)
+        sink.write("2026_04_20", line)
+        sink.flush()
+        sink.close()
+
+    path = tmp_path / f"AIS_2026_04_20.ndjson{suffix}"
+    with open_file(path, "rb", compression=compression) as fp:
+        assert fp.read().splitlines() == lines
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError, match="Unknown compression"):
+        RawSink(tmp_path, open_files=FilePool(), compression="lz4")
@@ -0,0 +1,27 @@
+from bwac.core.dedup import LastSeenIndex
+
+
+def test_is_duplicate():
+    index = LastSeenIndex(capacity=10)
+
+    assert not index.is_duplicate(1, 100.0)
+    assert index.is_duplicate(1, 100.0)
+    assert index.is_duplicate(1, 99.0)
+    assert not index.is_duplicate(1, 101.0)
+    assert not index.is_duplicate(2, 100.0)
+    assert index.dropped == 2
+
+
+def test_eviction():
+    index = LastSeenIndex(capacity=2)
+
+    index.is_duplicate(1, 100.0)
+    index.is_duplicate(2, 100.0)
+    # refresh 1, so that 2 is the least recently seen
+    index.is_duplicate(1, 101.0)
+    index.is_duplicate(3, 100.0)
+
+    assert len(index) == 2
+    assert index.evicted == 1
+    assert index.is_duplicate(1, 101.0)
+    assert not index.is_duplicate(2, 100.0)
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from bwac.core.file_pool import FilePool
+
+
+def open_text(path):
+    return open(path, "a"), None
+
+
+def test_lru_eviction(tmp_path):
+    pool = FilePool(max_open_files=2)
+    paths = [tmp_path / f"{name}.txt" for name in "abc"]
+
+    for path in paths[:2]:
+        with pool.use(path, open_text) as (fp, _):
+            fp.write(f"{path.stem}1\n")
+
+    b_fp = pool.get(paths[1])[0]
+    # a becomes the most recently used file, so that b is evicted
+    pool.get(paths[0])[0].write("a2\n")
+    with pool.use(paths[2], open_text) as (fp, _):
+        fp.write("c1\n")
+
+    assert pool.keys() == [paths[0], paths[2]]
+    assert pool.evictions == 1
+    # evicted files are flushed and closed
+    assert b_fp.closed
+    assert paths[1].read_text() == "b1\n"
+
+    # reopened files are appended to
+    with pool.use(paths[1], open_text) as (fp, _):
+        fp.write("b2\n")
+
+    pool.clear()
+    assert len(pool) == 0
+    assert [x.read_text() for x in paths] == ["a1\na2\n", "b1\nb2\n", "c1\n"]
+
+
+def test_files_in_use_are_not_evicted(tmp_path):
+    pool = FilePool(max_open_files=1)
+
+    with pool.use(tmp_path / "a.txt", open_text) as (a_fp, _):
+        with pool.use(tmp_path / "b.txt", open_text) as (b_fp, _):
+            assert len(pool) == 2
+            assert not a_fp.closed
+
+        # exceeding files are evicted once released
+        assert len(pool) == 1
+        assert b_fp.closed
+        assert not a_fp.closed
+
+    pool.clear()
+    assert a_fp.closed
+
+    with pytest.raises(ValueError, match="at least 1"):
+        FilePool(max_open_files=0)
+
+
+def test_concurrent_writers(tmp_path):
+    pool = FilePool(max_open_files=4)
+
+    def write(worker: int):
+        for i in range(200):
+            path = tmp_path / f"{worker}_{i % 5}.txt"
+            with pool.use(path, open_text) as (fp, _):
+                fp.write(f"{i}\n")
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.clear()
+
+    assert len(list(tmp_path.glob("*.txt"))) == 40
+    for path in tmp_path.glob("*.txt"):
+        assert len(path.read_text().splitlines()) == 40
+
+
+def test_concurrent_use_opens_a_file_once(tmp_path):
+    pool = FilePool(max_open_files=1)
+    opened = []
+
+    def open_counted(path):
+        opened.append(path)
+        return open_text(path)
+
+    def write():
+        for _ in range(200):
+            with pool.use(tmp_path / "a.txt", open_counted) as (fp, _):
+                fp.write("a\n")
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.clear()
+
+    assert len(opened) == 1
+    assert len((tmp_path / "a.txt").read_text().splitlines()) == 1600
+
+
+def test_opening_a_file_does_not_block_other_files(tmp_path):
+    pool = FilePool(max_open_files=4)
+    opening = threading.Event()
+    resume = threading.Event()
+
+    def open_slowly(path):
+        opening.set()
+        assert resume.wait(timeout=5)
+        return open_text(path)
+
+    def write_slowly():
+        with pool.use(tmp_path / "a.txt", open_slowly) as (fp, _):
+            fp.write("a\n")
+
+    thread = threading.Thread(target=write_slowly)
+    thread.start()
+    assert opening.wait(timeout=5)
+
+    with pool.use(tmp_path / "b.txt", open_text) as (fp, _):
+        fp.write("b\n")
+    assert tmp_path / "a.txt" not in pool
+
+    resume.set()
+    thread.join()
+    pool.clear()
+    assert (tmp_path / "a.txt").read_text() == "a\n"
@@ -0,0 +1,357 @@
+import csv
+import gzip
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from bwac.core.compression import EXTENSIONS, open_file
+from bwac.core.historic_consumer import HistoricConsumer, NorwayAreas
+from bwac.core.manifest import Manifest
+from bwac.core.metrics import Metrics
+from bwac.core.scheduler import RequestScheduler
+from bwac.utils import read_timestamp
+
+
+@pytest.fixture
+def consumer(monkeypatch):
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_ID", "dummy")
+    monkeypatch.setenv("BARENTS_WATCH_CLIENT_SECRET", "dummy")
+
+    consumer = HistoricConsumer()
+    with patch.object(consumer.access, "acquire"):
+        yield consumer
+
+
+def fake_track(mmsi: int, from_date, to_date):
+    # the api returns the track in reverse time order
+    return [
+        {
+            "mmsi": mmsi,
+            "msgtime": f"2026-04-20T00:00:{second:02d}+00:00",
+            "latitude": 59.729342,
+            "longitude": 5.481622,
+        }
+        for second in reversed(range(10))
+    ]
+
+
+def test_download_tracks(consumer, tmp_path):
+    mmsis = list(range(257719900, 257719920))
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    with patch.object(consumer, "query_track", side_effect=fake_track):
+        downloaded = list(
+            consumer.download_tracks(
+                mmsis, from_date=from_date, to_date=to_date, output_dir=tmp_path, workers=4
+            )
+        )
+
+    assert sorted(downloaded) == mmsis
+    for mmsi in mmsis:
+        with open(tmp_path / f"AIS_2026_04_20_{mmsi}.csv", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        assert len(rows) == 10
+        assert [row["msgtime"] for row in rows] == sorted(row["msgtime"] for row in rows)
+
+
+def test_query_all_mmsis_uses_manifest(consumer, tmp_path):
+    consumer.manifest = Manifest.in_directory(tmp_path)
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    with patch.object(
+        consumer, "query_mmsis_in_area", return_value=[3, 1, 2]
+    ) as query_mmsis_in_area:
+        assert consumer.query_all_mmsis(from_date, to_date) == [1, 2, 3]
+        assert query_mmsis_in_area.call_count == len(NorwayAreas)
+
+        assert consumer.query_all_mmsis(from_date, to_date) == [1, 2, 3]
+        assert query_mmsis_in_area.call_count == len(NorwayAreas)
+
+
+def test_save_track_skips_existing_messages(consumer, tmp_path):
+    track = fake_track(257719900, None, None)
+    consumer.save_track(track[5:], tmp_path)
+    consumer.close()
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    with open(tmp_path / "AIS_2026_04_20_257719900.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert [row["msgtime"] for row in rows] == [
+        f"2026-04-20T00:00:{second:02d}+00:00" for second in range(10)
+    ]
+
+
+def test_save_track_parquet(consumer, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    consumer.output_format = "parquet"
+    track = fake_track(257719900, None, None)
+    consumer.save_track(track[5:], tmp_path)
+    consumer.close()
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    table = pq.read_table(tmp_path / "AIS_2026_04_20_257719900.parquet")
+    assert [x.as_py().second for x in table.column("msgtime")] == list(range(10))
+
+
+def test_save_track_parquet_writes_batches_as_row_groups(consumer, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    consumer.output_format = "parquet"
+    track = fake_track(257719900, None, None)
+    path = tmp_path / "AIS_2026_04_20_257719900.parquet"
+
+    consumer.save_track(track[4:], tmp_path, batch_size=3)
+    consumer.close()
+    assert pq.ParquetFile(path).metadata.num_row_groups == 2
+
+    # the existing row groups are kept when resuming
+    consumer.save_track(track, tmp_path, batch_size=3)
+    consumer.close()
+    assert pq.ParquetFile(path).metadata.num_row_groups == 4
+
+    # a file without new messages is not rewritten
+    mtime = path.stat().st_mtime_ns
+    consumer.save_track(track, tmp_path, batch_size=3)
+    consumer.close()
+    assert path.stat().st_mtime_ns == mtime
+    assert [x.as_py().second for x in pq.read_table(path).column("msgtime")] == list(range(10))
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+def test_save_track_resumes_with_line_breaks_in_fields(compression, consumer, tmp_path):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    consumer.compression = compression
+
+    # messages with the same time and names containing line breaks, commas and quotes
+    track = [
+        dict(message, name=name)
+        for message in fake_track(257719900, None, None)
+        for name in ['SHIP "A"\n1.0, X', "SHIP B,\r\n\n2.0"]
+    ]
+    # the track is in reverse order, i.e., only one of the messages of the last time is saved
+    consumer.save_track(track[9:], tmp_path)
+    consumer.close()
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    path = tmp_path / f"AIS_2026_04_20_257719900.csv{EXTENSIONS[compression]}"
+    with open_file(path, "rt", compression=compression, newline="") as f:
+        rows = [(row["msgtime"][-8:-6], row["name"]) for row in csv.DictReader(f)]
+
+    assert rows == [
+        (f"{second:02d}", name)
+        for second in range(10)
+        for name in ["SHIP B,\r\n\n2.0", 'SHIP "A"\n1.0, X']
+    ]
+
+
+def test_save_track_gzip(consumer, tmp_path):
+    consumer.compression = "gzip"
+    track = fake_track(257719900, None, None)
+    consumer.save_track(track[5:], tmp_path)
+    consumer.close()
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    with gzip.open(tmp_path / "AIS_2026_04_20_257719900.csv.gz", "rt", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert [row["msgtime"] for row in rows] == [
+        f"2026-04-20T00:00:{second:02d}+00:00" for second in range(10)
+    ]
+
+
+def test_download_track_streamed(consumer, tmp_path):
+    consumer.stream_tracks = True
+    consumer.access._token = {"access_token": "dummy", "expires_in": 3600}
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(json.dumps(fake_track(257719900, None, None)).encode())
+
+    with patch.object(consumer.session, "request", return_value=response):
+        consumer.download_track(
+            257719900, from_date=from_date, to_date=to_date, output_dir=tmp_path
+        )
+
+    with open(tmp_path / "AIS_2026_04_20_257719900.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert [row["msgtime"] for row in rows] == [
+        f"2026-04-20T00:00:{second:02d}+00:00" for second in range(10)
+    ]
+
+
+class BrokenBody(io.BytesIO):
+    """Body that breaks off after the given number of bytes"""
+
+    def __init__(self, content: bytes, size: int):
+        super().__init__(content[:size])
+
+    def read(self, size=-1):
+        data = super().read(size)
+        if not data:
+            raise requests.exceptions.ChunkedEncodingError("connection broken")
+        return data
+
+
+def test_download_track_streamed_retries_broken_body(consumer, tmp_path):
+    consumer.stream_tracks = True
+    consumer.scheduler = RequestScheduler(backoff_in_s=0)
+    consumer.access._token = {"access_token": "dummy", "expires_in": 3600}
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    content = json.dumps(fake_track(257719900, None, None)).encode()
+    responses = []
+    for raw in [BrokenBody(content, len(content) // 2), io.BytesIO(content)]:
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = raw
+        responses.append(response)
+
+    with patch.object(consumer.session, "request", side_effect=responses):
+        rows = consumer.download_track(
+            257719900, from_date=from_date, to_date=to_date, output_dir=tmp_path
+        )
+    consumer.close()
+
+    assert rows == 10
+    assert consumer.scheduler.retries == 1
+    with open(tmp_path / "AIS_2026_04_20_257719900.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["msgtime"] for row in rows] == [
+        f"2026-04-20T00:00:{second:02d}+00:00" for second in range(10)
+    ]
+
+
+def test_save_track_batches(consumer, tmp_path):
+    consumer.save_track(iter(fake_track(257719900, None, None)), tmp_path, batch_size=3)
+
+    with open(tmp_path / "AIS_2026_04_20_257719900.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    assert len(rows) == 10
+
+
+def test_download_tracks_skips_completed(consumer, tmp_path):
+    consumer.manifest = Manifest.in_directory(tmp_path)
+    mmsis = list(range(257719900, 257719910))
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    def download(mmsis):
+        return list(
+            consumer.download_tracks(
+                mmsis, from_date=from_date, to_date=to_date, output_dir=tmp_path, workers=2
+            )
+        )
+
+    with patch.object(consumer, "query_track", side_effect=fake_track) as query_track:
+        assert sorted(download(mmsis[:5])) == mmsis[:5]
+        assert query_track.call_count == 5
+
+        # resume with the remaining tracks
+        assert sorted(download(mmsis)) == mmsis
+        assert query_track.call_count == 10
+
+        consumer.compression = "gzip"
+        download(mmsis)
+        assert query_track.call_count == 20
+
+    assert consumer.manifest.get_tracks(from_date, to_date, output="csv") == {
+        mmsi: 10 for mmsi in mmsis
+    }
+
+
+def test_download_track_metrics(consumer, tmp_path):
+    consumer.metrics = Metrics()
+    consumer.access._token = {"access_token": "dummy", "expires_in": 3600}
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(json.dumps(fake_track(257719900, None, None)).encode())
+
+    with patch.object(consumer.session, "request", return_value=response):
+        consumer.download_track(
+            257719900, from_date=from_date, to_date=to_date, output_dir=tmp_path
+        )
+
+    assert consumer.metrics.http_requests.get(endpoint="tracks", status=200) == 1
+    assert consumer.metrics.messages.get(consumer="historic") == 10
+    assert consumer.metrics.registry.snapshot()["bwac_write_seconds"]["historic"]["count"] == 1
+
+
+def test_save_track_keeps_files_open(consumer, tmp_path):
+    consumer.files.max_open_files = 2
+    track = fake_track(257719900, None, None)
+
+    consumer.save_track(track[5:], tmp_path)
+    for mmsi in range(257719901, 257719904):
+        consumer.save_track(fake_track(mmsi, None, None), tmp_path)
+    assert len(consumer.files) == 2
+    assert consumer.files.evictions == 2
+
+    # the evicted file is reopened and continued
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    with open(tmp_path / "AIS_2026_04_20_257719900.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["msgtime"] for row in rows] == [
+        f"2026-04-20T00:00:{second:02d}+00:00" for second in range(10)
+    ]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_save_track_keeps_messages_with_equal_time(output_format, consumer, tmp_path):
+    if output_format == "parquet":
+        pq = pytest.importorskip("pyarrow.parquet")
+    consumer.output_format = output_format
+
+    # distinct messages, e.g., position and static data, may share a msgtime
+    track = [
+        dict(message, latitude=latitude)
+        for message in fake_track(257719900, None, None)
+        for latitude in [59.5, 60.5]
+    ]
+    # the track is in reverse order, i.e., only one of the messages of the last time is saved
+    consumer.save_track(track[9:], tmp_path)
+    consumer.close()
+    # resuming does not repeat the last message, but keeps the other one of its time
+    consumer.save_track(track, tmp_path)
+    consumer.close()
+
+    path = tmp_path / f"AIS_2026_04_20_257719900.{output_format}"
+    if output_format == "csv":
+        with open(path, newline="") as f:
+            rows = [(row["msgtime"][-8:-6], float(row["latitude"])) for row in csv.DictReader(f)]
+    else:
+        table = pq.read_table(path)
+        rows = [
+            (f"{msgtime.second:02d}", latitude)
+            for msgtime, latitude in zip(
+                table.column("msgtime").to_pylist(), table.column("latitude").to_pylist()
+            )
+        ]
+
+    assert len(rows) == 20
+    assert sorted(set(rows)) == sorted(rows)
+    assert [second for second, _ in rows] == [f"{s:02d}" for s in range(10) for _ in range(2)]
@@ -1,11 +1,24 @@
 import csv
+import datetime as dt
+import io
 import json
+import logging
+import signal
+import threading
+import time
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
 
-from bwac.core.livestream_consumer import LivestreamConsumer, open_files
+from bwac.core.livestream_consumer import (
+    FlushPolicy,
+    LivestreamConsumer,
+    ProgressReporter,
+    read_day,
+    read_raw_field,
+)
+from bwac.core.metrics import Metrics
 
 BASE = {
     "courseOverGround": 42.9,
@@ -28,7 +41,6 @@ def run_consumer(tmp_path: Path, messages: list[dict]) -> Path:
     fake_response.__enter__ = lambda s: s
     fake_response.__exit__ = lambda *a: None
 
-    open_files.clear()
     consumer = LivestreamConsumer()
     with patch("bwac.core.livestream_consumer.requests.Session") as SessionCls:
         SessionCls.return_value.get.return_value = fake_response
@@ -38,7 +50,7 @@ def run_consumer(tmp_path: Path, messages: list[dict]) -> Path:
             if "timeout after" not in str(e):
                 raise
 
-    for fp, _ in open_files.values():
+    for fp, _ in consumer.open_files.values():
         fp.flush()
 
     out = tmp_path / "AIS_2026_04_20.csv"
@@ -71,3 +83,278 @@ def test_name_roundtrips(label, name, tmp_path):
         f"[{label}] name round-trip failed: got {rows[0]['name']!r}, expected {name!r}"
     )
     assert rows[0]["mmsi"] == str(BASE["mmsi"]), f"[{label}] mmsi corrupted"
+
+
+def test_flush_policy():
+    policy = FlushPolicy(every_n_messages=100, every_ms=None)
+    assert not policy.requires_flush(pending_messages=99, last_flush_time=0)
+    assert policy.requires_flush(pending_messages=100, last_flush_time=0)
+
+    policy = FlushPolicy(every_n_messages=None, every_ms=1000)
+    assert not policy.requires_flush(pending_messages=1, last_flush_time=time.monotonic())
+    assert policy.requires_flush(pending_messages=1, last_flush_time=time.monotonic() - 1)
+
+
+def test_default_flush_policy():
+    assert LivestreamConsumer().flush_policy.every_n_messages == 1
+
+    # flushing a compressed stream ends its block, so it is flushed in intervals
+    policy = LivestreamConsumer(compression="gzip").flush_policy
+    assert not policy.requires_flush(pending_messages=100, last_flush_time=time.monotonic())
+    assert policy.requires_flush(pending_messages=1, last_flush_time=time.monotonic() - 1)
+
+
+def run_fake_stream(consumer: LivestreamConsumer, lines: list[bytes], output_dir: Path):
+    fake_response = MagicMock()
+    fake_response.iter_lines.return_value = lines
+    fake_response.__enter__ = lambda s: s
+    fake_response.__exit__ = lambda *a: None
+
+    with patch("bwac.core.livestream_consumer.requests.Session") as SessionCls:
+        SessionCls.return_value.get.return_value = fake_response
+        consumer.get_data(access_token="dummy", timeout_in_s=3600, output_dir=output_dir)
+
+
+def test_get_data_flushes_on_exit(tmp_path):
+    consumer = LivestreamConsumer(flush_policy=FlushPolicy(every_n_messages=None))
+    run_fake_stream(consumer, [json.dumps(BASE).encode("utf-8")] * 10, tmp_path)
+
+    with (tmp_path / "AIS_2026_04_20.csv").open(newline="") as f:
+        assert len(list(csv.DictReader(f))) == 10
+    consumer.close()
+
+
+@pytest.mark.parametrize(
+    ["line", "day"],
+    [
+        (b'{"mmsi":257719900,"msgtime":"2026-04-20T00:00:00+00:00"}', "2026_04_20"),
+        (b'{"msgtime":"2026-04-20T23:59:59.1234567+00:00","mmsi":257719900}', "2026_04_20"),
+        (b'{"mmsi":257719900,"msgtime": "2026-04-20T00:00:00+00:00"}', None),
+        (b'{"mmsi":257719900}', None),
+    ],
+)
+def test_read_day(line, day):
+    assert read_day(line) == day
+
+
+def test_raw_format(tmp_path):
+    lines = [
+        json.dumps(dict(BASE, msgtime=msgtime, name="BJØRNØYA")).encode("utf-8")
+        for msgtime in ["2026-04-20T23:59:59+00:00", "2026-04-21T00:00:00+00:00"]
+    ]
+
+    consumer = LivestreamConsumer(output_format="raw")
+    run_fake_stream(consumer, lines, tmp_path)
+    consumer.close()
+
+    assert (tmp_path / "AIS_2026_04_20.ndjson").read_bytes() == lines[0] + b"\n"
+    assert (tmp_path / "AIS_2026_04_21.ndjson").read_bytes() == lines[1] + b"\n"
+
+
+@pytest.mark.parametrize("overflow", ["block", "spill"])
+def test_pipelined(overflow, tmp_path):
+    messages = [
+        dict(BASE, msgtime=f"2026-04-20T00:{minute:02d}:00+00:00") for minute in range(50)
+    ]
+
+    consumer = LivestreamConsumer(queue_size=4, overflow=overflow)
+    run_fake_stream(consumer, [json.dumps(m).encode("utf-8") for m in messages], tmp_path)
+    consumer.close()
+
+    with (tmp_path / "AIS_2026_04_20.csv").open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["msgtime"] for row in rows] == [m["msgtime"] for m in messages]
+    assert consumer.queue.dropped == 0
+
+
+class FakeStreamResponse:
+    """Response that provides the given lines and fails after remaining open for open_in_s"""
+
+    def __init__(self, lines: list[bytes], open_in_s: float):
+        self.status_code = 200
+        self.lines = lines
+        self.open_in_s = open_in_s
+        self.closed = threading.Event()
+
+    def iter_lines(self):
+        yield from self.lines
+        if not self.closed.wait(timeout=self.open_in_s):
+            raise ConnectionError("stream dropped")
+
+    def close(self):
+        self.closed.set()
+
+
+def test_get_data_seamless(tmp_path):
+    messages = [
+        dict(BASE, msgtime=f"2026-04-20T00:{minute:02d}:00+00:00") for minute in range(15)
+    ]
+    lines = [json.dumps(m).encode("utf-8") for m in messages]
+
+    # the first token requires an immediate renewal
+    access = MagicMock()
+    access.access_token = "dummy"
+    type(access).remaining_lifetime_in_s = PropertyMock(side_effect=[300, 3600])
+
+    consumer = LivestreamConsumer(renewal_margin_in_s=300, handover_in_s=0.1)
+    # backoff of a previous failure
+    consumer.timeout_in_s = 10
+    with patch("bwac.core.livestream_consumer.requests.Session") as SessionCls:
+        SessionCls.return_value.get.side_effect = [
+            FakeStreamResponse(lines[:10], open_in_s=5),
+            FakeStreamResponse(lines[5:], open_in_s=0.5),
+        ]
+        with pytest.raises(ConnectionError):
+            consumer.get_data_seamless(access, output_dir=tmp_path)
+    consumer.close()
+
+    with (tmp_path / "AIS_2026_04_20.csv").open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row["msgtime"] for row in rows) == [m["msgtime"] for m in messages]
+    assert consumer.timeout_in_s == 0
+
+
+def test_consumers_do_not_share_open_files(tmp_path):
+    first = LivestreamConsumer()
+    second = LivestreamConsumer()
+    run_fake_stream(first, [json.dumps(BASE).encode("utf-8")], tmp_path / "first")
+    run_fake_stream(second, [json.dumps(BASE).encode("utf-8")], tmp_path / "second")
+
+    # closing a consumer keeps the files of the other one open
+    first.close()
+    assert len(first.open_files) == 0
+    assert [fp.closed for fp, _ in second.open_files.values()] == [False]
+    second.close()
+
+
+def test_start_restores_signal_handler(tmp_path):
+    def handler(signum, frame):
+        pass
+
+    previous_handler = signal.signal(signal.SIGTERM, handler)
+    try:
+        consumer = LivestreamConsumer(url="http://localhost")
+        with (
+            patch("bwac.core.livestream_consumer.Access"),
+            patch.object(consumer, "get_data", side_effect=KeyboardInterrupt),
+        ):
+            with pytest.raises(KeyboardInterrupt):
+                consumer.start(output_dir=tmp_path)
+
+        assert signal.getsignal(signal.SIGTERM) is handler
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "raw"])
+def test_deduplicate(output_format, tmp_path):
+    messages = [
+        dict(BASE, msgtime=f"2026-04-20T00:{minute:02d}:00+00:00") for minute in [0, 1, 1, 2, 0, 3]
+    ]
+
+    consumer = LivestreamConsumer(output_format=output_format, deduplicate_capacity=10)
+    run_fake_stream(consumer, [json.dumps(m).encode("utf-8") for m in messages], tmp_path)
+    consumer.close()
+
+    if output_format == "csv":
+        with (tmp_path / "AIS_2026_04_20.csv").open(newline="") as f:
+            msgtimes = [row["msgtime"] for row in csv.DictReader(f)]
+    else:
+        with (tmp_path / "AIS_2026_04_20.ndjson").open() as f:
+            msgtimes = [json.loads(line)["msgtime"] for line in f]
+
+    assert msgtimes == [f"2026-04-20T00:{minute:02d}:00+00:00" for minute in range(4)]
+    assert consumer.last_seen.dropped == 2
+
+
+@pytest.mark.parametrize(
+    ["name", "value"],
+    [
+        (b"mmsi", b"257719900"),
+        (b"msgtime", b"2026-04-20T00:00:00+00:00"),
+        (b"name", b"TITANIC"),
+        (b"trueHeading", b"42"),
+        (b"callSign", None),
+    ],
+)
+def test_read_raw_field(name, value):
+    line = b'{"name":"TITANIC","mmsi":257719900,"msgtime":"2026-04-20T00:00:00+00:00","trueHeading":42}'
+    assert read_raw_field(line, name) == value
+
+
+@pytest.mark.parametrize("output_format", ["csv", "raw"])
+def test_metrics(output_format, tmp_path):
+    messages = [
+        dict(BASE, msgtime=f"2026-04-20T00:{minute:02d}:00+00:00") for minute in [0, 1, 1, 2]
+    ]
+    lines = [json.dumps(m).encode("utf-8") for m in messages]
+
+    fake_response = MagicMock()
+    fake_response.iter_lines.return_value = lines
+    fake_response.status_code = 200
+    fake_response.elapsed = dt.timedelta(milliseconds=20)
+    fake_response.__enter__ = lambda s: s
+    fake_response.__exit__ = lambda *a: None
+
+    metrics = Metrics()
+    consumer = LivestreamConsumer(
+        output_format=output_format, deduplicate_capacity=10, metrics=metrics
+    )
+    with patch("bwac.core.livestream_consumer.requests.Session") as SessionCls:
+        SessionCls.return_value.get.return_value = fake_response
+        consumer.get_data(access_token="dummy", timeout_in_s=3600, output_dir=tmp_path)
+    consumer.close()
+
+    assert metrics.messages.get(consumer="live") == 4
+    assert metrics.bytes.get(consumer="live") == sum(len(line) for line in lines)
+    assert metrics.duplicates.get(consumer="live") == 1
+    assert metrics.http_requests.get(endpoint="live", status="200") == 1
+
+    snapshot = metrics.registry.snapshot()
+    assert snapshot["bwac_parse_seconds"]["live"]["count"] == 4
+    assert snapshot["bwac_write_seconds"]["live"]["count"] == 3
+    assert snapshot["bwac_lag_seconds"]["live"]["count"] == 4
+    assert metrics.last_lag_seconds.get(consumer="live") > 0
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+def test_progress_reporter():
+    terminal = FakeTerminal()
+    progress = ProgressReporter(interval_ms=1000, stream=terminal)
+    line = json.dumps(BASE).encode("utf-8")
+
+    now = time.monotonic()
+    for i in range(100):
+        progress.update(line, "2026_04_20", now + i * 0.1)
+    progress.close()
+
+    # reports are limited to one per second
+    reports = terminal.getvalue().split("\r")
+    assert 9 <= len(reports) - 1 <= 10
+    assert reports[-2].startswith("Processed 91 messages (10 msg/s, lag: ")
+    assert reports[-2].endswith(" - current day: 2026_04_20")
+    assert reports[-1] == "\n"
+
+
+def test_progress_reporter_logs_without_terminal(caplog):
+    stream = io.StringIO()
+    progress = ProgressReporter(log_interval_in_s=5, stream=stream)
+    progress.status = lambda now: " -- (custom status)"
+    line = b'{"mmsi":257719900}'
+
+    now = time.monotonic()
+    with caplog.at_level(logging.INFO, logger="bwac.core.livestream_consumer"):
+        for i in range(100):
+            progress.update(line, "2026_04_20", now + i * 0.1)
+        progress.close()
+
+    assert stream.getvalue() == ""
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith("Processed 51 messages")
+    assert "lag: unknown" in messages[0]
+    assert messages[0].endswith(" -- (custom status)")
@@ -0,0 +1,97 @@
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from bwac.core.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Metrics,
+    MetricsLogger,
+    MetricsRegistry,
+    MetricsServer,
+)
+
+
+def test_counter_and_gauge():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("requests_total", "Requests", ("status",)))
+    gauge = registry.register(Gauge("depth", "Depth"))
+
+    counter.inc(status=200)
+    counter.inc(2, status=200)
+    counter.inc(status=429)
+    gauge.set(5)
+
+    assert counter.get(status=200) == 3
+    assert counter.get(status=500) == 0
+    assert gauge.get() == 5
+
+    with pytest.raises(ValueError, match="expected labels"):
+        counter.inc()
+    with pytest.raises(ValueError, match="exists already"):
+        registry.register(Gauge("depth", "Depth"))
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{status="200"} 3' in text
+    assert 'requests_total{status="429"} 1' in text
+    assert "depth 5" in text
+
+
+def test_histogram():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("latency_seconds", "Latency", buckets=[0.1, 1.0]))
+
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 2.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+    snapshot = registry.snapshot()["latency_seconds"][""]
+    assert snapshot["count"] == 4
+    assert snapshot["p50"] == 0.1
+    assert snapshot["p99"] == float("inf")
+
+
+def test_metrics_logger(caplog):
+    metrics = Metrics()
+    metrics_logger = MetricsLogger(metrics.registry, interval_in_s=60)
+
+    metrics.message("live", size=100)
+    metrics.message("live", size=50)
+    report = metrics_logger.report()
+    assert report["metrics"]["bwac_messages_total"] == {"live": 2}
+    assert report["rates"]["bwac_bytes_per_s"]["live"] > 0
+
+    # rates only cover the interval since the last report
+    report = metrics_logger.report()
+    assert report["rates"]["bwac_bytes_per_s"]["live"] == 0
+
+    with caplog.at_level(logging.INFO, logger="bwac.core.metrics"):
+        metrics_logger.start()
+        metrics_logger.stop()
+    assert json.loads(caplog.records[-1].getMessage())["metrics"]["bwac_bytes_total"] == {"live": 150}
+
+
+def test_metrics_server():
+    metrics = Metrics()
+    metrics.http_request("tracks", 200, 0.3)
+
+    server = MetricsServer(metrics.registry, port=0).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            text = response.read().decode("UTF-8")
+    finally:
+        server.stop()
+
+    assert 'bwac_http_requests_total{endpoint="tracks",status="200"} 1' in text
+    assert 'bwac_http_request_seconds_count{endpoint="tracks"} 1' in text
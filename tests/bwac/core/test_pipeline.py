@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from bwac.core.pipeline import LineQueue, StreamReader
+
+LINES = [f"line-{i}".encode("UTF-8") for i in range(100)]
+
+
+def test_block(tmp_path):
+    queue = LineQueue(maxsize=10, overflow="block")
+    reader = StreamReader(LINES, queue)
+    reader.start()
+
+    assert list(queue) == LINES
+    reader.join()
+    assert queue.dropped == 0
+    assert queue.max_depth <= 10
+
+
+def test_drop_oldest():
+    queue = LineQueue(maxsize=10, overflow="drop-oldest")
+    for line in LINES:
+        queue.put(line)
+    queue.close()
+
+    assert list(queue) == LINES[-10:]
+    assert queue.dropped == 90
+
+
+def test_spill(tmp_path):
+    queue = LineQueue(maxsize=10, overflow="spill", spill_dir=tmp_path)
+    for line in LINES[:50]:
+        queue.put(line)
+    assert queue.depth == 50
+    assert queue.spilled == 40
+
+    received = [queue.get() for _ in range(30)]
+    for line in LINES[50:]:
+        queue.put(line)
+    queue.close()
+
+    assert received + list(queue) == LINES
+
+
+def test_reader_error():
+    def failing_lines():
+        yield LINES[0]
+        raise ConnectionError("stream dropped")
+
+    queue = LineQueue(maxsize=10)
+    reader = StreamReader(failing_lines(), queue)
+    reader.start()
+
+    assert list(queue) == LINES[:1]
+    reader.join()
+    assert isinstance(reader.error, ConnectionError)
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        LineQueue(overflow="unknown")
+
+
+def test_stop_unblocks_reader():
+    queue = LineQueue(maxsize=1, overflow="block")
+    reader = StreamReader(LINES, queue)
+    reader.start()
+
+    stopped = threading.Event()
+    threading.Thread(target=lambda: (reader.stop(), stopped.set())).start()
+    assert stopped.wait(timeout=5)
+    assert not reader.is_alive()
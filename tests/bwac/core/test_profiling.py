@@ -0,0 +1,76 @@
+import json
+import pstats
+import threading
+import time
+
+import pytest
+
+from bwac.core.metrics import Metrics
+from bwac.core.profiling import Profiler, StackSampler, stage_timings
+
+
+def busy_worker(duration_in_s: float = 0.1):
+    end = time.perf_counter() + duration_in_s
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def test_stage_timings():
+    metrics = Metrics()
+    metrics.http_request("token", 200, 0.2)
+    metrics.http_request("tracks", 200, 0.5)
+    metrics.http_request("tracks", 429, 0.1)
+    metrics.parse_seconds.observe(0.001, consumer="historic")
+    metrics.write_seconds.observe(0.002, consumer="historic")
+
+    timings = stage_timings(metrics)
+    assert list(timings) == ["token", "download", "parse[historic]", "write[historic]"]
+    assert timings["download"]["count"] == 2
+    assert timings["download"]["total_s"] == pytest.approx(0.6)
+    assert timings["token"]["mean_ms"] == pytest.approx(200)
+
+
+def test_profiler_cprofile(tmp_path):
+    profiler = Profiler(tmp_path, memory=True, dump_interval_in_s=None)
+    with profiler:
+        profiler.metrics.http_request("token", 200, 0.2)
+        # threads are profiled as well
+        worker = threading.Thread(target=busy_worker)
+        worker.start()
+        worker.join()
+
+    [profile] = tmp_path.glob("profile-*.prof")
+    functions = {name for _, _, name in pstats.Stats(str(profile)).stats}
+    assert "busy_worker" in functions
+
+    [memory] = tmp_path.glob("memory-*.txt")
+    assert memory.read_text().startswith("traced memory:")
+
+    [stages] = tmp_path.glob("stages-*.json")
+    assert json.loads(stages.read_text())["stages"]["token"]["count"] == 1
+
+
+def test_profiler_rolling_dumps(tmp_path):
+    profiler = Profiler(tmp_path, mode="sampling", dump_interval_in_s=0.05, keep=2)
+    with profiler:
+        busy_worker(0.3)
+
+    profiles = sorted(tmp_path.glob("profile-*.collapsed"))
+    assert len(profiles) == 2
+    assert "busy_worker" in profiles[-1].read_text()
+    assert len(list(tmp_path.glob("stages-*.json"))) == 2
+
+
+def test_stack_sampler():
+    sampler = StackSampler(interval_in_s=0.001)
+    sampler.start()
+    busy_worker(0.1)
+    sampler.stop()
+
+    assert sampler.samples > 0
+    stack, count = sampler.collapsed().splitlines()[0].rsplit(" ", 1)
+    assert stack.startswith("MainThread;")
+    assert int(count) > 0
+
+    with pytest.raises(ValueError, match="unknown mode"):
+        Profiler(".", mode="perf")
@@ -0,0 +1,122 @@
+import datetime as dt
+import email.utils
+import io
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from bwac.core.scheduler import (
+    AdaptiveConcurrency,
+    RequestScheduler,
+    TokenBucket,
+    read_retry_after,
+)
+
+
+def response(status_code: int, headers: dict | None = None) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status_code
+    r.raw = io.BytesIO(b"")
+    r.headers.update(headers or {})
+    return r
+
+
+def test_read_retry_after():
+    assert read_retry_after(None) is None
+    assert read_retry_after("7") == 7.0
+    assert read_retry_after("soon") is None
+
+    retry_at = dt.datetime.now(tz=dt.timezone.utc) + dt.timedelta(seconds=30)
+    delay = read_retry_after(email.utils.format_datetime(retry_at, usegmt=True))
+    assert 25 < delay <= 30
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate_per_s=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_adaptive_concurrency():
+    concurrency = AdaptiveConcurrency(maximum=8, cooldown_in_s=0)
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 2
+
+    for _ in range(4):
+        concurrency.on_success()
+    assert concurrency.limit > 3
+
+    for _ in range(10):
+        concurrency.on_throttle()
+    assert concurrency.limit == 1
+
+
+def test_adaptive_concurrency_decreases_once_per_cooldown():
+    concurrency = AdaptiveConcurrency(maximum=8, cooldown_in_s=60)
+    for _ in range(4):
+        concurrency.on_throttle()
+    assert concurrency.limit == 4
+
+
+def test_request_retries():
+    scheduler = RequestScheduler(max_concurrency=4, backoff_in_s=0)
+    send = MagicMock(
+        side_effect=[
+            response(429, {"Retry-After": "0"}),
+            response(503),
+            requests.ConnectionError("reset"),
+            requests.exceptions.ChunkedEncodingError("broken"),
+            response(200),
+        ]
+    )
+
+    assert scheduler.request(send).status_code == 200
+    assert send.call_count == 5
+    assert scheduler.retries == 4
+    assert scheduler.throttled == 1
+    assert scheduler.concurrency.limit < 4
+
+
+def test_request_gives_up():
+    scheduler = RequestScheduler(max_retries=2, backoff_in_s=0)
+
+    send = MagicMock(return_value=response(500))
+    assert scheduler.request(send).status_code == 500
+    assert send.call_count == 3
+
+    send = MagicMock(side_effect=requests.Timeout("timeout"))
+    with pytest.raises(requests.Timeout):
+        scheduler.request(send)
+
+
+def test_request_does_not_retry_client_errors():
+    scheduler = RequestScheduler(backoff_in_s=0)
+
+    send = MagicMock(return_value=response(404))
+    assert scheduler.request(send).status_code == 404
+    assert send.call_count == 1
+
+
+def test_request_holds_slot_until_closed():
+    scheduler = RequestScheduler(max_concurrency=2)
+
+    streamed = scheduler.request(MagicMock(return_value=response(200)))
+    assert scheduler.concurrency.in_flight == 1
+    streamed.close()
+    streamed.close()
+    assert scheduler.concurrency.in_flight == 0
+
+    # a response, whose body has been received, releases its slot immediately
+    received = response(200)
+    received.content
+    scheduler.request(MagicMock(return_value=received))
+    assert scheduler.concurrency.in_flight == 0
+
+    scheduler.request(MagicMock(return_value=response(404))).close()
+    with pytest.raises(ValueError):
+        scheduler.request(MagicMock(side_effect=ValueError("failed")))
+    assert scheduler.concurrency.in_flight == 0
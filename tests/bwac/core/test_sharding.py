@@ -0,0 +1,102 @@
+import csv
+
+import pytest
+
+from bwac.core.sharding import Shard, merge_shards
+from bwac.core.sinks import write_parquet
+from bwac.utils import read_timestamp
+
+
+def test_shards_partition_work():
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    mmsis = list(range(257719900, 257720900))
+    shards = [Shard(index=i, count=4) for i in range(4)]
+
+    selected = [shard.select(mmsis, from_date=from_date) for shard in shards]
+    assert sorted(sum(selected, [])) == mmsis
+    assert all(200 < len(x) < 300 for x in selected)
+
+    # the partition is stable
+    assert selected[1] == Shard.parse("1/4").select(mmsis, from_date=from_date)
+
+
+@pytest.mark.parametrize("txt", ["4/4", "1", "a/b", "-1/2"])
+def test_shard_parse_invalid(txt):
+    with pytest.raises(ValueError, match="Shard"):
+        Shard.parse(txt)
+
+
+def write_csv(path, seconds):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["mmsi", "msgtime"])
+        for second in seconds:
+            writer.writerow([257719900, f"2026-04-20T23:59:{second:02d}+00:00"])
+
+
+def test_merge_shards(tmp_path):
+    filename = "AIS_2026_04_20_257719900.csv"
+    write_csv(tmp_path / "shard-0-of-2" / filename, [0, 2, 4])
+    write_csv(tmp_path / "shard-1-of-2" / filename, [1, 2, 3])
+    write_csv(tmp_path / "shard-1-of-2" / "AIS_2026_04_21_257719900.csv", [5])
+
+    for _ in range(2):
+        assert merge_shards(tmp_path, tmp_path / "merged") == 3
+
+    with open(tmp_path / "merged" / filename, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["msgtime"][-8:-6] for row in rows] == ["00", "01", "02", "03", "04"]
+    assert (tmp_path / "merged" / "AIS_2026_04_21_257719900.csv").exists()
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_merge_shards_keeps_messages_with_equal_time(output_format, tmp_path):
+    if output_format == "parquet":
+        pq = pytest.importorskip("pyarrow.parquet")
+
+    # distinct messages, e.g., position and static data, may share a msgtime
+    msgtime = "2026-04-20T00:00:00+00:00"
+    shard_rows = [
+        [{"mmsi": 257719900, "msgtime": msgtime, "name": name} for name in ["A", "B"]],
+        [{"mmsi": 257719900, "msgtime": msgtime, "name": name} for name in ["C", "A"]],
+    ]
+    filename = f"AIS_2026_04_20_257719900.{output_format}"
+    for index, rows in enumerate(shard_rows):
+        path = tmp_path / f"shard-{index}-of-2" / filename
+        path.parent.mkdir()
+        if output_format == "csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["mmsi", "msgtime", "name"], lineterminator="\n")
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            write_parquet(path, rows)
+
+    for _ in range(2):
+        merge_shards(tmp_path, tmp_path / "merged")
+
+    if output_format == "csv":
+        with open(tmp_path / "merged" / filename, newline="") as f:
+            names = [row["name"] for row in csv.DictReader(f)]
+    else:
+        names = pq.read_table(tmp_path / "merged" / filename).column("name").to_pylist()
+    assert names == ["A", "B", "C"]
+
+
+def test_merge_shards_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    filename = "AIS_2026_04_20_257719900.parquet"
+    for index, seconds in enumerate([[0, 2], [1, 2]]):
+        path = tmp_path / f"shard-{index}-of-2" / filename
+        path.parent.mkdir()
+        rows = [
+            {"mmsi": 257719900, "msgtime": f"2026-04-20T00:00:{second:02d}+00:00"}
+            for second in seconds
+        ]
+        write_parquet(path, rows, compression="zstd")
+
+    merge_shards(tmp_path)
+
+    table = pq.read_table(tmp_path / filename)
+    assert [x.as_py().second for x in table.column("msgtime")] == [0, 1, 2]
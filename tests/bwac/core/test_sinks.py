@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from bwac.core.sinks import ParquetSink
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+BASE = {
+    "courseOverGround": 42.9,
+    "latitude": 59.729342,
+    "longitude": 5.481622,
+    "name": "TITANIC",
+    "rateOfTurn": 0,
+    "shipType": 30,
+    "speedOverGround": 12.1,
+    "trueHeading": 42,
+    "navigationalStatus": 0,
+    "mmsi": 257719900,
+    "msgtime": "2026-04-20T00:00:00+00:00",
+    "callSign": "LAXY",
+}
+
+
+def write_messages(sink: ParquetSink, messages: list[dict]):
+    for message in messages:
+        day = message["msgtime"][:10].replace("-", "_")
+        sink.write(day, json.dumps(message).encode("UTF-8"), data=message)
+
+
+def test_parquet_sink(tmp_path):
+    messages = [
+        dict(BASE, msgtime=f"2026-04-{day}T00:00:{second:02d}.1234567+00:00")
+        for day in [20, 21]
+        for second in range(25)
+    ]
+
+    sink = ParquetSink(tmp_path, row_group_size=10)
+    write_messages(sink, messages)
+    sink.close()
+
+    parquet_file = pq.ParquetFile(tmp_path / "AIS_2026_04_20.parquet")
+    assert parquet_file.metadata.num_rows == 25
+    assert parquet_file.metadata.num_row_groups == 3
+
+    schema = parquet_file.schema_arrow
+    assert schema.field("mmsi").type == pa.int32()
+    assert schema.field("latitude").type == pa.float32()
+    assert schema.field("msgtime").type == pa.timestamp("us", tz="UTC")
+    assert pa.types.is_dictionary(schema.field("name").type)
+    assert schema.field("callSign").type == pa.string()
+
+    table = pq.read_table(tmp_path / "AIS_2026_04_21.parquet")
+    assert table.num_rows == 25
+    assert table.column("msgtime")[0].as_py().microsecond == 123456
+
+
+def test_parquet_sink_does_not_overwrite(tmp_path):
+    for _ in range(2):
+        sink = ParquetSink(tmp_path)
+        write_messages(sink, [BASE])
+        sink.close()
+
+    assert pq.read_table(tmp_path / "AIS_2026_04_20.parquet").num_rows == 1
+    assert pq.read_table(tmp_path / "AIS_2026_04_20.1.parquet").num_rows == 1
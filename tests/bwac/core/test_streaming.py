@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from bwac.core.streaming import iter_json_array, iter_reversed
+
+MESSAGES = [
+    {"mmsi": 257719900, "msgtime": "2026-04-20T00:00:00+00:00", "name": "SKÅLA"},
+    {"mmsi": 257719901, "msgtime": "2026-04-20T00:00:01+00:00", "latitude": 59.729342},
+    [1, 2.5, None],
+    12345,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+def test_iter_json_array(chunk_size):
+    data = json.dumps(MESSAGES, indent=1, ensure_ascii=False).encode("UTF-8")
+    chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    assert list(iter_json_array(chunks)) == MESSAGES
+
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array([b" [ ", b"]\n"])) == []
+
+
+@pytest.mark.parametrize("data", [b'{"mmsi": 1}', b'[{"mmsi": 1}, {"mm'])
+def test_iter_json_array_invalid(data):
+    with pytest.raises(ValueError, match="iter_json_array"):
+        list(iter_json_array([data]))
+
+
+@pytest.mark.parametrize("count", [0, 3, 10, 25])
+def test_iter_reversed(count):
+    items = list(range(count))
+
+    assert list(iter_reversed(iter(items), chunk_size=5)) == items[::-1]
+    assert list(iter_reversed(items, chunk_size=5)) == items[::-1]
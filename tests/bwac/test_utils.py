@@ -0,0 +1,74 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+import bwac.utils
+from bwac.utils import (
+    iter_blocks_backwards,
+    iter_csv_records_backwards,
+    read_last_line,
+    read_timestamp,
+    read_timestamps,
+)
+
+
+@pytest.mark.parametrize(
+    ["content", "last_line"],
+    [
+        ("", None),
+        ("header\n", "header"),
+        ("header\nfirst\nlast\n", "last"),
+        ("header\nfirst\nlast", "last"),
+        ("header\r\nlast\r\n", "last"),
+        ("header\n" + "x" * 10000 + "\n", "x" * 10000),
+    ],
+)
+def test_read_last_line(content, last_line, tmp_path):
+    path = tmp_path / "test.csv"
+    path.write_bytes(content.encode("UTF-8"))
+
+    assert read_last_line(path, chunk_size=16) == last_line
+
+
+def test_iter_csv_records_backwards(tmp_path):
+    records = ["mmsi,name", '1,"A\n""B"",\r\nC"', "2,D", '3,"\n\nE\n"']
+    path = tmp_path / "test.csv"
+    path.write_bytes(("\n".join(records) + "\n").encode("UTF-8"))
+
+    assert list(iter_csv_records_backwards(iter_blocks_backwards(path, chunk_size=3))) == records[::-1]
+
+
+TIMESTAMPS = [
+    ("2026-04-20T10:14:50+00:00", dt.datetime(2026, 4, 20, 10, 14, 50, tzinfo=dt.timezone.utc)),
+    ("2026-04-20T10:14:50Z", dt.datetime(2026, 4, 20, 10, 14, 50, tzinfo=dt.timezone.utc)),
+    ("2026-04-20T10:14:50.12+00:00", dt.datetime(2026, 4, 20, 10, 14, 50, 120000, tzinfo=dt.timezone.utc)),
+    ("2026-04-20T10:14:50.123456+00:00", dt.datetime(2026, 4, 20, 10, 14, 50, 123456, tzinfo=dt.timezone.utc)),
+    ("2026-04-20T10:14:50.1234567+00:00", dt.datetime(2026, 4, 20, 10, 14, 50, 123456, tzinfo=dt.timezone.utc)),
+    ("2026-04-20T10:14:50.1234567Z", dt.datetime(2026, 4, 20, 10, 14, 50, 123456, tzinfo=dt.timezone.utc)),
+    (
+        "2026-04-20T12:14:50.5+02:00",
+        dt.datetime(2026, 4, 20, 12, 14, 50, 500000, tzinfo=dt.timezone(dt.timedelta(hours=2))),
+    ),
+    ("2026-04-20T10:14:50.5", dt.datetime(2026, 4, 20, 10, 14, 50, 500000)),
+]
+
+
+@pytest.mark.parametrize("fromisoformat_reads_all", [True, False])
+@pytest.mark.parametrize(["msg_time", "timestamp"], TIMESTAMPS)
+def test_read_timestamp(msg_time, timestamp, fromisoformat_reads_all, monkeypatch):
+    monkeypatch.setattr(bwac.utils, "FROMISOFORMAT_READS_ALL", fromisoformat_reads_all)
+    assert read_timestamp(msg_time) == timestamp
+
+
+def test_read_timestamps():
+    msg_times = [msg_time for msg_time, timestamp in TIMESTAMPS if timestamp.tzinfo is not None]
+    expected = [
+        np.datetime64(timestamp.astimezone(dt.timezone.utc).replace(tzinfo=None), "us")
+        for _, timestamp in TIMESTAMPS
+        if timestamp.tzinfo is not None
+    ]
+
+    timestamps = read_timestamps(msg_times)
+    assert timestamps.dtype == np.dtype("datetime64[us]")
+    assert list(timestamps) == expected
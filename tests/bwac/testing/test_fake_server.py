@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+import requests
+
+from bwac.core.historic_consumer import HistoricConsumer
+from bwac.core.livestream_consumer import LivestreamConsumer
+from bwac.core.scheduler import RequestScheduler
+from bwac.testing.fake_server import FakeBarentsWatch, FakeServerConfig
+from bwac.utils import read_timestamp
+
+
+@pytest.fixture
+def fake_server(request, monkeypatch):
+    config = getattr(request, "param", FakeServerConfig())
+    with FakeBarentsWatch(config) as fake:
+        for name, value in fake.env().items():
+            monkeypatch.setenv(name, value)
+        yield fake
+
+
+@pytest.mark.parametrize(
+    "fake_server",
+    [FakeServerConfig(vessels=20, track_length=50, throttle_rate=0.2, error_rate=0.2, retry_after_in_s=0)],
+    indirect=True,
+)
+def test_historic_download(fake_server, tmp_path):
+    from_date = read_timestamp("2026-04-20T00:00:00+00:00")
+    to_date = read_timestamp("2026-04-20T23:59:59+00:00")
+
+    scheduler = RequestScheduler(max_retries=20, backoff_in_s=0.001)
+    with HistoricConsumer(scheduler=scheduler, stream_tracks=True) as consumer:
+        mmsis = consumer.query_all_mmsis(from_date, to_date)
+        assert 0 < len(mmsis) <= 20
+
+        downloaded = list(
+            consumer.download_tracks(
+                mmsis, from_date=from_date, to_date=to_date, output_dir=tmp_path, workers=4
+            )
+        )
+
+    assert sorted(downloaded) == mmsis
+    assert fake_server.stats["tokens"] == 1
+    assert fake_server.stats["throttled"] > 0
+    assert fake_server.stats["errors"] > 0
+    assert scheduler.retries == fake_server.stats["throttled"] + fake_server.stats["errors"]
+
+    with open(tmp_path / f"AIS_2026_04_20_{mmsis[0]}.csv", newline="") as f:
+        assert len(list(csv.DictReader(f))) == 50
+
+
+@pytest.mark.parametrize(
+    "fake_server",
+    [FakeServerConfig(vessels=10, message_rate=0, disconnect_after=100)],
+    indirect=True,
+)
+def test_live_stream_disconnect(fake_server, tmp_path):
+    token = requests.post(fake_server.token_url).json()["access_token"]
+
+    consumer = LivestreamConsumer(url=fake_server.live_ais_url)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        consumer.get_data(access_token=token, output_dir=tmp_path)
+    consumer.close()
+
+    rows = 0
+    for path in tmp_path.glob("AIS_*.csv"):
+        with open(path, newline="") as f:
+            rows += len(list(csv.DictReader(f)))
+    assert rows == 100
+    assert fake_server.stats["disconnects"] == 1
+
+
+def test_unauthorized(fake_server):
+    response = requests.get(fake_server.live_ais_url, headers={"Authorization": "Bearer x"})
+    assert response.status_code == 401